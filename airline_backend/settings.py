@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +44,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'famadata.metrics.RequestMetricsMiddleware',
 ]
 
 TEMPLATES = [
@@ -66,4 +68,82 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
-}
\ No newline at end of file
+    'DEFAULT_PAGINATION_CLASS': 'famadata.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Outbound SMS transport, created lazily on first send. Messages only reach
+# Africa's Talking when AFRICASTALKING_API_KEY is set; without it they are written
+# to a local outbox file instead.
+if os.environ.get('AFRICASTALKING_API_KEY'):
+    SMS_TRANSPORT = {
+        'BACKEND': 'alerts.transports.AfricasTalkingTransport',
+        'OPTIONS': {
+            'username': os.environ.get('AFRICASTALKING_USERNAME', 'queenalert'),
+            'api_key': os.environ['AFRICASTALKING_API_KEY'],
+        },
+    }
+else:
+    SMS_TRANSPORT = {
+        'BACKEND': 'alerts.transports.FileTransport',
+        'OPTIONS': {'file_path': BASE_DIR / 'sms-outbox.jsonl'},
+    }
+# Country code given to national numbers (leading 0) when matching gateway statuses
+SMS_DEFAULT_COUNTRY_CODE = '256'
+
+# Cached responses and the generations that expire them (also read by the swap and
+# availability indexes) live in RESPONSE_CACHE_ALIAS. Local memory is per process:
+# with several workers a write in one is not seen by the others until their entries
+# time out, so set REDIS_URL for any deployment running more than one process.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Fan-out for the /ws/alerts/ push channel. The in-memory backend only reaches
+# sockets held by the same process, which is why the Procfile runs one ASGI worker;
+# plug in a shared backend before raising --workers.
+PUBSUB_BACKEND = {
+    'BACKEND': 'famadata.pubsub.InMemoryBackend',
+}
+
+# Flight changes are announced to the rostered crew once the flight has been quiet
+# this many seconds (run_flight_alerts), or at most FLIGHT_ALERT_MAX_DELAY after the
+# first change. Alerts without a requesting user are authored by FLIGHT_ALERT_AUTHOR,
+# or the oldest superuser when unset.
+FLIGHT_ALERT_DEBOUNCE = 60
+FLIGHT_ALERT_MAX_DELAY = 300
+FLIGHT_ALERT_AUTHOR = None
+
+# Swap suggestions are served from an in-memory index of the next SWAP_INDEX_DAYS,
+# rebuilt when rosters, profiles, flights or fatigue logs change or after
+# SWAP_INDEX_TTL seconds
+SWAP_INDEX_DAYS = 42
+SWAP_INDEX_TTL = 300
+
+# Available-crew queries use an in-memory index of the next AVAILABILITY_INDEX_DAYS;
+# roster writes are applied to it in place, other changes rebuild it
+AVAILABILITY_INDEX_DAYS = 14
+AVAILABILITY_INDEX_TTL = 300
+
+# Offline sync sends at most SYNC_PAGE_SIZE rows of each model per response;
+# larger syncs return a token for the next page
+SYNC_PAGE_SIZE = 500
+
+# Request timings, query counts and serializer time per ViewSet action are served
+# at /metrics/ to staff. REQUEST_METRICS_LOG also logs one JSON line per request
+# to famadata.metrics; a statement repeated REQUEST_METRICS_DUPLICATE_QUERIES
+# times in a request is reported as an N+1 query.
+REQUEST_METRICS_LOG = False
+REQUEST_METRICS_DUPLICATE_QUERIES = 5
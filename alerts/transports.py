@@ -0,0 +1,157 @@
+# alerts/transports.py
+
+import json
+import re
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+DEFAULT_TRANSPORT = 'alerts.transports.AfricasTalkingTransport'
+
+# Messages sent through InMemoryTransport, like django.core.mail.outbox
+outbox = []
+
+
+def e164(phone_number):
+    """`phone_number` in the +<country code><number> form gateways report numbers in.
+
+    Spaces and punctuation are dropped, a 00 prefix becomes +, and a national number
+    with a leading 0 gets SMS_DEFAULT_COUNTRY_CODE.
+    """
+    digits = re.sub(r'\D', '', phone_number)
+    if phone_number.strip().startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        return f'+{digits[2:]}'
+    if digits.startswith('0'):
+        return f"+{getattr(settings, 'SMS_DEFAULT_COUNTRY_CODE', '256')}{digits[1:]}"
+    return f'+{digits}'
+
+
+class BaseTransport:
+    """Sends one SMS text to many numbers and returns {phone_number: status}"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def send(self, message, phone_numbers):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class AfricasTalkingTransport(BaseTransport):
+    """Africa's Talking messaging API over a pooled HTTP session created on first use"""
+    LIVE_URL = 'https://api.africastalking.com/version1/messaging'
+    SANDBOX_URL = 'https://api.sandbox.africastalking.com/version1/messaging'
+
+    def __init__(self, username='', api_key='', sender_id=None, sandbox=False, timeout=(3.05, 9.05), pool_size=10, **options):
+        super().__init__(**options)
+        if not api_key:
+            raise ImproperlyConfigured('AfricasTalkingTransport needs an api_key (AFRICASTALKING_API_KEY)')
+        self.username = username
+        self.api_key = api_key
+        self.sender_id = sender_id
+        self.url = self.SANDBOX_URL if sandbox else self.LIVE_URL
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.headers.update({'apiKey': self.api_key, 'Accept': 'application/json'})
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def send(self, message, phone_numbers):
+        data = {'username': self.username, 'to': ','.join(phone_numbers), 'message': message}
+        if self.sender_id:
+            data['from'] = self.sender_id
+        response = self.session.post(self.url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        recipients = response.json().get('SMSMessageData', {}).get('Recipients', [])
+        return {recipient['number']: recipient['status'] for recipient in recipients}
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class InMemoryTransport(BaseTransport):
+    """Records messages in `alerts.transports.outbox`; numbers in fail_numbers report failure.
+
+    Like the live gateway, statuses are keyed by the E.164 form of each number.
+    """
+
+    def __init__(self, fail_numbers=(), error=None, **options):
+        super().__init__(**options)
+        self.fail_numbers = {e164(number) for number in fail_numbers}
+        self.error = error
+
+    def send(self, message, phone_numbers):
+        if self.error:
+            raise RuntimeError(self.error)
+        outbox.append({'message': message, 'phone_numbers': list(phone_numbers)})
+        return {
+            e164(number): 'Failed' if e164(number) in self.fail_numbers else 'Success'
+            for number in phone_numbers
+        }
+
+
+class FileTransport(BaseTransport):
+    """Appends every send as a JSON line to `file_path`"""
+
+    def __init__(self, file_path='sms-outbox.jsonl', **options):
+        super().__init__(**options)
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def send(self, message, phone_numbers):
+        entry = {
+            'sent_at': datetime.now(timezone.utc).isoformat(),
+            'message': message,
+            'phone_numbers': list(phone_numbers),
+        }
+        with self._lock, open(self.file_path, 'a', encoding='utf-8') as stream:
+            stream.write(json.dumps(entry) + '\n')
+        return {number: 'Success' for number in phone_numbers}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Return the transport configured by SMS_TRANSPORT, creating it on first use"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                config = getattr(settings, 'SMS_TRANSPORT', {})
+                backend = import_string(config.get('BACKEND', DEFAULT_TRANSPORT))
+                _transport = backend(**config.get('OPTIONS', {}))
+    return _transport
+
+
+def reset_transport():
+    """Close and forget the current transport, e.g. after changing SMS_TRANSPORT"""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = None
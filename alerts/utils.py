@@ -1,17 +1,20 @@
 # alerts/utils.py
 
-import africastalking
+from .transports import get_transport
 
-username = "queenalert"
-api_key = "atsk_9cdd3d99ce403e499a39a73b395f1746a23853486955eab9e59aadc18659c53b7464136f"
-africastalking.initialize(username, api_key)
-sms = africastalking.SMS
 
 def send_sms_alert(phone_number, message):
     try:
-        response = sms.send(message, [phone_number])
+        response = get_transport().send(message, [phone_number])
         return response
     except Exception as e:
         print("SMS error:", e)
         return None
-    
+
+
+def send_bulk_sms(message, phone_numbers):
+    """Send one message to many numbers in a single request.
+
+    Returns {phone_number: status}; raises when the transport call itself fails.
+    """
+    return get_transport().send(message, list(phone_numbers))
@@ -0,0 +1,294 @@
+import logging
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .conflicts import day_start
+from .models import (
+    AirportDailyRollup, AlertRecipient, CrewDailyRollup, CrewProfile, DutyRoster,
+    FatigueLog, Flight, FlightSwapRequest, PendingRollup, PositionDailyRollup
+)
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = (
+    'duties', 'duty_hours', 'flight_hours', 'orange_days', 'red_days', 'swap_requests',
+    'swaps_completed', 'alerts_received', 'alerts_read', 'read_latency_seconds',
+)
+
+
+def local_date(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def roster_keys(rosters):
+    """(crew_days, flight_days) touched by DutyRoster instances"""
+    crew_days = {(roster.crew_member_id, roster.duty_date) for roster in rosters}
+    flight_days = {(roster.flight_id, roster.duty_date) for roster in rosters if roster.flight_id}
+    return crew_days, flight_days
+
+
+def queue_rollups(crew_days=(), flight_days=(), airport_days=()):
+    """Queue the rollups of the given (crew_member_id, date), (flight_id, date) and
+    (airport, date) keys for the rollup worker, inside the current transaction"""
+    PendingRollup.objects.bulk_create([
+        PendingRollup(key_type=key_type, key=str(key), date=day)
+        for key_type, keys in (('crew', crew_days), ('flight', flight_days), ('airport', airport_days))
+        for key, day in set(keys)
+    ])
+
+
+def process_rollups(limit=1000):
+    """Refresh the rollups of up to `limit` queued keys; returns how many were processed"""
+    try:
+        with transaction.atomic():
+            pending = list(
+                PendingRollup.objects.select_for_update(skip_locked=True)
+                .order_by('queued_at').values_list('id', 'key_type', 'key', 'date')[:limit]
+            )
+            if not pending:
+                return 0
+            keys = defaultdict(set)
+            for _, key_type, key, day in pending:
+                keys[key_type].add((key if key_type == 'airport' else uuid.UUID(key), day))
+            refresh_rollups(keys['crew'], keys['flight'], keys['airport'])
+            PendingRollup.objects.filter(id__in=[row[0] for row in pending]).delete()
+    except Exception:
+        # The keys stay queued for the next round; rebuild_rollups repairs the days
+        logger.exception('Refreshing analytics rollups failed')
+        return 0
+    return len(pending)
+
+
+def key_runs(keys):
+    """Split (key, date) pairs into (keys, first, last) runs of consecutive days whose
+    keys × days product is exactly the pairs"""
+    by_day = defaultdict(set)
+    for key, day in keys:
+        by_day[day].add(key)
+    runs = []
+    for day in sorted(by_day):
+        if runs and runs[-1][0] == by_day[day] and runs[-1][2] + timedelta(days=1) == day:
+            runs[-1][2] = day
+        else:
+            runs.append([by_day[day], day, day])
+    return runs
+
+
+def activity(first, last, crew_ids=None, airports=None):
+    """Yield (crew_member_id, date, airport, flight_id, metrics) for every source row
+    of the local days [first, last], limited to `crew_ids` or departure `airports`"""
+    start, end = day_start(first), day_start(last + timedelta(days=1))
+
+    def scoped(queryset, crew_lookup, airport_lookup):
+        if crew_ids is not None:
+            queryset = queryset.filter(**{f'{crew_lookup}__in': crew_ids})
+        if airports is not None:
+            if airport_lookup is None:
+                return queryset.none()
+            queryset = queryset.filter(**{f'{airport_lookup}__in': airports})
+        return queryset
+
+    rosters = scoped(
+        DutyRoster.objects.filter(duty_type='active', duty_date__gte=first, duty_date__lte=last),
+        'crew_member_id', 'flight__departure_airport'
+    ).values_list(
+        'crew_member_id', 'duty_date', 'flight__departure_airport', 'flight_id', 'duty_start_time',
+        'duty_end_time', 'flight__scheduled_departure', 'flight__scheduled_arrival'
+    )
+    for crew_member_id, day, airport, flight_id, duty_start, duty_end, departure, arrival in rosters.iterator(chunk_size=5000):
+        metrics = {'duties': 1, 'duty_seconds': (duty_end - duty_start).total_seconds()}
+        if departure and arrival:
+            metrics['flight_seconds'] = (arrival - departure).total_seconds()
+        yield crew_member_id, day, airport, flight_id, metrics
+
+    logs = scoped(
+        FatigueLog.objects.filter(duty_start__gte=start, duty_start__lt=end, fatigue_level__in=['orange', 'red']),
+        'crew_member_id', None
+    ).values_list('crew_member_id', 'duty_start', 'fatigue_level')
+    for crew_member_id, duty_start, level in logs.iterator(chunk_size=5000):
+        yield crew_member_id, local_date(duty_start), None, None, {f'{level}_days': 1}
+
+    swaps = scoped(
+        FlightSwapRequest.objects.filter(created_at__gte=start, created_at__lt=end),
+        'requesting_crew_id', 'requesting_flight__departure_airport'
+    ).values_list('requesting_crew_id', 'created_at', 'requesting_flight__departure_airport', 'status')
+    for crew_member_id, created_at, airport, swap_status in swaps.iterator(chunk_size=5000):
+        metrics = {'swap_requests': 1, 'swaps_completed': int(swap_status == 'completed')}
+        yield crew_member_id, local_date(created_at), airport, None, metrics
+
+    deliveries = scoped(
+        AlertRecipient.objects.filter(created_at__gte=start, created_at__lt=end),
+        'recipient_id', 'alert__flight__departure_airport'
+    ).values_list('recipient_id', 'created_at', 'alert__flight__departure_airport', 'read_at')
+    for crew_member_id, created_at, airport, read_at in deliveries.iterator(chunk_size=5000):
+        metrics = {'alerts_received': 1}
+        if read_at:
+            metrics['alerts_read'] = 1
+            metrics['read_latency_seconds'] = max(int((read_at - created_at).total_seconds()), 0)
+        yield crew_member_id, local_date(created_at), airport, None, metrics
+
+
+def metric_values(totals):
+    return {
+        'duties': totals['duties'],
+        'duty_hours': Decimal(str(round(totals['duty_seconds'] / 3600, 2))),
+        'flight_hours': Decimal(str(round(totals['flight_seconds'] / 3600, 2))),
+        'orange_days': totals['orange_days'],
+        'red_days': totals['red_days'],
+        'swap_requests': totals['swap_requests'],
+        'swaps_completed': totals['swaps_completed'],
+        'alerts_received': totals['alerts_received'],
+        'alerts_read': totals['alerts_read'],
+        'read_latency_seconds': totals['read_latency_seconds'],
+    }
+
+
+def save_rollups(model, rollups, key_field, extra_fields, wanted):
+    """Upsert `rollups` and delete the rows of `wanted` (key, date) pairs left without one"""
+    model.objects.bulk_create(
+        rollups, batch_size=500, update_conflicts=True, unique_fields=[key_field, 'date'],
+        update_fields=[*METRIC_FIELDS, *extra_fields, 'updated_at'],
+    )
+    kept = {(getattr(rollup, key_field), rollup.date) for rollup in rollups}
+    missing = defaultdict(list)
+    for key, day in wanted - kept:
+        missing[day].append(key)
+    for day, keys in missing.items():
+        model.objects.filter(date=day, **{f'{key_field}__in': keys}).delete()
+
+
+def refresh_crew(crew_days):
+    """Recompute crew rollups; returns the (position, date) and (airport, date) keys they feed"""
+    crew_ids = {crew_member_id for crew_member_id, _ in crew_days}
+    dates = {day for _, day in crew_days}
+    totals = defaultdict(Counter)
+    airport_days = set()
+    for members, first, last in key_runs(crew_days):
+        for crew_member_id, day, airport, flight_id, metrics in activity(first, last, crew_ids=members):
+            totals[(crew_member_id, day)].update(metrics)
+            if flight_id and airport:
+                airport_days.add((airport, day))
+    for counts in totals.values():
+        # A day is red or orange once, however many logs it has
+        counts['red_days'] = min(counts['red_days'], 1)
+        counts['orange_days'] = 0 if counts['red_days'] else min(counts['orange_days'], 1)
+
+    positions = dict(CrewProfile.objects.filter(user_id__in=crew_ids).values_list('user_id', 'position'))
+    previous = CrewDailyRollup.objects.filter(crew_member_id__in=crew_ids, date__in=dates).values_list(
+        'crew_member_id', 'date', 'position'
+    )
+    position_days = {(position, day) for crew_member_id, day, position in previous if (crew_member_id, day) in crew_days}
+    rollups = [
+        CrewDailyRollup(
+            crew_member_id=crew_member_id, date=day, position=positions.get(crew_member_id, ''),
+            **metric_values(counts)
+        )
+        for (crew_member_id, day), counts in totals.items()
+    ]
+    save_rollups(CrewDailyRollup, rollups, 'crew_member_id', ['position'], crew_days)
+    position_days.update((rollup.position, rollup.date) for rollup in rollups)
+    return position_days, airport_days
+
+
+def refresh_airports(airport_days):
+    dates = {day for _, day in airport_days}
+    totals = defaultdict(Counter)
+    flights, crew = defaultdict(set), defaultdict(set)
+    for codes, first, last in key_runs(airport_days):
+        for crew_member_id, day, airport, flight_id, metrics in activity(first, last, airports=codes):
+            key = (airport, day)
+            totals[key].update(metrics)
+            if flight_id:
+                flights[key].add(flight_id)
+                crew[key].add(crew_member_id)
+
+    # Fatigue is per crew member, so an airport counts the tired crew who flew from it
+    levels = {
+        (crew_member_id, day): (orange, red)
+        for crew_member_id, day, orange, red in CrewDailyRollup.objects.filter(
+            crew_member_id__in={member for members in crew.values() for member in members}, date__in=dates
+        ).values_list('crew_member_id', 'date', 'orange_days', 'red_days')
+    }
+    for key, members in crew.items():
+        for crew_member_id in members:
+            orange, red = levels.get((crew_member_id, key[1]), (0, 0))
+            totals[key]['orange_days'] += orange
+            totals[key]['red_days'] += red
+
+    rollups = [
+        AirportDailyRollup(
+            airport=airport, date=day, flights=len(flights[(airport, day)]),
+            crew_members=len(crew[(airport, day)]), **metric_values(counts)
+        )
+        for (airport, day), counts in totals.items()
+    ]
+    save_rollups(AirportDailyRollup, rollups, 'airport', ['flights', 'crew_members'], airport_days)
+
+
+def refresh_positions(position_days):
+    position_days = {(position, day) for position, day in position_days if position}
+    if not position_days:
+        return
+    rows = CrewDailyRollup.objects.filter(
+        position__in={position for position, _ in position_days}, date__in={day for _, day in position_days}
+    ).values('position', 'date').annotate(crew_members=Count('id'), **{
+        f'total_{name}': Sum(name) for name in METRIC_FIELDS
+    })
+    rollups = [
+        PositionDailyRollup(
+            position=row['position'], date=row['date'], crew_members=row['crew_members'],
+            **{name: row[f'total_{name}'] for name in METRIC_FIELDS}
+        )
+        for row in rows if (row['position'], row['date']) in position_days
+    ]
+    save_rollups(PositionDailyRollup, rollups, 'position', ['crew_members'], position_days)
+
+
+def refresh_rollups(crew_days=(), flight_days=(), airport_days=()):
+    """Recompute the crew, position and airport rollups of the given keys from source rows.
+
+    Each refresh reads only the affected (crew member, day) and (airport, day) keys,
+    with one query per source table for each run of consecutive days sharing the same
+    keys, and upserts the results; position rollups are summed from the crew rollups.
+    """
+    crew_days, airport_days = set(crew_days), set(airport_days)
+    flight_days = set(flight_days)
+    if flight_days:
+        airports = dict(
+            Flight.objects.filter(id__in={flight_id for flight_id, _ in flight_days})
+            .values_list('id', 'departure_airport')
+        )
+        airport_days.update((airports[flight_id], day) for flight_id, day in flight_days if flight_id in airports)
+
+    with transaction.atomic():
+        position_days = set()
+        if crew_days:
+            position_days, fed_airports = refresh_crew(crew_days)
+            airport_days.update(fed_airports)
+        if airport_days:
+            refresh_airports(airport_days)
+        refresh_positions(position_days)
+
+
+def rebuild_rollups(start_date, end_date):
+    """Recompute every rollup of the local days [start_date, end_date], one day at a time"""
+    with transaction.atomic():
+        for model in (CrewDailyRollup, PositionDailyRollup, AirportDailyRollup):
+            model.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+    day, rebuilt = start_date, 0
+    while day <= end_date:
+        crew_days, airport_days = set(), set()
+        for crew_member_id, _, airport, _, _ in activity(day, day):
+            crew_days.add((crew_member_id, day))
+            if airport:
+                airport_days.add((airport, day))
+        refresh_rollups(crew_days, airport_days=airport_days)
+        rebuilt += len(crew_days)
+        day += timedelta(days=1)
+    return rebuilt
@@ -5,4 +5,4 @@ class FamadataConfig(AppConfig):
     name = 'famadata'
 
     def ready(self):
-        import alerts.signals  # ✅ correct full import path
+        import famadata.signals  # noqa: F401 - registers signal receivers
@@ -0,0 +1,285 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import get_generations
+from .conflicts import day_start
+from .fatigue import required_rest_until
+from .legality import check_proposals
+from .models import CrewProfile, CustomUser, DutyRoster, FatigueLog
+from .scheduling import DUTY_MARGIN, HAUL_MATCH, RELEASE_AFTER, REPORT_BEFORE
+
+# Roster slots a crew member can be called out from
+CALLOUT_TYPES = ('standby', 'reserve')
+# Most candidates whose fatigue limits are checked per query
+MAX_FATIGUE_CHECKS = 100
+
+
+class Duty:
+    __slots__ = ('start', 'end', 'duty_type', 'duty_date', 'roster_id', 'reach')
+
+    def __init__(self, start, end, duty_type, duty_date, roster_id=None):
+        self.start = start
+        self.end = end
+        self.duty_type = duty_type
+        self.duty_date = duty_date
+        self.roster_id = roster_id
+        # Nothing may start before this: the end, or the end of the rest after an active duty
+        self.reach = required_rest_until(start, end, 'green') if duty_type == 'active' else end
+
+    def __lt__(self, other):
+        return (self.start, self.end) < (other.start, other.end)
+
+
+class AvailabilityIndex:
+    """Every crew member's duties and required rest between two dates, sorted by start.
+
+    Crew are pooled by (position, haul type) in seniority order, so a query walks one
+    pool and checks each crew member with binary searches over their own intervals:
+    a running maximum of each duty's reach (its end, plus rest when active) bounds
+    the earlier duties that can still clash, however long they are.
+    Roster writes are applied in place after commit; any other change to rosters,
+    profiles, users or fatigue logs makes the index stale and it is rebuilt.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.lock = threading.Lock()
+        self.generations = get_generations(self.models())
+        self.built_at = time.monotonic()
+
+        self.profiles = {
+            row['user_id']: row
+            for row in CrewProfile.objects.values(
+                'user_id', 'user__username', 'user__is_active_duty', 'position', 'preferred_haul', 'seniority'
+            )
+        }
+        self.pools = defaultdict(list)
+        for row in sorted(self.profiles.values(), key=lambda row: -row['seniority']):
+            for haul in HAUL_MATCH.get(row['preferred_haul'], ()):
+                self.pools[(row['position'], haul)].append(row['user_id'])
+
+        self.duties = defaultdict(list)
+        self.owners = {}
+        rows = DutyRoster.objects.filter(
+            duty_date__gte=start_date - DUTY_MARGIN, duty_date__lte=end_date + DUTY_MARGIN
+        ).values_list('id', 'crew_member_id', 'duty_start_time', 'duty_end_time', 'duty_type', 'duty_date')
+        for roster_id, crew_member_id, start, end, duty_type, duty_date in rows.iterator(chunk_size=5000):
+            self.duties[crew_member_id].append(Duty(start, end, duty_type, duty_date, roster_id))
+            self.owners[roster_id] = crew_member_id
+        self.starts, self.reach = {}, {}
+        for crew_member_id, crew_duties in self.duties.items():
+            crew_duties.sort()
+            self.index_crew(crew_member_id)
+
+        self.rest = defaultdict(list)
+        logs = FatigueLog.objects.filter(
+            rest_required_until__gt=day_start(start_date - DUTY_MARGIN)
+        ).values_list('crew_member_id', 'duty_start', 'rest_required_until')
+        for crew_member_id, duty_start, rest_until in logs:
+            self.rest[crew_member_id].append((duty_start, rest_until))
+
+    @staticmethod
+    def models():
+        return [DutyRoster, CrewProfile, CustomUser, FatigueLog]
+
+    def index_crew(self, crew_member_id):
+        duties = self.duties[crew_member_id]
+        reach, latest = [], None
+        for duty in duties:
+            latest = duty.reach if latest is None else max(latest, duty.reach)
+            reach.append(latest)
+        self.starts[crew_member_id] = [duty.start for duty in duties]
+        self.reach[crew_member_id] = reach
+
+    def covers(self, start_date, end_date):
+        return self.start_date <= start_date and end_date <= self.end_date
+
+    def is_current(self, max_age):
+        return time.monotonic() - self.built_at < max_age and get_generations(self.models()) == self.generations
+
+    def apply_roster(self, roster_id, values, generation):
+        """Move, replace or (with `values` None) drop one roster after its commit.
+
+        `generation` is the DutyRoster generation the write produced; a gap means a
+        write was missed, so the index is left stale instead.
+        """
+        with self.lock:
+            position = self.models().index(DutyRoster)
+            if self.generations[position] != generation - 1:
+                return
+            previous = self.owners.pop(roster_id, None)
+            if previous is not None:
+                self.duties[previous] = [duty for duty in self.duties[previous] if duty.roster_id != roster_id]
+                self.index_crew(previous)
+            if values is not None:
+                crew_member_id, start, end, duty_type, duty_date = values
+                insort(self.duties[crew_member_id], Duty(start, end, duty_type, duty_date, roster_id))
+                self.owners[roster_id] = crew_member_id
+                self.index_crew(crew_member_id)
+            self.generations[position] = generation
+
+    def callout_slot(self, crew_member_id, start, end, day):
+        """(legal, slot) for a new duty: the crew member's standby or reserve slot
+        covering its start, if any, and whether it clashes with anything else"""
+        duties = self.duties.get(crew_member_id, [])
+        slot = None
+        for duty in duties:
+            if duty.duty_date == day:
+                if duty.duty_type not in CALLOUT_TYPES or not duty.start <= start < duty.end:
+                    return False, None
+                slot = duty
+
+        # Duties before `first` end, rest included, by `start`; those from `last` on
+        # start after the new duty and the rest it needs
+        first = bisect_right(self.reach.get(crew_member_id, []), start)
+        last = bisect_left(self.starts.get(crew_member_id, []), required_rest_until(start, end, 'green'))
+        for duty in duties[first:last]:
+            if duty is slot:
+                continue
+            if duty.start < end and start < duty.end:
+                return False, None
+            if duty.duty_type != 'active':
+                continue
+            if duty.end <= start and duty.reach > start:
+                return False, None
+            if duty.start >= end:
+                return False, None
+
+        for duty_start, rest_until in self.rest.get(crew_member_id, ()):
+            if duty_start < start < rest_until:
+                return False, None
+        return True, slot
+
+    def candidates(self, position, haul_type, start, end, exclude=(), sources=None, limit=MAX_FATIGUE_CHECKS):
+        """Up to `limit` (profile, slot, source) for crew free to work [start, end), most senior first"""
+        day = timezone.localdate(start)
+        found = []
+        with self.lock:
+            for crew_member_id in self.pools.get((position, haul_type), ()):
+                if crew_member_id in exclude:
+                    continue
+                legal, slot = self.callout_slot(crew_member_id, start, end, day)
+                if not legal:
+                    continue
+                profile = self.profiles[crew_member_id]
+                if slot is not None:
+                    source = slot.duty_type
+                else:
+                    source = 'on_duty' if profile['user__is_active_duty'] else 'free'
+                if sources and source not in sources:
+                    continue
+                found.append((profile, slot, source))
+                if len(found) >= limit:
+                    break
+        return found
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_availability_index(start_date, end_date):
+    """Return an index covering the dates, reusing the shared one while it is current.
+
+    The shared index spans AVAILABILITY_INDEX_DAYS from yesterday; other dates get a
+    one-off index.
+    """
+    global _index
+    max_age = getattr(settings, 'AVAILABILITY_INDEX_TTL', 300)
+    index = _index
+    if index is not None and index.covers(start_date, end_date) and index.is_current(max_age):
+        return index
+
+    today = timezone.localdate()
+    default_start = today - timedelta(days=1)
+    default_end = today + timedelta(days=getattr(settings, 'AVAILABILITY_INDEX_DAYS', 14))
+    if not (default_start <= start_date and end_date <= default_end):
+        return AvailabilityIndex(start_date, end_date)
+    with _index_lock:
+        if _index is None or not _index.covers(start_date, end_date) or not _index.is_current(max_age):
+            _index = AvailabilityIndex(default_start, default_end)
+        return _index
+
+
+def roster_changed(roster, deleted=False):
+    """Keep the shared index in step with a roster saved or deleted through the ORM"""
+    if _index is None:
+        return
+    values = None if deleted else (
+        roster.crew_member_id, roster.duty_start_time, roster.duty_end_time, roster.duty_type, roster.duty_date
+    )
+
+    def apply(index=_index):
+        # Runs after invalidate's own on-commit bump, so this reads the generation the write produced
+        index.apply_roster(roster.pk, values, get_generations([DutyRoster])[0])
+
+    transaction.on_commit(apply)
+
+
+def flight_window(flight):
+    """Duty window for crewing `flight`, from report time to release"""
+    return flight.scheduled_departure - REPORT_BEFORE, flight.scheduled_arrival + RELEASE_AFTER
+
+
+def available_crew(position, start, end, haul_type, flight=None, sources=None, limit=20):
+    """Legal, unassigned crew for a duty in `position` over [start, end), most senior first.
+
+    Candidates hold a profile for the position and haul type, are on a standby or
+    reserve slot covering the start or have no duty that day, and have no overlap,
+    rest or rolling fatigue-limit conflict with the new duty. `sources` limits them
+    to 'standby', 'reserve', 'on_duty' (CustomUser.is_active_duty) or 'free'. The
+    index only short-lists them; check_proposals confirms each one in the database.
+    """
+    index = get_availability_index(timezone.localdate(start), timezone.localdate(end))
+    exclude = set()
+    if flight is not None:
+        exclude = set(DutyRoster.objects.filter(flight=flight).values_list('crew_member_id', flat=True))
+
+    matches = index.candidates(position, haul_type, start, end, exclude, sources)
+    if not matches:
+        return []
+
+    # The index can lag writes from other processes: confirm the short-list against
+    # the database, with every slot still a standby or reserve of the same crew member
+    live_slots = set(DutyRoster.objects.filter(
+        id__in=[slot.roster_id for _, slot, _ in matches if slot], duty_type__in=CALLOUT_TYPES
+    ).values_list('id', 'crew_member_id'))
+    matches = [
+        (profile, slot, source) for profile, slot, source in matches
+        if slot is None or (slot.roster_id, profile['user_id']) in live_slots
+    ]
+    checks = check_proposals(
+        [
+            {
+                'crew_member': profile['user_id'], 'flight': flight.pk if flight else None,
+                'duty_date': timezone.localdate(start), 'duty_type': 'active',
+                'duty_start_time': start, 'duty_end_time': end, 'position': position,
+            }
+            for profile, _, _ in matches
+        ],
+        exclude_roster_ids=[roster_id for roster_id, _ in live_slots]
+    )
+
+    results = []
+    for (profile, slot, source), check in zip(matches, checks):
+        if not check['legal']:
+            continue
+        results.append({
+            'crew_member': profile['user_id'],
+            'username': profile['user__username'],
+            'position': profile['position'],
+            'seniority': profile['seniority'],
+            'source': source,
+            'roster': slot.roster_id if slot else None,
+        })
+        if len(results) >= limit:
+            break
+    return results
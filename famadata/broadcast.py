@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import Q
+
+from .analytics import local_date, queue_rollups
+from .cache import invalidate
+from .models import Alert, AlertRecipient, CustomUser, DutyRoster
+from .pubsub import alert_event, publish_event
+from .sms_queue import enqueue_alert_sms
+
+
+def audience_filter(flight=None, positions=(), haul_types=(), crew_member_ids=()):
+    """Q selecting crew on `flight`, in any of `positions` or `haul_types`, or listed by id"""
+    condition = Q(pk__in=[])
+    if flight is not None:
+        condition |= Q(pk__in=DutyRoster.objects.filter(flight=flight).values('crew_member_id'))
+    if positions:
+        condition |= Q(profile__position__in=positions)
+    if haul_types:
+        # Crew preferring both hauls are reached by either
+        condition |= Q(profile__preferred_haul__in=set(haul_types) | {'both'})
+    if crew_member_ids:
+        condition |= Q(pk__in=crew_member_ids)
+    return condition
+
+
+def broadcast_alert(alert, flight_crew=False, positions=(), haul_types=(), crew_member_ids=()):
+    """Add every matching crew member to `alert` as a recipient with one bulk_create.
+
+    Recipients are resolved and de-duplicated against existing rows in a single query.
+    SMS queueing and the WebSocket push run after the transaction commits; call it in
+    the transaction that creates `alert` so a failure keeps neither. Returns the ids
+    of the crew members added.
+    """
+    condition = audience_filter(
+        flight=alert.flight_id if flight_crew else None,
+        positions=positions,
+        haul_types=haul_types,
+        crew_member_ids=crew_member_ids,
+    )
+    with transaction.atomic():
+        recipient_ids = list(
+            CustomUser.objects.filter(condition).exclude(
+                pk__in=AlertRecipient.objects.filter(alert=alert).values('recipient_id')
+            ).values_list('id', flat=True).distinct()
+        )
+        if not recipient_ids:
+            return []
+        recipients = AlertRecipient.objects.bulk_create(
+            [AlertRecipient(alert=alert, recipient_id=recipient_id) for recipient_id in recipient_ids],
+            batch_size=500,
+        )
+        day = local_date(recipients[0].created_at)
+        queue_rollups(
+            [(recipient_id, day) for recipient_id in recipient_ids], flight_days=[(alert.flight_id, day)]
+        )
+        transaction.on_commit(lambda: enqueue_alert_sms(alert, recipient_ids))
+    invalidate(Alert, AlertRecipient)
+    publish_event(recipient_ids, 'alert', alert_event(alert))
+    return recipient_ids
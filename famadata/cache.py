@@ -0,0 +1,103 @@
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+# Conditional-GET headers kept with a cached response
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def generation_key(model):
+    return f'fama:generation:{model._meta.label_lower}'
+
+
+def get_generations(models):
+    """Current generation of each model; a missing counter restarts from the clock"""
+    cache = response_cache()
+    keys = [generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # Never restart at a value an evicted counter may already have used
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def invalidate(*models):
+    """Bump the generation of each model so every cached response built from it expires.
+
+    The bump waits for the current transaction to commit: bumped earlier, a concurrent
+    request could cache the pre-commit rows under the new generation.
+    """
+    transaction.on_commit(partial(bump_generations, models))
+
+
+def bump_generations(models):
+    cache = response_cache()
+    for model in models:
+        key = generation_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def default_scope(request):
+    """Permission scope the cached response was computed for"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return 'staff' if user.is_staff else 'authenticated'
+
+
+def cache_response(*models, timeout=None, scope=default_scope, vary_on=None):
+    """Cache a GET view method's response until one of `models` changes.
+
+    The key covers the view, action, host, query parameters, permission scope and the
+    current generation of every model the response is built from. `vary_on` may
+    return extra key material, such as the current date.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_method(self, request, *args, **kwargs)
+
+            params = sorted(request.query_params.lists())
+            parts = [
+                self.basename, self.action, request.get_host(), scope(request), repr(params),
+                repr(get_generations(models)), vary_on(request) if vary_on else '',
+            ]
+            digest = hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+            key = f'fama:response:{self.basename}:{self.action}:{digest}'
+
+            cache = response_cache()
+            cached = cache.get(key)
+            if cached is not None:
+                data, headers = cached
+                response = get_conditional_response(
+                    request, etag=headers.get('ETag'),
+                    last_modified=parse_http_date_safe(headers.get('Last-Modified', ''))
+                ) or Response(data)
+                for name, value in headers.items():
+                    response[name] = value
+                return response
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+                cache.set(key, (response.data, headers), timeout or getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,84 @@
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import DutyRoster
+
+
+CONFLICT_FIELDS = [
+    'id', 'crew_member_id', 'crew_member__username', 'flight_id', 'flight__flight_number',
+    'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time', 'position',
+]
+
+
+def day_start(day):
+    """Return an aware datetime for midnight at the start of `day`"""
+    value = datetime.combine(day, time.min)
+    if settings.USE_TZ:
+        value = timezone.make_aware(value)
+    return value
+
+
+def sweep_overlaps(intervals, start=lambda item: item['duty_start_time'], end=lambda item: item['duty_end_time']):
+    """Yield every overlapping (earlier, later) pair from intervals sorted by start.
+
+    Keeps a min-heap of the intervals still open at the current start time, so the
+    cost is O(n log n + k) for n intervals and k reported overlaps.
+    """
+    active = []
+    for seq, item in enumerate(intervals):
+        item_start = start(item)
+        while active and active[0][0] <= item_start:
+            heapq.heappop(active)
+        for _, _, other in sorted(active, key=lambda entry: entry[1]):
+            yield other, item
+        heapq.heappush(active, (end(item), seq, item))
+
+
+def duty_summary(row):
+    """Slim representation of a duty row used in conflict reports"""
+    return {
+        'id': row['id'],
+        'flight': row['flight_id'],
+        'flight_number': row['flight__flight_number'],
+        'duty_date': row['duty_date'],
+        'duty_type': row['duty_type'],
+        'duty_start_time': row['duty_start_time'],
+        'duty_end_time': row['duty_end_time'],
+        'position': row['position'],
+    }
+
+
+def find_conflicts(start_date=None, end_date=None, crew_member_ids=None, queryset=None):
+    """Return overlapping duties per crew member, including overlaps across midnight.
+
+    Only duties intersecting the [start_date, end_date] window are considered. Rows are
+    streamed in (crew_member, duty_start_time) order and swept once per crew member.
+    """
+    if queryset is None:
+        queryset = DutyRoster.objects.all()
+    if start_date:
+        queryset = queryset.filter(duty_end_time__gt=day_start(start_date))
+    if end_date:
+        queryset = queryset.filter(duty_start_time__lt=day_start(end_date + timedelta(days=1)))
+    if crew_member_ids:
+        queryset = queryset.filter(crew_member_id__in=crew_member_ids)
+
+    rows = queryset.order_by('crew_member_id', 'duty_start_time', 'id').values(*CONFLICT_FIELDS)
+
+    conflicts = []
+    for _, duties in groupby(rows.iterator(chunk_size=2000), key=lambda row: row['crew_member_id']):
+        for first, second in sweep_overlaps(duties):
+            conflicts.append({
+                'crew_member': first['crew_member__username'],
+                'crew_member_id': first['crew_member_id'],
+                'date': first['duty_date'],
+                'cross_day': first['duty_date'] != second['duty_date'],
+                'overlap_start': second['duty_start_time'],
+                'overlap_end': min(first['duty_end_time'], second['duty_end_time']),
+                'conflict_duties': [duty_summary(first), duty_summary(second)],
+            })
+    return conflicts
@@ -0,0 +1,348 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import queue_rollups, roster_keys
+from .availability import get_availability_index
+from .cache import invalidate
+from .fatigue import DutyInterval, assess, build_timelines, hours_between, recompute_fatigue_logs, required_rest_until
+from .models import DutyRoster, Flight, Tombstone
+from .pubsub import duty_event, publish_event
+from .scheduling import RELEASE_AFTER, REPORT_BEFORE
+from .sync import tombstones_for
+
+PLAN_SALT = 'famadata.disruption'
+# A plan must be applied within this long of being computed
+PLAN_MAX_AGE = timedelta(minutes=15)
+# Later duties this far after a delayed one are checked for knock-on violations
+KNOCK_ON_WINDOW = timedelta(hours=48)
+# Standby and reserve candidates short-listed per duty needing a new crew member
+SHORTLIST = 5
+CALLOUT_SOURCES = ('standby', 'reserve')
+
+ROSTER_FIELDS = (
+    'id', 'crew_member_id', 'flight_id', 'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time',
+    'position', 'updated_at', 'flight__flight_number', 'flight__haul_type',
+    'flight__scheduled_departure', 'flight__scheduled_arrival',
+)
+
+
+class InvalidPlan(Exception):
+    pass
+
+
+class StalePlan(Exception):
+    def __init__(self, roster_ids):
+        super().__init__('Rosters changed since the plan was made')
+        self.roster_ids = roster_ids
+
+
+def delayed_window(flight, delay):
+    """(departure, arrival) of a delayed flight: actual times when known, plus `delay`"""
+    departure = (flight['actual_departure'] or flight['scheduled_departure']) + delay
+    arrival = (flight['actual_arrival'] or flight['scheduled_arrival']) + delay
+    return departure, arrival
+
+
+def change_for(row, action, **extra):
+    change = {
+        'roster': row['id'],
+        'action': action,
+        'crew_member': row['crew_member_id'],
+        'flight': row['flight_id'],
+        'flight_number': row['flight__flight_number'],
+        'duty_date': row['duty_date'],
+        'position': row['position'],
+        'duty_start_time': row['duty_start_time'],
+        'duty_end_time': row['duty_end_time'],
+        'updated_at': row['updated_at'],
+    }
+    change.update(extra)
+    return change
+
+
+def knock_on(retimed, later):
+    """Changes for the later duties a retimed duty now overlaps or leaves too little rest before.
+
+    A clashing flight duty needs another crew member; a clashing standby, reserve or
+    off slot is dropped. The first later duty left intact ends the chain.
+    """
+    changes = []
+    rest_until = required_rest_until(retimed['duty_start_time'], retimed['duty_end_time'], 'green')
+    for row in later:
+        overlaps = row['duty_start_time'] < retimed['duty_end_time']
+        short_rest = row['duty_type'] == 'active' and row['duty_start_time'] < rest_until
+        if not (overlaps or short_rest):
+            break
+        violation = {'type': 'overlap' if overlaps else 'insufficient_rest', 'rest_required_until': rest_until}
+        if row['duty_type'] == 'active' and row['flight_id']:
+            departure, arrival = row['flight__scheduled_departure'], row['flight__scheduled_arrival']
+            # A duty that was itself stretched is handed over with its new times
+            stretched = {
+                'new_duty_start_time': row['duty_start_time'], 'new_duty_end_time': row['duty_end_time']
+            } if row.get('retimed') else {}
+            changes.append(change_for(
+                row, 'reassign', violations=[violation], replacement=None, haul_type=row['flight__haul_type'],
+                flight_hours=hours_between(departure, arrival) if departure and arrival else 0.0, **stretched
+            ))
+        elif overlaps:
+            changes.append(change_for(row, 'drop', violations=[violation]))
+    return changes
+
+
+def find_replacements(changes, busy_crew):
+    """Fill each 'reassign' change with a standby or reserve crew member, one duty each.
+
+    Candidates come from the availability index; their rolling fatigue limits are
+    checked with one build_timelines call for every short-list together.
+    """
+    reassign = sorted(
+        (change for change in changes if change['action'] == 'reassign'),
+        key=lambda change: change['duty_start_time']
+    )
+    if not reassign:
+        return
+    index = get_availability_index(
+        timezone.localdate(reassign[0]['duty_start_time']),
+        timezone.localdate(max(change['duty_end_time'] for change in reassign))
+    )
+    shortlists = {
+        change['roster']: index.candidates(
+            change['position'], change['haul_type'], change['duty_start_time'], change['duty_end_time'],
+            exclude=busy_crew, sources=CALLOUT_SOURCES, limit=SHORTLIST + len(reassign)
+        )
+        for change in reassign
+    }
+    crew_ids = {profile['user_id'] for found in shortlists.values() for profile, _, _ in found}
+    if not crew_ids:
+        return
+    timelines = build_timelines(
+        crew_ids, reassign[0]['duty_start_time'], max(change['duty_end_time'] for change in reassign)
+    )
+
+    taken = set()
+    for change in reassign:
+        interval = DutyInterval(change['duty_start_time'], change['duty_end_time'], change['flight_hours'])
+        for profile, slot, source in shortlists[change['roster']]:
+            crew_member_id = profile['user_id']
+            if crew_member_id in taken or slot.roster_id in taken:
+                continue
+            _, breaches = assess(timelines[crew_member_id].with_intervals([interval]).rolling_totals(interval.end))
+            if breaches:
+                continue
+            taken.update([crew_member_id, slot.roster_id])
+            change['replacement'] = {
+                'crew_member': crew_member_id,
+                'username': profile['user__username'],
+                'seniority': profile['seniority'],
+                'source': source,
+                'slot': slot.roster_id,
+            }
+            break
+
+
+def plan_disruption(flight_ids, delays=None):
+    """Work out what cancelled or delayed flights do to their crews' rosters.
+
+    Crew of a cancelled flight are released to standby for the same hours. Crew of
+    a delayed flight get a duty stretched to the new report and release times, and
+    each later duty it then overlaps or leaves too little rest before is either
+    dropped (standby, reserve, off) or handed to a standby or reserve crew member.
+    `delays` maps flight ids to an extra timedelta; without one the flight's actual
+    or rescheduled times are used. Uses a fixed number of queries however many
+    flights are disrupted. Returns the changes with a signed token to apply them.
+    """
+    delays = delays or {}
+    flights = {
+        row['id']: row
+        for row in Flight.objects.filter(id__in=flight_ids).values(
+            'id', 'status', 'scheduled_departure', 'scheduled_arrival', 'actual_departure', 'actual_arrival'
+        )
+    }
+    rows = DutyRoster.objects.filter(flight_id__in=flights).values(*ROSTER_FIELDS).order_by('duty_start_time')
+
+    # Changes by roster id; retimed rows carry their new times, grouped by crew member
+    changes, retimed = {}, defaultdict(list)
+    for row in rows:
+        flight = flights[row['flight_id']]
+        if flight['status'] == 'cancelled':
+            changes[row['id']] = change_for(row, 'release', new_duty_type='standby')
+            continue
+        departure, arrival = delayed_window(flight, delays.get(flight['id'], timedelta(0)))
+        start = max(row['duty_start_time'], departure - REPORT_BEFORE)
+        end = max(row['duty_end_time'], arrival + RELEASE_AFTER)
+        if (start, end) != (row['duty_start_time'], row['duty_end_time']):
+            changes[row['id']] = change_for(row, 'retime', new_duty_start_time=start, new_duty_end_time=end)
+            retimed[row['crew_member_id']].append(dict(row, duty_start_time=start, duty_end_time=end, retimed=True))
+
+    later = defaultdict(list)
+    if retimed:
+        first_start = {
+            crew_member_id: min(row['duty_start_time'] for row in crew_rows)
+            for crew_member_id, crew_rows in retimed.items()
+        }
+        others = DutyRoster.objects.filter(
+            crew_member_id__in=retimed,
+            duty_start_time__gte=min(first_start.values()),
+            duty_start_time__lt=max(row['duty_end_time'] for rows in retimed.values() for row in rows) + KNOCK_ON_WINDOW,
+        ).exclude(id__in=list(changes)).values(*ROSTER_FIELDS).order_by('duty_start_time')
+        for row in others:
+            if row['duty_start_time'] >= first_start[row['crew_member_id']]:
+                later[row['crew_member_id']].append(row)
+
+    # Walk each crew member's duties in order: every stretched duty is checked against
+    # the ones after it, including their other stretched duties
+    for crew_member_id, crew_rows in retimed.items():
+        duties = sorted(
+            crew_rows + later[crew_member_id], key=lambda row: (row['duty_start_time'], row['duty_end_time'])
+        )
+        handed_over = set()
+        for position, row in enumerate(duties):
+            if not row.get('retimed') or row['id'] in handed_over:
+                continue
+            following = [other for other in duties[position + 1:] if other['id'] not in handed_over]
+            for change in knock_on(row, following):
+                handed_over.add(change['roster'])
+                changes[change['roster']] = change
+    changes = list(changes.values())
+
+    busy_crew = {change['crew_member'] for change in changes}
+    find_replacements(changes, busy_crew)
+    for change in changes:
+        change.pop('haul_type', None)
+        change.pop('flight_hours', None)
+
+    return {
+        'flights': list(flights),
+        'changes': changes,
+        'unfilled': sum(1 for change in changes if change['action'] == 'reassign' and not change['replacement']),
+        'plan': make_plan_token(changes),
+    }
+
+
+def make_plan_token(changes):
+    items = []
+    for change in changes:
+        item = {'r': str(change['roster']), 'a': change['action'], 'u': change['updated_at'].isoformat()}
+        if 'new_duty_start_time' in change:
+            item['s'] = change['new_duty_start_time'].isoformat()
+            item['e'] = change['new_duty_end_time'].isoformat()
+        if change.get('replacement'):
+            item['c'] = str(change['replacement']['crew_member'])
+            item['slot'] = str(change['replacement']['slot'])
+        items.append(item)
+    return signing.dumps(items, salt=PLAN_SALT, compress=True)
+
+
+def read_plan_token(token):
+    try:
+        return signing.loads(token, salt=PLAN_SALT, max_age=PLAN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise InvalidPlan('Plan expired; compute it again')
+    except signing.BadSignature:
+        raise InvalidPlan('Invalid plan')
+
+
+def apply_disruption(token, accept=None):
+    """Apply a plan from plan_disruption in one transaction, locking every roster it touches.
+
+    `accept` limits it to the listed roster ids. Duties nobody could take over stay
+    with their crew member, at the new times if they were stretched. Raises StalePlan, and applies nothing, if any of
+    the rosters or replacement slots changed since the plan was made.
+    """
+    items = read_plan_token(token)
+    if accept is not None:
+        accepted = {str(roster_id) for roster_id in accept}
+        items = [item for item in items if item['r'] in accepted]
+    for item in items:
+        if item['a'] == 'reassign' and 'c' not in item and 's' in item:
+            # Nobody to hand a stretched duty to: its crew member keeps it at the new times
+            item['a'] = 'retime'
+    items = [item for item in items if item['a'] != 'reassign' or 'c' in item]
+
+    with transaction.atomic():
+        ids = {item['r'] for item in items} | {item['slot'] for item in items if 'slot' in item}
+        rosters = {
+            str(roster.id): roster
+            for roster in DutyRoster.objects.select_for_update().filter(id__in=ids).order_by('id')
+        }
+        stale = [
+            item['r'] for item in items
+            if item['r'] not in rosters or rosters[item['r']].updated_at != parse_datetime(item['u'])
+        ]
+        stale += [
+            item['slot'] for item in items
+            if 'slot' in item and (
+                item['slot'] not in rosters
+                or str(rosters[item['slot']].crew_member_id) != item['c']
+                or rosters[item['slot']].duty_type not in CALLOUT_SOURCES
+            )
+        ]
+        if stale:
+            raise StalePlan(stale)
+
+        now = timezone.now()
+        before = [rosters[item['r']] for item in items]
+        before += [rosters[item['slot']] for item in items if 'slot' in item]
+        crew_days, flight_days = roster_keys(before)
+        affected = {roster.crew_member_id for roster in before}
+        earliest = [roster.duty_start_time for roster in before]
+        dropped, changed, reassigned = [], [], []
+        for item in items:
+            roster = rosters[item['r']]
+            if item['a'] == 'drop':
+                dropped.append(roster)
+                continue
+            if item['a'] == 'release':
+                roster.duty_type, roster.flight_id = 'standby', None
+            if 's' in item:
+                roster.duty_start_time, roster.duty_end_time = parse_datetime(item['s']), parse_datetime(item['e'])
+            if item['a'] == 'reassign':
+                # The replacement's standby or reserve slot gives way to the flight duty
+                dropped.append(rosters[item['slot']])
+                reassigned.append((roster, roster.crew_member_id))
+                roster.crew_member_id = rosters[item['slot']].crew_member_id
+                affected.add(roster.crew_member_id)
+            roster.updated_at = now
+            changed.append(roster)
+
+        # QuerySet.delete() would run every post_delete receiver once per row (a
+        # tombstone insert and a rollup refresh each), thousands of queries for a hub
+        # event. The private _raw_delete is safe here: nothing references DutyRoster,
+        # so there is nothing to cascade; the rows are locked above; and what the
+        # receivers do (tombstones, rollups, cache and availability invalidation) is
+        # done below for the whole batch. A new DutyRoster post_delete receiver must be
+        # mirrored here; DisruptionTests checks the list.
+        DutyRoster.objects.filter(id__in=[roster.id for roster in dropped])._raw_delete(DutyRoster.objects.db)
+        DutyRoster.objects.bulk_update(
+            changed, ['crew_member_id', 'flight_id', 'duty_type', 'duty_start_time', 'duty_end_time', 'updated_at'],
+            batch_size=500,
+        )
+        Tombstone.objects.bulk_create([
+            Tombstone(model='dutyroster', object_id=str(roster.pk), crew_member=previous)
+            for roster, previous in reassigned
+        ] + [tombstone for roster in dropped for tombstone in tombstones_for(roster)])
+        if before:
+            # Dropped duties count too: their days and the logs after them lose a duty
+            recompute_fatigue_logs(
+                affected, since=min(earliest + [roster.duty_start_time for roster in changed]) - timedelta(days=1)
+            )
+            after_days, after_flights = roster_keys(changed)
+            queue_rollups(crew_days | after_days, flight_days | after_flights)
+        for item in items:
+            roster = rosters[item['r']]
+            crew_member_ids = {roster.crew_member_id} | {previous for done, previous in reassigned if done is roster}
+            publish_event(crew_member_ids, 'duty_change', duty_event(roster, item['a']))
+
+    invalidate(DutyRoster)
+    return {
+        'applied': len(items),
+        'released': sum(1 for item in items if item['a'] == 'release'),
+        'retimed': sum(1 for item in items if item['a'] == 'retime'),
+        'reassigned': len(reassigned),
+        'dropped': sum(1 for item in items if item['a'] == 'drop'),
+    }
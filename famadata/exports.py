@@ -0,0 +1,121 @@
+import csv
+import io
+from datetime import timedelta
+from functools import partial
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .conflicts import day_start
+
+# Rows fetched per database round trip and written per streamed chunk
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Exported columns as values() lookups; the header joins related lookups with "_"
+DUTY_ROSTER_EXPORT = (
+    'id', 'crew_member_id', 'crew_member__username', 'flight_id', 'flight__flight_number',
+    'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time', 'position', 'created_at', 'updated_at',
+)
+FATIGUE_LOG_EXPORT = (
+    'id', 'crew_member_id', 'crew_member__username', 'duty_start', 'duty_end', 'total_duty_hours',
+    'flight_hours', 'fatigue_level', 'rest_required_until', 'created_at',
+)
+ALERT_RECIPIENT_EXPORT = (
+    'id', 'alert_id', 'alert__alert_type', 'alert__severity', 'alert__title', 'alert__flight__flight_number',
+    'recipient_id', 'recipient__username', 'is_read', 'read_at', 'sms_sent', 'sms_delivery_status',
+    'created_at', 'updated_at',
+)
+
+
+def column_name(lookup):
+    return lookup.replace('__', '_')
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column_name(field) for field in fields])
+    while True:
+        chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        writer.writerows([csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(rows, fields):
+    names = [column_name(field) for field in fields]
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    while True:
+        chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in chunk)
+
+
+def in_date_range(queryset, field, start_date=None, end_date=None):
+    """Filter `field` to the local days [start_date, end_date], either bound optional"""
+    if queryset.model._meta.get_field(field).get_internal_type() == 'DateField':
+        start, end = start_date, end_date
+        end_lookup = 'lte'
+    else:
+        start = day_start(start_date) if start_date else None
+        end = day_start(end_date + timedelta(days=1)) if end_date else None
+        end_lookup = 'lt'
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__{end_lookup}': end})
+    return queryset
+
+
+async def async_chunks(chunks):
+    """Hand a chunk generator to an ASGI server one chunk at a time.
+
+    Each chunk is produced in the thread that holds the database connection; a sync
+    iterator would be read into a list by Django before the first byte is sent.
+    """
+    fetch = sync_to_async(partial(next, chunks, None))
+    while True:
+        chunk = await fetch()
+        if chunk is None:
+            return
+        yield chunk
+
+
+def export_response(queryset, fields, file_format, name, asynchronous=False):
+    """Stream `queryset` as CSV or NDJSON.
+
+    Rows are read as value tuples through a chunked server-side iterator and written
+    EXPORT_CHUNK_SIZE at a time, so memory does not grow with the size of the export.
+    Pass `asynchronous` when serving under ASGI.
+    """
+    rows = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    chunks = csv_chunks(rows, fields) if file_format == 'csv' else ndjson_chunks(rows, fields)
+    if asynchronous:
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_CONTENT_TYPES[file_format])
+    filename = f'{name}-{timezone.localdate().isoformat()}.{file_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,298 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate, chain
+
+from django.conf import settings
+from django.utils import timezone
+
+from .analytics import local_date, queue_rollups
+from .cache import invalidate
+from .models import CrewFatigueStatus, DutyRoster, FatigueLog
+
+
+ROLLING_WINDOWS = [
+    ('24h', timedelta(hours=24)),
+    ('7d', timedelta(days=7)),
+    ('28d', timedelta(days=28)),
+    ('365d', timedelta(days=365)),
+]
+
+# Cumulative limits per rolling window, in hours
+DEFAULT_FATIGUE_LIMITS = {
+    'duty_hours': {'24h': 13, '7d': 60, '28d': 190, '365d': 2000},
+    'flight_hours': {'24h': 9, '7d': 34, '28d': 100, '365d': 1000},
+}
+
+# Share of a limit at which a crew member is flagged orange
+WARNING_RATIO = 0.85
+
+MIN_REST = timedelta(hours=12)
+EXTENDED_REST = timedelta(hours=36)
+
+LONGEST_WINDOW = max(length for _, length in ROLLING_WINDOWS)
+MAX_HOURS_VALUE = Decimal('99.99')
+
+
+def fatigue_limits():
+    return getattr(settings, 'FAMA_FATIGUE_LIMITS', DEFAULT_FATIGUE_LIMITS)
+
+
+def hours_between(start, end):
+    return max((end - start).total_seconds(), 0) / 3600
+
+
+class DutyInterval:
+    """A single duty period with the flight time flown during it"""
+    __slots__ = ('start', 'end', 'flight_hours', 'source', 'ref')
+
+    def __init__(self, start, end, flight_hours=0.0, source='roster', ref=None):
+        self.start = start
+        self.end = end
+        self.flight_hours = float(flight_hours or 0)
+        self.source = source
+        self.ref = ref
+
+    @property
+    def duty_hours(self):
+        return hours_between(self.start, self.end)
+
+
+class CrewTimeline:
+    """Time-sorted duty intervals of one crew member with prefix sums of duty and flight hours.
+
+    `hours_in_window` answers "hours worked between t0 and t1" with binary searches,
+    clipping the intervals that straddle the window edges. Intervals may overlap, so
+    those are found by start time within the longest interval's length of each edge.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals, key=lambda interval: (interval.start, interval.end))
+        self.starts = []
+        self.max_ends = []
+        self.duty_prefix = [0.0]
+        self.flight_prefix = [0.0]
+        self.longest = timedelta(0)
+        max_end = None
+        for interval in self.intervals:
+            max_end = interval.end if max_end is None else max(max_end, interval.end)
+            self.starts.append(interval.start)
+            self.max_ends.append(max_end)
+            self.longest = max(self.longest, interval.end - interval.start)
+            self.duty_prefix.append(self.duty_prefix[-1] + interval.duty_hours)
+            self.flight_prefix.append(self.flight_prefix[-1] + interval.flight_hours)
+
+    def with_intervals(self, extra):
+        """Return a new timeline including `extra` intervals"""
+        return CrewTimeline(list(self.intervals) + list(extra))
+
+    def without_rosters(self, roster_ids):
+        """Return a new timeline without the rostered duties in `roster_ids`"""
+        return CrewTimeline(
+            interval for interval in self.intervals
+            if interval.source != 'roster' or interval.ref not in roster_ids
+        )
+
+    def hours_in_window(self, window_start, window_end):
+        """Return (duty_hours, flight_hours) worked inside [window_start, window_end)"""
+        first = bisect_right(self.max_ends, window_start)
+        last = bisect_left(self.starts, window_end)
+        if first >= last:
+            return 0.0, 0.0
+
+        duty = self.duty_prefix[last] - self.duty_prefix[first]
+        flight = self.flight_prefix[last] - self.flight_prefix[first]
+        # Started before the window, or late enough and long enough to run past its end
+        head = bisect_left(self.starts, window_start, first, last)
+        tail = bisect_left(self.starts, window_end - self.longest, head, last)
+        for index in chain(range(first, head), range(tail, last)):
+            interval = self.intervals[index]
+            full = interval.duty_hours
+            inside = hours_between(max(interval.start, window_start), min(interval.end, window_end))
+            duty -= full - inside
+            if full:
+                flight -= interval.flight_hours * (full - inside) / full
+        return duty, flight
+
+    def rolling_totals(self, at):
+        """Return duty and flight hours for every rolling window ending at `at`"""
+        totals = {}
+        for name, length in ROLLING_WINDOWS:
+            duty, flight = self.hours_in_window(at - length, at)
+            totals[name] = {'duty_hours': round(duty, 2), 'flight_hours': round(flight, 2)}
+        return totals
+
+    def previous_duty(self, before):
+        """Return the latest interval ending at or before `before`, if any"""
+        for index in range(bisect_left(self.starts, before) - 1, -1, -1):
+            if self.intervals[index].end <= before:
+                return self.intervals[index]
+        return None
+
+
+def assess(totals):
+    """Classify rolling totals into a fatigue level and the list of limits reached"""
+    level = 'green'
+    breaches = []
+    limits = fatigue_limits()
+    for kind, windows in limits.items():
+        for window, limit in windows.items():
+            value = totals.get(window, {}).get(kind, 0)
+            if value > limit:
+                level = 'red'
+                breaches.append({'window': window, 'kind': kind, 'hours': value, 'limit': limit})
+            elif value >= limit * WARNING_RATIO and level == 'green':
+                level = 'orange'
+    return level, breaches
+
+
+def required_rest_until(duty_start, duty_end, fatigue_level):
+    """Rest must last at least as long as the duty, MIN_REST, or EXTENDED_REST when red"""
+    rest = max(MIN_REST, duty_end - duty_start)
+    if fatigue_level == 'red':
+        rest = max(rest, EXTENDED_REST)
+    return duty_end + rest
+
+
+def roster_flight_hours(row):
+    departure = row['flight__actual_departure'] or row['flight__scheduled_departure']
+    arrival = row['flight__actual_arrival'] or row['flight__scheduled_arrival']
+    if departure and arrival:
+        return hours_between(departure, arrival)
+    return 0.0
+
+
+def load_intervals(crew_member_ids, start, end):
+    """Load active duties and fatigue logs overlapping [start, end) with two queries.
+
+    Logged duties are the actual record, so rostered duties overlapping a log are folded
+    into it: their flight time is credited to the log and they are not counted twice.
+    Returns {crew_member_id: [DutyInterval, ...]}.
+    """
+    now = timezone.now()
+    logs = defaultdict(list)
+    log_rows = FatigueLog.objects.filter(
+        crew_member_id__in=crew_member_ids, duty_start__lt=end
+    ).exclude(duty_end__lte=start).values('id', 'crew_member_id', 'duty_start', 'duty_end', 'flight_hours')
+    for row in log_rows.iterator(chunk_size=2000):
+        duty_end = row['duty_end'] or max(now, row['duty_start'])
+        logs[row['crew_member_id']].append(
+            DutyInterval(row['duty_start'], duty_end, row['flight_hours'], source='log', ref=row['id'])
+        )
+    for crew_logs in logs.values():
+        crew_logs.sort(key=lambda interval: interval.start)
+
+    intervals = defaultdict(list)
+    roster_rows = DutyRoster.objects.filter(
+        crew_member_id__in=crew_member_ids, duty_type='active',
+        duty_start_time__lt=end, duty_end_time__gt=start
+    ).values(
+        'id', 'crew_member_id', 'duty_start_time', 'duty_end_time',
+        'flight__scheduled_departure', 'flight__scheduled_arrival',
+        'flight__actual_departure', 'flight__actual_arrival',
+    )
+    log_starts = {
+        crew_member_id: [interval.start for interval in crew_logs]
+        for crew_member_id, crew_logs in logs.items()
+    }
+    log_reach = {
+        crew_member_id: list(accumulate((interval.end for interval in crew_logs), max))
+        for crew_member_id, crew_logs in logs.items()
+    }
+    roster_credit = defaultdict(float)
+    for row in roster_rows.iterator(chunk_size=2000):
+        crew_logs = logs.get(row['crew_member_id'], [])
+        flight_hours = roster_flight_hours(row)
+        covering = overlapping_log(
+            crew_logs, log_starts.get(row['crew_member_id'], []), log_reach.get(row['crew_member_id'], []),
+            row['duty_start_time'], row['duty_end_time']
+        )
+        if covering is not None:
+            roster_credit[covering.ref] += flight_hours
+            continue
+        intervals[row['crew_member_id']].append(
+            DutyInterval(row['duty_start_time'], row['duty_end_time'], flight_hours, ref=row['id'])
+        )
+
+    for crew_member_id, crew_logs in logs.items():
+        for interval in crew_logs:
+            if roster_credit.get(interval.ref):
+                interval.flight_hours = roster_credit[interval.ref]
+        intervals[crew_member_id].extend(crew_logs)
+    return intervals
+
+
+def overlapping_log(crew_logs, starts, reach, start, end):
+    """Return a logged interval overlapping [start, end) from the sorted `crew_logs`.
+
+    `reach` is the running maximum of their ends: logs before the first one reaching
+    past `start` all ended before it.
+    """
+    first = bisect_right(reach, start)
+    for index in range(bisect_left(starts, end) - 1, first - 1, -1):
+        if crew_logs[index].end > start:
+            return crew_logs[index]
+    return None
+
+
+def build_timelines(crew_member_ids, start, end):
+    """Return {crew_member_id: CrewTimeline} covering every rolling window ending in [start, end]"""
+    crew_member_ids = set(crew_member_ids)
+    intervals = load_intervals(crew_member_ids, start - LONGEST_WINDOW, end)
+    return {crew_member_id: CrewTimeline(intervals.get(crew_member_id, [])) for crew_member_id in crew_member_ids}
+
+
+def to_hours_value(hours):
+    return min(Decimal(str(round(hours, 2))), MAX_HOURS_VALUE)
+
+
+def recompute_fatigue_logs(crew_member_ids=None, since=None):
+    """Derive hours, fatigue level and required rest for FatigueLog rows and write them back.
+
+    Loads every affected crew member's history with a constant number of queries and
+    saves the results with bulk_update. Returns the number of logs updated.
+    """
+    logs = FatigueLog.objects.all()
+    if crew_member_ids is not None:
+        logs = logs.filter(crew_member_id__in=crew_member_ids)
+    if since is not None:
+        logs = logs.filter(duty_start__gte=since)
+    logs = list(logs.order_by('crew_member_id', 'duty_start'))
+    if not logs:
+        return 0
+
+    now = timezone.now()
+    window_start = min(log.duty_start for log in logs)
+    window_end = max((log.duty_end or now) for log in logs)
+    crew_ids = {log.crew_member_id for log in logs}
+    timelines = build_timelines(crew_ids, window_start, window_end)
+    logged_intervals = {
+        interval.ref: interval
+        for timeline in timelines.values()
+        for interval in timeline.intervals
+        if interval.source == 'log'
+    }
+
+    relevelled = set()
+    for log in logs:
+        timeline = timelines[log.crew_member_id]
+        duty_end = log.duty_end or max(now, log.duty_start)
+        level, _ = assess(timeline.rolling_totals(duty_end))
+        logged = logged_intervals.get(log.id)
+
+        log.total_duty_hours = to_hours_value(hours_between(log.duty_start, duty_end))
+        if logged is not None:
+            log.flight_hours = to_hours_value(logged.flight_hours)
+        if log.fatigue_level != level:
+            relevelled.add((log.crew_member_id, local_date(log.duty_start)))
+        log.fatigue_level = level
+        log.rest_required_until = required_rest_until(log.duty_start, duty_end, level) if log.duty_end else None
+
+    FatigueLog.objects.bulk_update(
+        logs, ['total_duty_hours', 'flight_hours', 'fatigue_level', 'rest_required_until'], batch_size=500
+    )
+    CrewFatigueStatus.objects.refresh(crew_ids)
+    invalidate(FatigueLog)
+    queue_rollups(relevelled)
+    return len(logs)
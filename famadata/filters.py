@@ -0,0 +1,21 @@
+import django_filters
+from django_filters.widgets import QueryArrayWidget
+
+from .models import DutyRoster
+
+
+class UUIDInFilter(django_filters.BaseInFilter, django_filters.UUIDFilter):
+    """Any of several UUIDs, given as ?name=a&name=b or ?name=a,b; a malformed one is a 400"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('lookup_expr', 'in')
+        kwargs.setdefault('widget', QueryArrayWidget)
+        super().__init__(*args, **kwargs)
+
+
+class DutyRosterFilter(django_filters.FilterSet):
+    crew_member = UUIDInFilter(field_name='crew_member_id')
+
+    class Meta:
+        model = DutyRoster
+        fields = ['duty_type', 'position', 'duty_date', 'crew_member']
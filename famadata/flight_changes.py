@@ -0,0 +1,202 @@
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import local_date, queue_rollups
+from .cache import invalidate
+from .models import Alert, AlertRecipient, CustomUser, DutyRoster, PendingFlightChange
+from .pubsub import alert_event, publish_event
+from .sms_queue import enqueue_alert_sms
+
+logger = logging.getLogger(__name__)
+
+# Flight fields whose changes are turned into alerts
+TRACKED_FIELDS = ('status', 'gate', 'scheduled_departure', 'scheduled_arrival')
+SCHEDULE_FIELDS = ('scheduled_departure', 'scheduled_arrival')
+
+# Alert type -> severity, most urgent first; the first type present names the alert
+ALERT_SEVERITIES = [
+    ('cancellation', 'critical'),
+    ('departure', 'medium'),
+    ('duration', 'low'),
+    ('gate', 'medium'),
+]
+# A departure moved by at least this much is raised to high severity
+MAJOR_DELAY = timedelta(hours=1)
+
+
+def debounce():
+    """Quiet period after the last change before its alert goes out"""
+    return timedelta(seconds=getattr(settings, 'FLIGHT_ALERT_DEBOUNCE', 60))
+
+
+def max_delay():
+    """Changes keep arriving: the alert goes out anyway this long after the first one"""
+    return timedelta(seconds=getattr(settings, 'FLIGHT_ALERT_MAX_DELAY', 300))
+
+
+def encode(value):
+    if hasattr(value, 'astimezone'):
+        return value.astimezone(dt_timezone.utc).isoformat()
+    return value
+
+
+def decode(name, value):
+    return parse_datetime(value) if name in SCHEDULE_FIELDS and value else value
+
+
+def snapshot(flight):
+    """Tracked values as loaded; deferred fields are left out rather than fetched"""
+    return {name: encode(flight.__dict__[name]) for name in TRACKED_FIELDS if name in flight.__dict__}
+
+
+def diff(before, flight):
+    after = snapshot(flight)
+    return {name: [before[name], after[name]] for name in before.keys() & after.keys() if before[name] != after[name]}
+
+
+def record_flight_change(flight, changes, changed_by=None, now=None):
+    """Merge `changes` ({field: [old, new]}) into the flight's pending change.
+
+    Successive changes keep the oldest value and the newest one, and a field changed
+    back to its original value drops out; the alert is due once the flight has been
+    quiet for debounce(), or max_delay() after the first change.
+    """
+    now = now or timezone.now()
+    quiet, latest = debounce(), max_delay()
+    with transaction.atomic():
+        pending, created = PendingFlightChange.objects.select_for_update().get_or_create(
+            flight=flight, defaults={'first_changed_at': now, 'flush_after': now + quiet}
+        )
+        merged = dict(pending.changes)
+        for name, (old, new) in changes.items():
+            old = merged[name][0] if name in merged else old
+            if old == new:
+                merged.pop(name, None)
+            else:
+                merged[name] = [old, new]
+
+        if not merged:
+            pending.delete()
+            return None
+        pending.changes = merged
+        pending.changed_by = changed_by or pending.changed_by
+        pending.flush_after = min(now + quiet, pending.first_changed_at + latest)
+        pending.save()
+    return pending
+
+
+def alert_types(changes):
+    types = set()
+    if 'gate' in changes:
+        types.add('gate')
+    if 'scheduled_departure' in changes:
+        types.add('departure')
+    status = changes.get('status', [None, None])[1]
+    if status == 'cancelled':
+        types.add('cancellation')
+    elif status == 'delayed':
+        types.add('departure')
+    if 'scheduled_departure' in changes and 'scheduled_arrival' in changes:
+        departure, arrival = [[decode(name, value) for value in changes[name]] for name in SCHEDULE_FIELDS]
+        if all(departure + arrival) and arrival[0] - departure[0] != arrival[1] - departure[1]:
+            types.add('duration')
+    elif 'scheduled_arrival' in changes:
+        types.add('duration')
+    return types
+
+
+def build_alert(pending, author):
+    """Unsaved Alert describing every coalesced change of one flight, or None"""
+    flight, changes = pending.flight, pending.changes
+    types = alert_types(changes)
+    if not types:
+        return None
+    alert_type, severity = next((kind, level) for kind, level in ALERT_SEVERITIES if kind in types)
+    if 'scheduled_departure' in changes:
+        old, new = [decode('scheduled_departure', value) for value in changes['scheduled_departure']]
+        if alert_type == 'departure' and abs(new - old) >= MAJOR_DELAY:
+            severity = 'high'
+
+    lines = []
+    for name, (old, new) in sorted(changes.items()):
+        old, new = decode(name, old), decode(name, new)
+        if name in SCHEDULE_FIELDS:
+            old, new = [timezone.localtime(value).strftime('%d %b %H:%M') if value else '-' for value in (old, new)]
+        lines.append(f"{name.replace('_', ' ').capitalize()}: {old or '-'} -> {new or '-'}")
+    return Alert(
+        alert_type=alert_type,
+        severity=severity,
+        title=f"{flight.flight_number} {dict(Alert.ALERT_TYPE_CHOICES)[alert_type]}",
+        message='\n'.join(lines),
+        flight=flight,
+        created_by=pending.changed_by or author,
+    )
+
+
+def default_author():
+    username = getattr(settings, 'FLIGHT_ALERT_AUTHOR', None)
+    users = CustomUser.objects.filter(username=username) if username else CustomUser.objects.filter(is_superuser=True)
+    return users.order_by('created_at').first()
+
+
+def flush_flight_changes(now=None, limit=500):
+    """Turn due pending changes into alerts for each flight's rostered crew.
+
+    Alerts and recipients are written with one bulk_create each, whatever the number
+    of flights; SMS and WebSocket pushes are queued after commit. Changes that have no
+    author are rescheduled max_delay() later. Returns the alerts.
+    """
+    now = now or timezone.now()
+    author = default_author()
+    with transaction.atomic():
+        due = list(
+            PendingFlightChange.objects.select_for_update(skip_locked=True)
+            .select_related('flight', 'changed_by').filter(flush_after__lte=now)
+            .order_by('flush_after')[:limit]
+        )
+        if not due:
+            return []
+        if author is None:
+            orphans = [pending.pk for pending in due if pending.changed_by_id is None]
+            if orphans:
+                # Kept for a later run rather than lost, but out of the way of the due rows
+                logger.warning(
+                    'No author for %d automatic flight alerts, retrying in %s; set FLIGHT_ALERT_AUTHOR or create a superuser',
+                    len(orphans), max_delay(),
+                )
+                PendingFlightChange.objects.filter(pk__in=orphans).update(flush_after=now + max_delay())
+                due = [pending for pending in due if pending.changed_by_id is not None]
+
+        alerts = [alert for alert in (build_alert(pending, author) for pending in due) if alert]
+        Alert.objects.bulk_create(alerts)
+
+        crew = {}
+        rosters = DutyRoster.objects.filter(flight_id__in=[alert.flight_id for alert in alerts]).values_list(
+            'flight_id', 'crew_member_id'
+        )
+        for flight_id, crew_member_id in rosters:
+            crew.setdefault(flight_id, set()).add(crew_member_id)
+        recipients = AlertRecipient.objects.bulk_create(
+            [
+                AlertRecipient(alert=alert, recipient_id=crew_member_id)
+                for alert in alerts for crew_member_id in crew.get(alert.flight_id, ())
+            ],
+            batch_size=500,
+        )
+        queue_rollups(
+            [(recipient.recipient_id, local_date(recipient.created_at)) for recipient in recipients],
+            flight_days=[(recipient.alert.flight_id, local_date(recipient.created_at)) for recipient in recipients],
+        )
+        PendingFlightChange.objects.filter(pk__in=[pending.pk for pending in due]).delete()
+
+        for alert in alerts:
+            recipients = crew.get(alert.flight_id, set())
+            transaction.on_commit(lambda alert=alert: enqueue_alert_sms(alert))
+            publish_event(recipients, 'alert', alert_event(alert))
+    invalidate(Alert, AlertRecipient)
+    return alerts
@@ -0,0 +1,171 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from .conflicts import sweep_overlaps
+from .fatigue import (
+    MIN_REST, DutyInterval, assess, build_timelines, hours_between, required_rest_until
+)
+from .models import CustomUser, DutyRoster, FatigueLog, Flight
+
+
+REST_DUTY_TYPES = {'active'}
+
+
+def rest_after(duty):
+    """Earliest time the next active duty may start after `duty`"""
+    return required_rest_until(duty['duty_start_time'], duty['duty_end_time'], 'green')
+
+
+def proposal_flight_hours(proposal, flights):
+    flight = flights.get(proposal.get('flight'))
+    if not flight:
+        return 0.0
+    return hours_between(flight['scheduled_departure'], flight['scheduled_arrival'])
+
+
+def check_proposals(proposals, exclude_roster_ids=()):
+    """Check proposed DutyRoster rows for overlap, rest and fatigue-limit violations.
+
+    `proposals` are dicts with crew_member, flight, duty_date, duty_type, duty_start_time,
+    duty_end_time and position. Everything the checks need is loaded up front with a
+    fixed number of queries, whatever the number of rows or crew members. Rows listed in
+    `exclude_roster_ids` are ignored, which lets callers check a row being replaced.
+
+    Returns one {'index', 'legal', 'violations'} entry per proposal, in input order.
+    """
+    violations = [[] for _ in proposals]
+    if not proposals:
+        return []
+
+    crew_ids = {proposal['crew_member'] for proposal in proposals}
+    flight_ids = {proposal['flight'] for proposal in proposals if proposal.get('flight')}
+    window_start = min(proposal['duty_start_time'] for proposal in proposals)
+    window_end = max(proposal['duty_end_time'] for proposal in proposals)
+
+    known_crew = set(CustomUser.objects.filter(id__in=crew_ids).values_list('id', flat=True))
+    flights = {
+        row['id']: row
+        for row in Flight.objects.filter(id__in=flight_ids).values('id', 'scheduled_departure', 'scheduled_arrival')
+    }
+
+    neighbourhood_start = window_start - max(MIN_REST, timedelta(days=1))
+    neighbourhood_end = window_end + max(MIN_REST, timedelta(days=1))
+    existing = DutyRoster.objects.filter(
+        crew_member_id__in=crew_ids,
+        duty_start_time__lt=neighbourhood_end,
+        duty_end_time__gt=neighbourhood_start,
+    ).exclude(id__in=exclude_roster_ids).values(
+        'id', 'crew_member_id', 'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time'
+    )
+    duties = defaultdict(list)
+    existing_days = {}
+    for row in existing:
+        row['index'] = None
+        duties[row['crew_member_id']].append(row)
+        existing_days[(row['crew_member_id'], row['duty_date'])] = row['id']
+
+    rest_until = defaultdict(list)
+    rest_logs = FatigueLog.objects.filter(
+        crew_member_id__in=crew_ids,
+        rest_required_until__gt=window_start,
+        duty_start__lt=window_end,
+    ).values('id', 'crew_member_id', 'duty_start', 'rest_required_until')
+    for row in rest_logs:
+        rest_until[row['crew_member_id']].append(row)
+
+    # Rows being replaced must not count towards the rolling limits either
+    excluded = set(exclude_roster_ids)
+    timelines = {
+        crew_id: timeline.without_rosters(excluded)
+        for crew_id, timeline in build_timelines(crew_ids, window_start, window_end).items()
+    }
+
+    proposed_days = {}
+    proposed_intervals = defaultdict(list)
+    for index, proposal in enumerate(proposals):
+        crew_id = proposal['crew_member']
+        if crew_id not in known_crew:
+            violations[index].append({'type': 'invalid_reference', 'field': 'crew_member'})
+        if proposal.get('flight') and proposal['flight'] not in flights:
+            violations[index].append({'type': 'invalid_reference', 'field': 'flight'})
+
+        day = (crew_id, proposal['duty_date'])
+        if day in existing_days:
+            violations[index].append({'type': 'duplicate_day', 'roster': existing_days[day]})
+        elif day in proposed_days:
+            violations[index].append({'type': 'duplicate_day', 'proposal': proposed_days[day]})
+        else:
+            proposed_days[day] = index
+
+        duties[crew_id].append({
+            'id': None,
+            'index': index,
+            'crew_member_id': crew_id,
+            'duty_date': proposal['duty_date'],
+            'duty_type': proposal['duty_type'],
+            'duty_start_time': proposal['duty_start_time'],
+            'duty_end_time': proposal['duty_end_time'],
+        })
+        if proposal['duty_type'] in REST_DUTY_TYPES:
+            proposed_intervals[crew_id].append(DutyInterval(
+                proposal['duty_start_time'], proposal['duty_end_time'],
+                proposal_flight_hours(proposal, flights), ref=index
+            ))
+
+    for crew_id, crew_duties in duties.items():
+        crew_duties.sort(key=lambda duty: (duty['duty_start_time'], duty['duty_end_time']))
+        check_overlaps(crew_duties, violations)
+        check_rest(crew_duties, rest_until.get(crew_id, []), violations)
+
+        if crew_id in proposed_intervals:
+            timeline = timelines[crew_id].with_intervals(proposed_intervals[crew_id])
+            for interval in proposed_intervals[crew_id]:
+                _, breaches = assess(timeline.rolling_totals(interval.end))
+                for breach in breaches:
+                    violations[interval.ref].append(dict(breach, type='fatigue_limit'))
+
+    return [
+        {'index': index, 'legal': not row_violations, 'violations': row_violations}
+        for index, row_violations in enumerate(violations)
+    ]
+
+
+def describe(duty):
+    if duty['index'] is not None:
+        return {'proposal': duty['index']}
+    return {'roster': duty['id']}
+
+
+def check_overlaps(crew_duties, violations):
+    """Flag proposals overlapping any other duty of the same crew member"""
+    for first, second in sweep_overlaps(crew_duties):
+        if first['index'] is not None:
+            violations[first['index']].append(dict(describe(second), type='overlap'))
+        if second['index'] is not None:
+            violations[second['index']].append(dict(describe(first), type='overlap'))
+
+
+def check_rest(crew_duties, rest_logs, violations):
+    """Flag proposals starting before the minimum rest after the previous active duty"""
+    previous = None
+    for duty in crew_duties:
+        if duty['duty_type'] not in REST_DUTY_TYPES:
+            continue
+        if previous is not None and (duty['index'] is not None or previous['index'] is not None):
+            rest_end = rest_after(previous)
+            if previous['duty_end_time'] <= duty['duty_start_time'] < rest_end:
+                offender = duty if duty['index'] is not None else previous
+                other = previous if offender is duty else duty
+                violations[offender['index']].append(dict(
+                    describe(other), type='insufficient_rest', rest_required_until=rest_end
+                ))
+        if duty['index'] is not None:
+            for log in rest_logs:
+                if log['duty_start'] < duty['duty_start_time'] < log['rest_required_until']:
+                    violations[duty['index']].append({
+                        'type': 'insufficient_rest',
+                        'fatigue_log': log['id'],
+                        'rest_required_until': log['rest_required_until'],
+                    })
+        if previous is None or duty['duty_end_time'] > previous['duty_end_time']:
+            previous = duty
@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from famadata.models import CustomUser
+from famadata.roster_generator import RosterGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generate active, standby, reserve and off rosters for a period from crew profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, required=True, help='First day (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, required=True, help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--created-by', required=True, help='Username recorded as the creator of the rosters')
+        parser.add_argument('--dry-run', action='store_true', help='Plan without inserting')
+
+    def handle(self, *args, **options):
+        if options['end'] < options['start']:
+            raise CommandError('--end is before --start')
+        try:
+            created_by = CustomUser.objects.get(username=options['created_by'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Unknown user {options['created_by']}")
+
+        generator = RosterGenerator(created_by, dry_run=options['dry_run'])
+        result = generator.run(options['start'], options['end'])
+
+        for seat in result['unfilled'][:50]:
+            self.stderr.write(f"unfilled: flight {seat['flight']} {seat['position']}")
+        verb = 'Planned' if options['dry_run'] else 'Generated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['active']} active, {result['standby']} standby, {result['reserve']} reserve "
+            f"and {result['off']} off rosters for {result['crew']} crew; {len(result['unfilled'])} seats unfilled "
+            f"in {result['runtime_seconds']['total']}s"
+        ))
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from famadata.models import CustomUser
+from famadata.roster_import import RosterImporter, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Bulk import DutyRoster rows from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - to read from stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--created-by', required=True, help='Username recorded as the creator of the rosters')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate without inserting')
+
+    def handle(self, *args, **options):
+        try:
+            created_by = CustomUser.objects.get(username=options['created_by'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Unknown user {options['created_by']}")
+
+        path = options['path']
+        input_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        reader = read_jsonl if input_format == 'jsonl' else read_csv
+
+        importer = RosterImporter(created_by, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        if path == '-':
+            result = importer.run(reader(sys.stdin))
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = importer.run(reader(stream))
+
+        for error in result['errors'][:50]:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} rosters, rejected {result['rejected']}"
+        ))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from famadata.sync import TOMBSTONE_RETENTION, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=TOMBSTONE_RETENTION.days,
+            help='Keep tombstones from the last DAYS days'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(f'Deleted {deleted} tombstones')
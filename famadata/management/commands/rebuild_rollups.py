@@ -0,0 +1,22 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from famadata.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily analytics rollups of a date range from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (default: 30 days ago)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (default: today)')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - timedelta(days=30)
+        if end < start:
+            raise CommandError('--end is before --start')
+        rebuilt = rebuild_rollups(start, end)
+        self.stdout.write(f'Rebuilt rollups for {rebuilt} crew days from {start} to {end}')
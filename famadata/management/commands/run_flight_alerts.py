@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from famadata.flight_changes import flush_flight_changes
+
+
+class Command(BaseCommand):
+    help = 'Send the crew alerts for flight changes that have settled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Flush the due changes once and exit')
+        parser.add_argument('--limit', type=int, default=500, help='Flights flushed per round')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds between rounds')
+
+    def handle(self, *args, **options):
+        while True:
+            alerts = flush_flight_changes(limit=options['limit'])
+            for alert in alerts:
+                self.stdout.write(f'{alert.title}: {alert.severity}')
+            if options['once']:
+                return
+            if not alerts:
+                time.sleep(options['poll_interval'])
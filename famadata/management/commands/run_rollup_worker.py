@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from famadata.analytics import process_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refresh the analytics rollups of the days touched by committed writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the queued keys once and exit')
+        parser.add_argument('--limit', type=int, default=1000, help='Keys refreshed per round')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_rollups(limit=options['limit'])
+            if processed:
+                self.stdout.write(f'refreshed {processed} rollup keys')
+            if options['once']:
+                return
+            if not processed:
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from famadata.sms_queue import BATCH_SIZE, MAX_ATTEMPTS, get_gateway, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued alert SMS in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the due messages once and exit')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent gateway requests')
+        parser.add_argument('--limit', type=int, default=500, help='Messages claimed per round')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Recipients per gateway request')
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--gateway', help='Dotted path to a send(message, phone_numbers) callable')
+
+    def handle(self, *args, **options):
+        gateway = import_string(options['gateway']) if options['gateway'] else get_gateway()
+        while True:
+            counts = process_batch(
+                gateway=gateway,
+                limit=options['limit'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+            )
+            if any(counts.values()):
+                self.stdout.write(
+                    f"sent {counts['sent']}, retrying {counts['retrying']}, failed {counts['failed']}"
+                )
+            if options['once']:
+                return
+            if not any(counts.values()):
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,234 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Durations kept per endpoint for the percentiles
+SAMPLE_SIZE = 500
+# Slowest requests kept for the metrics endpoint
+SLOW_REQUESTS = 20
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    """Timings of one request, filled in by the query wrapper and the serializer timer"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.endpoint = None
+        self.skip = False
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.statements = Counter()
+        self.serializer_seconds = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_seconds += time.perf_counter() - start
+            self.queries += 1
+            # Parameters stay out of the SQL, so a query repeated per row is the same text
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """(sql, count) of statements run at least `threshold` times, most repeated first"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class TimedSerializerMixin:
+    """Add the time spent representing instances to the current request's metrics.
+
+    Nested serializers and the rows of a list are timed as part of the outermost
+    representation that is running.
+    """
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None:
+            return super().to_representation(instance)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_depth -= 1
+            if not stats.serializer_depth:
+                stats.serializer_seconds += time.perf_counter() - start
+
+
+def endpoint_name(request, view_func):
+    """'ViewSet.action' for DRF views, the URL name or function name otherwise"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        match = request.resolver_match
+        return (match and match.view_name) or getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class EndpointMetrics:
+    __slots__ = (
+        'requests', 'errors', 'seconds', 'max_seconds', 'queries', 'query_seconds',
+        'duplicate_requests', 'serializer_seconds', 'response_bytes', 'samples',
+    )
+
+    def __init__(self):
+        self.requests = self.errors = self.queries = self.duplicate_requests = self.response_bytes = 0
+        self.seconds = self.max_seconds = self.query_seconds = self.serializer_seconds = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, record):
+        self.requests += 1
+        self.errors += record['status'] >= 500
+        self.seconds += record['seconds']
+        self.max_seconds = max(self.max_seconds, record['seconds'])
+        self.queries += record['queries']
+        self.query_seconds += record['query_seconds']
+        self.duplicate_requests += bool(record['duplicate_queries'])
+        self.serializer_seconds += record['serializer_seconds']
+        self.response_bytes += record['response_bytes'] or 0
+        self.samples.append(record['seconds'])
+
+    def summary(self):
+        samples = sorted(self.samples)
+
+        def percentile(share):
+            return round(samples[min(int(len(samples) * share), len(samples) - 1)] * 1000, 2)
+
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.seconds / self.requests * 1000, 2),
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max_seconds * 1000, 2),
+            'avg_queries': round(self.queries / self.requests, 2),
+            'avg_query_ms': round(self.query_seconds / self.requests * 1000, 2),
+            'duplicate_query_requests': self.duplicate_requests,
+            'avg_serializer_ms': round(self.serializer_seconds / self.requests * 1000, 2),
+            'avg_response_bytes': round(self.response_bytes / self.requests),
+        }
+
+
+class MetricsRegistry:
+    """Per-endpoint totals of this process since it started or was reset"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.endpoints = {}
+            self.slowest = []
+
+    def record(self, record):
+        with self.lock:
+            key = f"{record['method']} {record['endpoint']}"
+            self.endpoints.setdefault(key, EndpointMetrics()).add(record)
+            if len(self.slowest) < SLOW_REQUESTS or record['seconds'] > self.slowest[-1]['seconds']:
+                self.slowest.append(record)
+                self.slowest.sort(key=lambda item: -item['seconds'])
+                del self.slowest[SLOW_REQUESTS:]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'since': self.started,
+                'endpoints': {key: metrics.summary() for key, metrics in sorted(self.endpoints.items())},
+                'slowest': list(self.slowest),
+            }
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Measure wall time, queries, serializer time and response size of every request.
+
+    Results are tagged with the ViewSet and action, added to the process-wide
+    registry served by MetricsView, sent back in a Server-Timing header and, with
+    REQUEST_METRICS_LOG, logged as one JSON line per request. A statement run
+    REQUEST_METRICS_DUPLICATE_QUERIES times or more in one request is reported as
+    a likely N+1 query.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        request._request_metrics = stats
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if not stats.skip:
+            self.finish(request, response, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = request._request_metrics
+        stats.endpoint = endpoint_name(request, view_func)
+        stats.skip = getattr(view_func, 'cls', None) is MetricsView
+
+    def finish(self, request, response, stats):
+        seconds = time.perf_counter() - stats.started
+        threshold = getattr(settings, 'REQUEST_METRICS_DUPLICATE_QUERIES', 5)
+        duplicates = stats.duplicates(threshold)
+        record = {
+            'endpoint': stats.endpoint or 'unresolved',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'seconds': round(seconds, 6),
+            'queries': stats.queries,
+            'query_seconds': round(stats.query_seconds, 6),
+            'duplicate_queries': [{'sql': sql[:500], 'count': count} for sql, count in duplicates[:3]],
+            'serializer_seconds': round(stats.serializer_seconds, 6),
+            # Streamed exports are sent after the middleware returns
+            'response_bytes': None if response.streaming else len(response.content),
+        }
+        registry.record(record)
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={seconds * 1000:.1f}',
+            f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries"',
+            f'serializer;dur={stats.serializer_seconds * 1000:.1f}',
+        ])
+        if getattr(settings, 'REQUEST_METRICS_LOG', False):
+            logger.info(json.dumps(record))
+
+
+class MetricsView(APIView):
+    """Per-endpoint request metrics of this process, for staff; POST clears them"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(registry.snapshot())
+
+    def post(self, request):
+        registry.reset()
+        return Response(registry.snapshot())
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_crew_fatigue_status(apps, schema_editor):
+    FatigueLog = apps.get_model('famadata', 'FatigueLog')
+    CrewFatigueStatus = apps.get_model('famadata', 'CrewFatigueStatus')
+    statuses = {}
+    for log in FatigueLog.objects.order_by('crew_member_id', '-duty_start', '-created_at').iterator():
+        if log.crew_member_id not in statuses:
+            statuses[log.crew_member_id] = CrewFatigueStatus(
+                crew_member_id=log.crew_member_id,
+                latest_log_id=log.id,
+                duty_start=log.duty_start,
+                fatigue_level=log.fatigue_level,
+            )
+    CrewFatigueStatus.objects.bulk_create(statuses.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('famadata', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrewFatigueStatus',
+            fields=[
+                ('crew_member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fatigue_status', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('duty_start', models.DateTimeField(db_index=True)),
+                ('fatigue_level', models.CharField(choices=[('green', 'Legal to Fly'), ('orange', 'Warning'), ('red', 'Needs Rest')], db_index=True, max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('latest_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='famadata.fatiguelog')),
+            ],
+        ),
+        migrations.RunPython(backfill_crew_fatigue_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('famadata', '0003_outboundsms'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-created_at'], name='alert_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['is_active', 'severity', '-created_at'], name='alert_active_severity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='alert_active_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertrecipient',
+            index=models.Index(fields=['recipient', 'is_read'], name='alertrecipient_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertrecipient',
+            index=models.Index(fields=['recipient', '-created_at'], name='alertrecipient_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertrecipient',
+            index=models.Index(fields=['-created_at'], name='alertrecipient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crewprofile',
+            index=models.Index(fields=['-seniority'], name='crewprofile_seniority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crewprofile',
+            index=models.Index(fields=['position', '-seniority'], name='crewprofile_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['-created_at'], name='customuser_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dutyroster',
+            index=models.Index(fields=['duty_date', 'duty_start_time'], name='dutyroster_date_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dutyroster',
+            index=models.Index(fields=['crew_member', 'duty_start_time'], name='dutyroster_crew_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatiguelog',
+            index=models.Index(fields=['-duty_start'], name='fatiguelog_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatiguelog',
+            index=models.Index(fields=['crew_member', '-duty_start'], name='fatiguelog_crew_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatiguelog',
+            index=models.Index(fields=['fatigue_level', '-duty_start'], name='fatiguelog_level_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['scheduled_departure'], name='flight_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['status', 'scheduled_departure'], name='flight_status_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightswaprequest',
+            index=models.Index(fields=['-created_at'], name='swaprequest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightswaprequest',
+            index=models.Index(fields=['status', '-created_at'], name='swaprequest_status_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('famadata', '0004_famadata_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='crewprofile',
+            index=models.Index(fields=['updated_at'], name='crewprofile_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['updated_at'], name='customuser_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dutyroster',
+            index=models.Index(fields=['updated_at'], name='dutyroster_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['updated_at'], name='flight_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightswaprequest',
+            index=models.Index(fields=['updated_at'], name='swaprequest_updated_idx'),
+        ),
+    ]
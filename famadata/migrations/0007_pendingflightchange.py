@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('famadata', '0006_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingFlightChange',
+            fields=[
+                ('flight', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pending_change', serialize=False, to='famadata.flight')),
+                ('changes', models.JSONField(default=dict)),
+                ('first_changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('flush_after', models.DateTimeField(db_index=True)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('famadata', '0007_pendingflightchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AirportDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('duties', models.PositiveIntegerField(default=0)),
+                ('duty_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('flight_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('orange_days', models.PositiveIntegerField(default=0)),
+                ('red_days', models.PositiveIntegerField(default=0)),
+                ('swap_requests', models.PositiveIntegerField(default=0)),
+                ('swaps_completed', models.PositiveIntegerField(default=0)),
+                ('alerts_received', models.PositiveIntegerField(default=0)),
+                ('alerts_read', models.PositiveIntegerField(default=0)),
+                ('read_latency_seconds', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('airport', models.CharField(max_length=3)),
+                ('flights', models.PositiveIntegerField(default=0)),
+                ('crew_members', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='airportrollup_date_idx')],
+                'unique_together': {('airport', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PositionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('duties', models.PositiveIntegerField(default=0)),
+                ('duty_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('flight_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('orange_days', models.PositiveIntegerField(default=0)),
+                ('red_days', models.PositiveIntegerField(default=0)),
+                ('swap_requests', models.PositiveIntegerField(default=0)),
+                ('swaps_completed', models.PositiveIntegerField(default=0)),
+                ('alerts_received', models.PositiveIntegerField(default=0)),
+                ('alerts_read', models.PositiveIntegerField(default=0)),
+                ('read_latency_seconds', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('position', models.CharField(choices=[('captain', 'Captain'), ('first_officer', 'First Officer'), ('senior_cabin_crew', 'Senior Cabin Crew'), ('cabin_crew', 'Cabin Crew'), ('ground_crew', 'Ground Crew')], max_length=30)),
+                ('crew_members', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='positionrollup_date_idx')],
+                'unique_together': {('position', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CrewDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('duties', models.PositiveIntegerField(default=0)),
+                ('duty_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('flight_hours', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('orange_days', models.PositiveIntegerField(default=0)),
+                ('red_days', models.PositiveIntegerField(default=0)),
+                ('swap_requests', models.PositiveIntegerField(default=0)),
+                ('swaps_completed', models.PositiveIntegerField(default=0)),
+                ('alerts_received', models.PositiveIntegerField(default=0)),
+                ('alerts_read', models.PositiveIntegerField(default=0)),
+                ('read_latency_seconds', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('position', models.CharField(blank=True, max_length=30)),
+                ('crew_member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'position'], name='crewrollup_date_position_idx')],
+                'unique_together': {('crew_member', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('famadata', '0008_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_type', models.CharField(choices=[('crew', 'Crew member'), ('flight', 'Flight'), ('airport', 'Airport')], max_length=10)),
+                ('key', models.CharField(max_length=64)),
+                ('date', models.DateField()),
+                ('queued_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
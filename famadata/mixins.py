@@ -0,0 +1,208 @@
+import hashlib
+from datetime import date
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .cache import get_generations
+from .exports import EXPORT_CONTENT_TYPES, export_response, in_date_range
+from .serializers import parse_field_list
+
+
+class PaginatedActionMixin:
+    """Paginate the list responses of custom actions the same way as `list`"""
+
+    def paginated_response(self, queryset, serializer_class=None, ordering=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        context = self.get_serializer_context()
+        if self.paginator is None:
+            return Response(serializer_class(queryset, many=True, context=context).data)
+        
+        page = self.paginator.paginate_queryset(queryset, self.request, view=self, ordering=ordering)
+        serializer = serializer_class(page, many=True, context=context)
+        return self.paginator.get_paginated_response(serializer.data)
+
+
+class FieldSelectionMixin:
+    """Join or prefetch only the relations needed by the requested `?expand=` fields.
+
+    `expand_select_related` and `expand_prefetch_related` map an expandable field path
+    to the lookups it needs; the base queryset stays free of joins.
+    """
+    expand_select_related = {}
+    expand_prefetch_related = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expand = parse_field_list(self.request, 'expand')
+        select = [lookup for path in expand for lookup in self.expand_select_related.get(path, [])]
+        prefetch = [lookup for path in expand for lookup in self.expand_prefetch_related.get(path, [])]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class GroupedListMixin:
+    """Group a queryset by a choice field with one query.
+
+    `?counts=true` returns only the size of each group from a single aggregate, and
+    `?limit=N` keeps the first N rows of every group (in the view's ordering) using a
+    ROW_NUMBER window, so no group is fetched or serialized beyond what is returned.
+    """
+
+    def grouped_response(self, queryset, field, choices):
+        params = self.request.query_params
+        if params.get('counts', '').lower() in ('1', 'true', 'yes'):
+            counts = dict(
+                queryset.order_by().values_list(field).annotate(count=Count('pk'))
+            )
+            return Response({label: counts.get(code, 0) for code, label in choices})
+
+        limit = params.get('limit')
+        try:
+            limit = int(limit) if limit else None
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer'})
+        if limit is not None and limit < 1:
+            raise ValidationError({'limit': 'Must be at least 1'})
+
+        ordering = list(getattr(self, 'ordering', None) or []) + ['pk']
+        queryset = queryset.order_by(*ordering)
+        if limit:
+            queryset = queryset.annotate(
+                group_rank=Window(RowNumber(), partition_by=[F(field)], order_by=ordering)
+            ).filter(group_rank__lte=limit)
+
+        rows = list(queryset)
+        data = self.get_serializer(rows, many=True).data
+        groups = {code: [] for code, _ in choices}
+        for row, item in zip(rows, data):
+            groups.setdefault(getattr(row, field), []).append(item)
+        return Response({label: groups[code] for code, label in choices})
+
+
+class ConditionalGetMixin:
+    """Answer GET requests with ETag / Last-Modified and return 304 when nothing changed.
+
+    Validators come from one `MAX(conditional_field)` + `COUNT` aggregate over the
+    filtered queryset (or the fetched object for `retrieve`), so an unchanged
+    collection is confirmed without serializing a row. Rows pulled in by `?expand=`
+    are tracked through the cache generations of their models. Collections and
+    expanded responses are sent with an ETag only: a deleted or related row does not
+    move MAX(updated_at), so Last-Modified alone would revalidate them wrongly.
+    """
+    conditional_field = 'updated_at'
+
+    def expanded_models(self):
+        """Models reached by the select/prefetch lookups of the requested `?expand=` paths"""
+        models = set()
+        for path in parse_field_list(self.request, 'expand'):
+            lookups = (
+                getattr(self, 'expand_select_related', {}).get(path, [])
+                + getattr(self, 'expand_prefetch_related', {}).get(path, [])
+            )
+            for lookup in lookups:
+                model = self.queryset.model
+                for name in lookup.split('__'):
+                    model = model._meta.get_field(name).related_model
+                    models.add(model)
+        return sorted(models, key=lambda model: model._meta.label)
+
+    def get_validators(self, last_modified, count, collection=False):
+        params = sorted(self.request.query_params.lists())
+        related = self.expanded_models()
+        parts = [
+            self.basename, self.action, repr(params),
+            last_modified.isoformat() if last_modified else '', count,
+            repr(get_generations(related)) if related else '',
+        ]
+        etag = quote_etag(hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32])
+        if collection or related or not last_modified:
+            return etag, None
+        return etag, int(last_modified.timestamp())
+
+    def collection_validators(self, queryset):
+        watermark = queryset.order_by().aggregate(
+            last_modified=Max(self.conditional_field), count=Count('*')
+        )
+        return self.get_validators(watermark['last_modified'], watermark['count'], collection=True)
+
+    def conditional_response(self, validators, build_response):
+        """Return 304 if the request's validators match, otherwise `build_response()`"""
+        etag, last_modified = validators
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(
+            self.collection_validators(queryset),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = self.get_validators(getattr(instance, self.conditional_field), instance.pk)
+        return self.conditional_response(
+            validators, lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def paginated_response(self, queryset, serializer_class=None, ordering=None):
+        if self.request.method != 'GET':
+            return super().paginated_response(queryset, serializer_class, ordering)
+        return self.conditional_response(
+            self.collection_validators(queryset),
+            lambda: super(ConditionalGetMixin, self).paginated_response(queryset, serializer_class, ordering)
+        )
+
+
+class ExportMixin:
+    """Stream the filtered collection as CSV or NDJSON from an `export` action.
+
+    Takes the view's filters, search and ordering plus `?start_date=` / `?end_date=`
+    on `export_date_field`, and `?file_format=csv|ndjson` (`format` is taken by DRF).
+    Rows are `values_list(*export_fields)` tuples, never model or serializer instances,
+    streamed through an async iterator when the request came in over ASGI.
+    """
+    export_fields = ()
+    export_date_field = 'created_at'
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream every matching row for regulators and payroll"""
+        if not request.user.is_staff:
+            return Response({'error': 'Only operators can export'}, status=status.HTTP_403_FORBIDDEN)
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_CONTENT_TYPES:
+            raise ValidationError({'file_format': f"Must be one of {', '.join(EXPORT_CONTENT_TYPES)}"})
+        try:
+            start_date, end_date = [
+                date.fromisoformat(value) if value else None
+                for value in (request.query_params.get('start_date'), request.query_params.get('end_date'))
+            ]
+        except ValueError:
+            raise ValidationError({'error': 'Dates must use the YYYY-MM-DD format'})
+
+        queryset = in_date_range(
+            self.filter_queryset(self.get_queryset()), self.export_date_field, start_date, end_date
+        )
+        return export_response(
+            queryset, self.export_fields, file_format, self.basename,
+            asynchronous=isinstance(request._request, ASGIRequest)
+        )
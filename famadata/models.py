@@ -54,6 +54,11 @@ class CustomUser(AbstractBaseUser):
     def has_module_perms(self, app_label):
         return self.is_superuser
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='customuser_created_idx'),
+            models.Index(fields=['updated_at'], name='customuser_updated_idx'),
+        ]
 
 class CrewProfile(models.Model):
     """Crew member profile with preferences and qualifications"""
@@ -97,6 +102,13 @@ class CrewProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-seniority'], name='crewprofile_seniority_idx'),
+            models.Index(fields=['position', '-seniority'], name='crewprofile_position_idx'),
+            models.Index(fields=['updated_at'], name='crewprofile_updated_idx'),
+        ]
+
 class Flight(models.Model):
     """Flight information model"""
     FLIGHT_STATUS_CHOICES = [
@@ -121,6 +133,13 @@ class Flight(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['scheduled_departure'], name='flight_departure_idx'),
+            models.Index(fields=['status', 'scheduled_departure'], name='flight_status_departure_idx'),
+            models.Index(fields=['updated_at'], name='flight_updated_idx'),
+        ]
+
 class DutyRoster(models.Model):
     """Duty roster assignments for crew members"""
     DUTY_TYPE_CHOICES = [
@@ -143,6 +162,12 @@ class DutyRoster(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
+        indexes = [
+            models.Index(fields=['duty_date', 'duty_start_time'], name='dutyroster_date_start_idx'),
+            models.Index(fields=['crew_member', 'duty_start_time'], name='dutyroster_crew_start_idx'),
+            models.Index(fields=['crew_member', 'updated_at'], name='dutyroster_crew_updated_idx'),
+            models.Index(fields=['updated_at'], name='dutyroster_updated_idx'),
+        ]
         unique_together = ['crew_member', 'duty_date']
 
 class FatigueLog(models.Model):
@@ -163,6 +188,74 @@ class FatigueLog(models.Model):
     rest_required_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-duty_start'], name='fatiguelog_start_idx'),
+            models.Index(fields=['crew_member', '-duty_start'], name='fatiguelog_crew_start_idx'),
+            models.Index(fields=['fatigue_level', '-duty_start'], name='fatiguelog_level_start_idx'),
+        ]
+
+
+class CrewFatigueStatusManager(models.Manager):
+    """Manager keeping the per-crew latest fatigue state in sync with FatigueLog"""
+    def record(self, log):
+        """Apply a saved FatigueLog, replacing the current state when it is the newest"""
+        current = self.filter(crew_member_id=log.crew_member_id).first()
+        if current is None or log.duty_start >= current.duty_start:
+            self.update_or_create(
+                crew_member_id=log.crew_member_id,
+                defaults={
+                    'latest_log': log,
+                    'duty_start': log.duty_start,
+                    'fatigue_level': log.fatigue_level,
+                }
+            )
+        elif current.latest_log_id == log.id:
+            self.refresh([log.crew_member_id])
+
+    def refresh(self, crew_member_ids):
+        """Recompute the state of the given crew members from their newest FatigueLog"""
+        crew_member_ids = set(crew_member_ids)
+        if not crew_member_ids:
+            return
+        latest_ids = FatigueLog.objects.filter(
+            crew_member=models.OuterRef('pk')
+        ).order_by('-duty_start', '-created_at').values('id')[:1]
+        latest = CustomUser.objects.filter(id__in=crew_member_ids).annotate(
+            latest_log_id=models.Subquery(latest_ids)
+        ).values_list('latest_log_id', flat=True)
+        logs = FatigueLog.objects.filter(id__in=[log_id for log_id in latest if log_id])
+
+        statuses = [
+            self.model(
+                crew_member_id=log.crew_member_id,
+                latest_log=log,
+                duty_start=log.duty_start,
+                fatigue_level=log.fatigue_level,
+            )
+            for log in logs
+        ]
+        self.filter(crew_member_id__in=crew_member_ids).exclude(
+            crew_member_id__in=[status.crew_member_id for status in statuses]
+        ).delete()
+        self.bulk_create(
+            statuses,
+            update_conflicts=True,
+            unique_fields=['crew_member'],
+            update_fields=['latest_log', 'duty_start', 'fatigue_level', 'updated_at'],
+        )
+
+
+class CrewFatigueStatus(models.Model):
+    """Current fatigue state per crew member, denormalized from their latest FatigueLog"""
+    crew_member = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='fatigue_status')
+    latest_log = models.ForeignKey(FatigueLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    duty_start = models.DateTimeField(db_index=True)
+    fatigue_level = models.CharField(max_length=10, choices=FatigueLog.FATIGUE_LEVEL_CHOICES, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CrewFatigueStatusManager()
+
 class FlightSwapRequest(models.Model):
     """Handle flight swap requests between crew members"""
     STATUS_CHOICES = [
@@ -183,6 +276,13 @@ class FlightSwapRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='swaprequest_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='swaprequest_status_idx'),
+            models.Index(fields=['updated_at'], name='swaprequest_updated_idx'),
+        ]
+
 class Alert(models.Model):
     """System alerts and notifications"""
     ALERT_TYPE_CHOICES = [
@@ -211,6 +311,14 @@ class Alert(models.Model):
     recipients = models.ManyToManyField(CustomUser, through='AlertRecipient', related_name='received_alerts')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='alert_created_idx'),
+            models.Index(fields=['is_active', 'severity', '-created_at'], name='alert_active_severity_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True), name='alert_active_recent_idx'),
+        ]
 
 class AlertRecipient(models.Model):
     """Track alert delivery status"""
@@ -220,4 +328,160 @@ class AlertRecipient(models.Model):
     sms_sent = models.BooleanField(default=False)
     sms_delivery_status = models.CharField(max_length=20, null=True, blank=True)
     read_at = models.DateTimeField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'is_read'], name='alertrecipient_read_idx'),
+            models.Index(fields=['recipient', '-created_at'], name='alertrecipient_recent_idx'),
+            models.Index(fields=['-created_at'], name='alertrecipient_created_idx'),
+            models.Index(fields=['recipient', 'updated_at'], name='alertrecipient_updated_idx'),
+        ]
+
+
+class OutboundSMS(models.Model):
+    """Queued SMS for an alert recipient, delivered in batches by the SMS worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    alert_recipient = models.ForeignKey(AlertRecipient, on_delete=models.CASCADE, related_name='sms_messages')
+    phone_number = models.CharField(max_length=15)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=200, blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outboundsms_due_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """Deleted row, kept so offline clients can drop it on their next sync.
+
+    `crew_member` is the crew member the row was relevant to; an empty value means
+    the deletion is sent to everyone. It is not a foreign key because tombstones are
+    also written while that user is being deleted.
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64)
+    crew_member = models.UUIDField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['crew_member', 'deleted_at'], name='tombstone_crew_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}"
+
+
+class PendingFlightChange(models.Model):
+    """Flight changes not yet announced, coalesced into one alert per flight"""
+    flight = models.OneToOneField(Flight, on_delete=models.CASCADE, primary_key=True, related_name='pending_change')
+    changes = models.JSONField(default=dict)  # {field: [old, new]}
+    changed_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    first_changed_at = models.DateTimeField(default=timezone.now)
+    flush_after = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.flight} changes"
+
+
+class DailyRollup(models.Model):
+    """Daily totals shared by the analytics rollups, maintained by famadata.analytics"""
+    date = models.DateField()
+    duties = models.PositiveIntegerField(default=0)  # active duties
+    duty_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    flight_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    orange_days = models.PositiveIntegerField(default=0)
+    red_days = models.PositiveIntegerField(default=0)
+    swap_requests = models.PositiveIntegerField(default=0)
+    swaps_completed = models.PositiveIntegerField(default=0)
+    alerts_received = models.PositiveIntegerField(default=0)
+    alerts_read = models.PositiveIntegerField(default=0)
+    read_latency_seconds = models.PositiveBigIntegerField(default=0)  # summed over read alerts
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class CrewDailyRollup(DailyRollup):
+    """One crew member's day; orange_days and red_days are 0 or 1"""
+    crew_member = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='daily_rollups')
+    position = models.CharField(max_length=30, blank=True)
+
+    class Meta:
+        unique_together = ['crew_member', 'date']
+        indexes = [
+            models.Index(fields=['date', 'position'], name='crewrollup_date_position_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.crew_member} {self.date}"
+
+
+class PositionDailyRollup(DailyRollup):
+    """All crew of one position on a day"""
+    position = models.CharField(max_length=30, choices=CrewProfile.POSITION_CHOICES)
+    crew_members = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['position', 'date']
+        indexes = [
+            models.Index(fields=['date'], name='positionrollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.position} {self.date}"
+
+
+class AirportDailyRollup(DailyRollup):
+    """Duties, swap requests and alerts of flights departing one airport on a day"""
+    airport = models.CharField(max_length=3)  # IATA code
+    flights = models.PositiveIntegerField(default=0)
+    crew_members = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['airport', 'date']
+        indexes = [
+            models.Index(fields=['date'], name='airportrollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.airport} {self.date}"
+
+
+class PendingRollup(models.Model):
+    """Rollup key changed by a committed write, refreshed by run_rollup_worker.
+
+    Written in the same transaction as the change, so a rolled-back write queues
+    nothing. The same key may be queued more than once; the worker refreshes it once.
+    """
+    KEY_TYPES = [
+        ('crew', 'Crew member'),
+        ('flight', 'Flight'),
+        ('airport', 'Airport'),
+    ]
+
+    key_type = models.CharField(max_length=10, choices=KEY_TYPES)
+    key = models.CharField(max_length=64)  # crew member or flight id, or IATA code
+    date = models.DateField()
+    queued_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.key_type} {self.key} {self.date}"
@@ -0,0 +1,166 @@
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_value(value):
+    """JSON-encode a cursor value without losing precision"""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on the view's ordering plus the primary key.
+
+    The cursor stores the ordering values of the last row served, and the next page is
+    selected with a lexicographic WHERE on those values, so every page costs the same
+    however deep the client pages. Null values sort last in ascending order.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None, ordering=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view, ordering)
+        self.fields = [self.resolve_field(queryset.model, key.lstrip('-')) for key in self.ordering]
+        size = self.get_page_size(request)
+
+        values, reverse = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.order_expressions(reverse))
+        if values is not None:
+            queryset = queryset.filter(self.keyset_filter(values, reverse))
+
+        rows = list(queryset[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+
+        self.next_values = self.values_of(rows[-1]) if rows and (has_more or reverse) else None
+        came_back = (values is not None and not reverse) or (has_more and reverse)
+        self.previous_values = self.values_of(rows[0]) if rows and came_back else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.encode_cursor(self.next_values, reverse=False),
+            'previous': self.encode_cursor(self.previous_values, reverse=True),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view, ordering=None):
+        if ordering is None:
+            for backend in getattr(view, 'filter_backends', []):
+                if hasattr(backend, 'get_ordering'):
+                    ordering = backend().get_ordering(request, queryset, view)
+                    break
+        if ordering is None:
+            ordering = getattr(view, 'ordering', None) or []
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        ordering = [key for key in ordering if key.lstrip('-') not in ('pk', 'id')]
+        tie_breaker = '-pk' if ordering and ordering[0].startswith('-') else 'pk'
+        return ordering + [tie_breaker]
+
+    def resolve_field(self, model, name):
+        if name == 'pk':
+            return model._meta.pk
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise NotFound(f'Cannot paginate on {name}')
+
+    def order_expressions(self, reverse):
+        expressions = []
+        for key, field in zip(self.ordering, self.fields):
+            name = key.lstrip('-')
+            descending = key.startswith('-') != reverse
+            if field.null:
+                expression = F(name).desc(nulls_first=True) if descending else F(name).asc(nulls_last=True)
+            else:
+                expression = F(name).desc() if descending else F(name).asc()
+            expressions.append(expression)
+        return expressions
+
+    def keyset_filter(self, values, reverse):
+        """Rows strictly after `values` in the (possibly reversed) ordering"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for key, field, value in zip(self.ordering, self.fields, values):
+            name = key.lstrip('-')
+            descending = key.startswith('-') != reverse
+            if value is None:
+                after = Q(**{f'{name}__isnull': False}) if descending else None
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+                if field.null and not descending:
+                    after |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            if after is not None:
+                condition |= equal & after
+            equal &= same
+        return condition
+
+    def values_of(self, obj):
+        return [
+            obj.pk if key.lstrip('-') == 'pk' else getattr(obj, field.attname)
+            for key, field in zip(self.ordering, self.fields)
+        ]
+
+    def encode_cursor(self, values, reverse):
+        if values is None:
+            return None
+        payload = json.dumps({'v': values, 'r': reverse}, default=encode_value)
+        cursor = urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            values = [
+                None if value is None else field.to_python(value)
+                for field, value in zip(self.fields, payload['v'], strict=True)
+            ]
+            return values, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.previous_values, reverse=True)
+
+    def get_next_link(self):
+        return self.encode_cursor(self.next_values, reverse=False)
@@ -0,0 +1,162 @@
+# famadata/pubsub.py
+
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'famadata.pubsub.InMemoryBackend'
+
+
+class BaseBackend:
+    """Delivers text messages published on a channel to the callbacks subscribed to it.
+
+    Callbacks may run on any thread and must not block; the WebSocket endpoint hands
+    each message to its own event loop.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel, callback):
+        raise NotImplementedError
+
+    def unsubscribe(self, channel, callback):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InMemoryBackend(BaseBackend):
+    """Fan-out within this process; run a single ASGI worker or use a shared backend"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            callbacks = list(self.subscribers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception('Subscriber of %s failed', channel)
+        return len(callbacks)
+
+    def subscribe(self, channel, callback):
+        with self.lock:
+            self.subscribers[channel].add(callback)
+
+    def unsubscribe(self, channel, callback):
+        with self.lock:
+            callbacks = self.subscribers.get(channel)
+            if callbacks is not None:
+                callbacks.discard(callback)
+                if not callbacks:
+                    del self.subscribers[channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the backend configured by PUBSUB_BACKEND, creating it on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'PUBSUB_BACKEND', {})
+                backend = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+                _broker = backend(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def reset_broker():
+    """Close and forget the current backend, e.g. after changing PUBSUB_BACKEND"""
+    global _broker
+    with _broker_lock:
+        if _broker is not None:
+            _broker.close()
+        _broker = None
+
+
+def crew_channel(crew_member_id):
+    return f'crew.{crew_member_id}'
+
+
+def publish_event(crew_member_ids, event, data):
+    """Push `event` to the connected devices of each crew member once the transaction commits"""
+    crew_member_ids = {crew_member_id for crew_member_id in crew_member_ids if crew_member_id}
+    if not crew_member_ids:
+        return
+    message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+
+    def send():
+        broker = get_broker()
+        for crew_member_id in crew_member_ids:
+            broker.publish(crew_channel(crew_member_id), message)
+
+    transaction.on_commit(send)
+
+
+def alert_event(alert):
+    return {
+        'id': alert.id,
+        'alert_type': alert.alert_type,
+        'severity': alert.severity,
+        'title': alert.title,
+        'message': alert.message,
+        'flight': alert.flight_id,
+        'created_at': alert.created_at,
+    }
+
+
+def flight_event(flight):
+    return {
+        'id': flight.id,
+        'flight_number': flight.flight_number,
+        'status': flight.status,
+        'gate': flight.gate,
+        'scheduled_departure': flight.scheduled_departure,
+        'actual_departure': flight.actual_departure,
+        'actual_arrival': flight.actual_arrival,
+    }
+
+
+def swap_event(swap_request):
+    return {
+        'id': swap_request.id,
+        'status': swap_request.status,
+        'requesting_crew': swap_request.requesting_crew_id,
+        'target_crew': swap_request.target_crew_id,
+        'requesting_flight': swap_request.requesting_flight_id,
+        'target_flight': swap_request.target_flight_id,
+        'approved_by': swap_request.approved_by_id,
+    }
+
+
+def duty_event(roster, action):
+    return {
+        'id': roster.id,
+        'action': action,
+        'crew_member': roster.crew_member_id,
+        'flight': roster.flight_id,
+        'duty_date': roster.duty_date,
+        'duty_type': roster.duty_type,
+        'duty_start_time': roster.duty_start_time,
+        'duty_end_time': roster.duty_end_time,
+    }
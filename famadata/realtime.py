@@ -0,0 +1,90 @@
+# famadata/realtime.py
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+
+from .models import AlertRecipient
+from .pubsub import crew_channel, get_broker
+
+ALERTS_PATH = '/ws/alerts/'
+# Events buffered per connection before the oldest are dropped
+MAX_PENDING = 100
+
+
+@sync_to_async
+def authenticate(scope):
+    """Resolve the DRF token from `?token=` or an `Authorization: Token ...` header"""
+    from rest_framework.authtoken.models import Token
+
+    key = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization' and value.decode().startswith('Token '):
+            key = value.decode()[len('Token '):]
+    if not key:
+        return None
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+@sync_to_async
+def unread_count(user):
+    return AlertRecipient.objects.filter(recipient=user, is_read=False).count()
+
+
+async def alert_socket(scope, receive, send):
+    """Stream the events published for the authenticated crew member as JSON text frames.
+
+    The first frame carries the current unread count; after that every new alert,
+    flight status change and swap decision for the user is pushed as it commits.
+    Frames sent by the client are ignored.
+    """
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    if scope['path'] != ALERTS_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    user = await authenticate(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    await send({'type': 'websocket.accept'})
+
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue()
+
+    def enqueue(message):
+        if pending.qsize() >= MAX_PENDING:
+            pending.get_nowait()
+        pending.put_nowait(message)
+
+    def deliver(message):
+        loop.call_soon_threadsafe(enqueue, message)
+
+    channel = crew_channel(user.pk)
+    broker = get_broker()
+    broker.subscribe(channel, deliver)
+    receiving = asyncio.ensure_future(receive())
+    getting = asyncio.ensure_future(pending.get())
+    try:
+        greeting = {'event': 'unread_count', 'data': {'unread_count': await unread_count(user)}}
+        await send({'type': 'websocket.send', 'text': json.dumps(greeting)})
+        while True:
+            done, _ = await asyncio.wait({receiving, getting}, return_when=asyncio.FIRST_COMPLETED)
+            if getting in done:
+                await send({'type': 'websocket.send', 'text': getting.result()})
+                getting = asyncio.ensure_future(pending.get())
+            if receiving in done:
+                if receiving.result()['type'] == 'websocket.disconnect':
+                    break
+                receiving = asyncio.ensure_future(receive())
+    finally:
+        broker.unsubscribe(channel, deliver)
+        receiving.cancel()
+        getting.cancel()
+
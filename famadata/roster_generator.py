@@ -0,0 +1,291 @@
+import heapq
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import queue_rollups, roster_keys
+from .cache import invalidate
+from .conflicts import day_start
+from .fatigue import ROLLING_WINDOWS, assess, build_timelines, hours_between, required_rest_until
+from .models import CrewProfile, DutyRoster, Flight
+from .scheduling import DUTY_MARGIN, HAUL_MATCH, RELEASE_AFTER, REPORT_BEFORE
+
+# Crew needed per flight, by haul type and position
+DEFAULT_CREW_REQUIREMENTS = {
+    'short': {'captain': 1, 'first_officer': 1, 'senior_cabin_crew': 1, 'cabin_crew': 2},
+    'long': {'captain': 1, 'first_officer': 2, 'senior_cabin_crew': 1, 'cabin_crew': 4},
+}
+
+PROFILE_FIELDS = (
+    'user_id', 'position', 'preferred_haul', 'seniority', 'active_duty_days', 'standby_duty_days',
+    'reserve_duty_days', 'days_off', 'standby_start_time', 'standby_end_time',
+    'reserve_start_time', 'reserve_end_time',
+)
+
+
+def crew_requirements():
+    return getattr(settings, 'FAMA_CREW_REQUIREMENTS', DEFAULT_CREW_REQUIREMENTS)
+
+
+def window_on(day, start_time, end_time):
+    """Aware (start, end) for a daily window, ending the next day when it wraps midnight"""
+    start = day_start(day) + timedelta(hours=start_time.hour, minutes=start_time.minute)
+    end = day_start(day) + timedelta(hours=end_time.hour, minutes=end_time.minute)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+class CrewPlan:
+    """One crew member's duties (existing and planned) with the checks a new duty must pass"""
+
+    def __init__(self, profile, timeline, period_start):
+        self.profile = profile
+        self.timeline = timeline
+        self.period_start = period_start
+        self.busy = []  # sorted (start, end, duty_type)
+        self.reach = []  # running max of each busy duty's end, rest included for active ones
+        self.days = set()
+        self.weeks = defaultdict(Counter)
+        self.planned = []  # (start, end, flight_hours) of planned active duties
+        self.active_count = 0
+
+    def week(self, day):
+        return (day - self.period_start).days // 7
+
+    def add(self, day, duty_type, start, end, flight_hours=0.0, planned=True):
+        index = bisect_right(self.busy, (start, end, duty_type))
+        self.busy.insert(index, (start, end, duty_type))
+        reach = required_rest_until(start, end, 'green') if duty_type == 'active' else end
+        if index:
+            reach = max(reach, self.reach[index - 1])
+        self.reach.insert(index, reach)
+        for later in range(index + 1, len(self.reach)):
+            if self.reach[later] >= reach:
+                break
+            self.reach[later] = reach
+        self.days.add(day)
+        if self.period_start <= day:
+            self.weeks[self.week(day)][duty_type] += 1
+        if duty_type == 'active' and planned:
+            self.planned.append((start, end, flight_hours))
+            self.active_count += 1
+
+    def neighbours(self, start, end):
+        """(before, after): the duties starting before `start` and from it on that can
+        overlap [start, end) or fall inside its rest or theirs.
+
+        Duties before the first one reaching past `start` ended, rest included, by then;
+        those starting once the new duty's rest is over cannot clash either.
+        """
+        first = bisect_right(self.reach, start)
+        last = max(first, bisect_left(self.busy, (required_rest_until(start, end, 'green'),)))
+        index = min(max(first, bisect_left(self.busy, (start,))), last)
+        return self.busy[first:index], self.busy[index:last]
+
+    def is_free(self, day, start, end, active):
+        """No duty that day, no overlap and, around active duties, the minimum rest"""
+        if day in self.days:
+            return False
+        before, after = self.neighbours(start, end)
+        for other_start, other_end, other_type in before:
+            if other_end > start:
+                return False
+            if active and other_type == 'active' and required_rest_until(other_start, other_end, 'green') > start:
+                return False
+        for other_start, other_end, other_type in after:
+            if other_start < end:
+                return False
+            if active and other_type == 'active' and required_rest_until(start, end, 'green') > other_start:
+                return False
+        return True
+
+    def within_limits(self, start, end, flight_hours):
+        totals = {}
+        for name, length in ROLLING_WINDOWS:
+            window_start = end - length
+            duty, flight = self.timeline.hours_in_window(window_start, end)
+            for planned_start, planned_end, planned_flight in self.planned + [(start, end, flight_hours)]:
+                inside = hours_between(max(planned_start, window_start), min(planned_end, end))
+                if inside:
+                    duty += inside
+                    flight += planned_flight * inside / hours_between(planned_start, planned_end)
+            totals[name] = {'duty_hours': round(duty, 2), 'flight_hours': round(flight, 2)}
+        _, breaches = assess(totals)
+        return not breaches
+
+    def can_fly(self, day, start, end, flight_hours):
+        profile = self.profile
+        return (
+            self.weeks[self.week(day)]['active'] < profile['active_duty_days']
+            and self.is_free(day, start, end, active=True)
+            and self.within_limits(start, end, flight_hours)
+        )
+
+    def working_days(self, day):
+        counts = self.weeks[self.week(day)]
+        return counts['active'] + counts['standby'] + counts['reserve']
+
+
+class RosterGenerator:
+    """Greedy roster builder for a period.
+
+    Flights are staffed in departure order. For each open (flight, position) seat the
+    crew of that position who accept the haul type are taken from a heap ordered by
+    the active duties already planned and then by seniority, so work is spread evenly
+    and senior crew win ties; the first one free of day, overlap, rest, weekly-quota
+    and rolling fatigue-limit conflicts gets the seat. Remaining days are then filled
+    with standby, reserve and off duties from each profile's weekly pattern. Existing
+    rosters in the period are kept and count towards seats and quotas.
+    """
+
+    def __init__(self, created_by, requirements=None, dry_run=False):
+        self.created_by = created_by
+        self.requirements = requirements or crew_requirements()
+        self.dry_run = dry_run
+        self.rosters = []
+        self.unfilled = []
+        self.timings = {}
+
+    def run(self, start_date, end_date):
+        started = time.perf_counter()
+        self.load(start_date, end_date)
+        self.timings['load'] = time.perf_counter() - started
+
+        phase = time.perf_counter()
+        self.staff_flights()
+        self.timings['flights'] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        self.fill_days(start_date, end_date)
+        self.timings['standby_reserve_off'] = time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        if not self.dry_run and self.rosters:
+            with transaction.atomic():
+                DutyRoster.objects.bulk_create(self.rosters, batch_size=1000)
+                queue_rollups(*roster_keys(self.rosters))
+            invalidate(DutyRoster)
+        self.timings['write'] = time.perf_counter() - phase
+        self.timings['total'] = time.perf_counter() - started
+
+        counts = Counter(roster.duty_type for roster in self.rosters)
+        return {
+            'crew': len(self.plans),
+            'flights': len(self.flights),
+            'active': counts['active'],
+            'standby': counts['standby'],
+            'reserve': counts['reserve'],
+            'off': counts['off'],
+            'unfilled': self.unfilled,
+            'runtime_seconds': {name: round(seconds, 3) for name, seconds in self.timings.items()},
+        }
+
+    def load(self, start_date, end_date):
+        period_start, period_end = day_start(start_date), day_start(end_date + timedelta(days=1))
+        self.flights = list(
+            Flight.objects.filter(scheduled_departure__gte=period_start, scheduled_departure__lt=period_end)
+            .exclude(status='cancelled').order_by('scheduled_departure')
+            .values('id', 'haul_type', 'scheduled_departure', 'scheduled_arrival')
+        )
+        profiles = list(CrewProfile.objects.values(*PROFILE_FIELDS))
+        timelines = build_timelines([profile['user_id'] for profile in profiles], period_start, period_end)
+        self.plans = {
+            profile['user_id']: CrewPlan(profile, timelines[profile['user_id']], start_date)
+            for profile in profiles
+        }
+
+        self.staffed = Counter()
+        existing = DutyRoster.objects.filter(
+            duty_start_time__lt=period_end + DUTY_MARGIN, duty_end_time__gt=period_start - DUTY_MARGIN
+        ).values_list('crew_member_id', 'flight_id', 'position', 'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time')
+        for crew_member_id, flight_id, position, day, duty_type, start, end in existing.iterator(chunk_size=5000):
+            if flight_id:
+                self.staffed[(flight_id, position)] += 1
+            plan = self.plans.get(crew_member_id)
+            if plan is not None:
+                plan.add(day, duty_type, start, end, planned=False)
+
+        self.queues = defaultdict(list)
+        for crew_member_id, plan in self.plans.items():
+            self.push(crew_member_id, plan)
+
+    def push(self, crew_member_id, plan):
+        for haul in HAUL_MATCH.get(plan.profile['preferred_haul'], ()):
+            heapq.heappush(
+                self.queues[(plan.profile['position'], haul)],
+                (plan.active_count, -plan.profile['seniority'], crew_member_id)
+            )
+
+    def take(self, position, haul, day, start, end, flight_hours):
+        """Pop the best crew member able to fly the duty, or None"""
+        queue = self.queues.get((position, haul), [])
+        skipped, chosen = [], None
+        while queue:
+            entry = heapq.heappop(queue)
+            plan = self.plans[entry[2]]
+            if entry[0] != plan.active_count:
+                continue  # superseded by the entry pushed at its last assignment
+            if plan.can_fly(day, start, end, flight_hours):
+                chosen = entry[2]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(queue, entry)
+        return chosen
+
+    def staff_flights(self):
+        for flight in self.flights:
+            start = flight['scheduled_departure'] - REPORT_BEFORE
+            end = flight['scheduled_arrival'] + RELEASE_AFTER
+            day = timezone.localdate(start) if settings.USE_TZ else start.date()
+            flight_hours = hours_between(flight['scheduled_departure'], flight['scheduled_arrival'])
+            for position, needed in self.requirements.get(flight['haul_type'], {}).items():
+                for _ in range(needed - self.staffed[(flight['id'], position)]):
+                    crew_member_id = self.take(position, flight['haul_type'], day, start, end, flight_hours)
+                    if crew_member_id is None:
+                        self.unfilled.append({'flight': flight['id'], 'position': position})
+                        continue
+                    plan = self.plans[crew_member_id]
+                    plan.add(day, 'active', start, end, flight_hours)
+                    self.push(crew_member_id, plan)
+                    self.rosters.append(DutyRoster(
+                        crew_member_id=crew_member_id, flight_id=flight['id'], duty_date=day,
+                        duty_type='active', duty_start_time=start, duty_end_time=end,
+                        position=position, created_by=self.created_by,
+                    ))
+
+    def fill_days(self, start_date, end_date):
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        for crew_member_id, plan in self.plans.items():
+            profile = plan.profile
+            for day in days:
+                if day in plan.days:
+                    continue
+                counts = plan.weeks[plan.week(day)]
+                duty_type, start, end = 'off', None, None
+                if plan.working_days(day) < 7 - profile['days_off']:
+                    for kind, quota in (('standby', 'standby_duty_days'), ('reserve', 'reserve_duty_days')):
+                        if counts[kind] < profile[quota]:
+                            window = window_on(day, profile[f'{kind}_start_time'], profile[f'{kind}_end_time'])
+                            if plan.is_free(day, *window, active=True):
+                                duty_type, (start, end) = kind, window
+                                break
+                if duty_type == 'off':
+                    start, end = day_start(day), day_start(day + timedelta(days=1))
+                    before, after = plan.neighbours(start, end)
+                    start = max([start] + [other_end for _, other_end, _ in before])
+                    end = min([end] + [other_start for other_start, _, _ in after])
+                    if end <= start:
+                        continue
+                plan.add(day, duty_type, start, end)
+                self.rosters.append(DutyRoster(
+                    crew_member_id=crew_member_id, duty_date=day, duty_type=duty_type,
+                    duty_start_time=start, duty_end_time=end, position=profile['position'],
+                    created_by=self.created_by,
+                ))
@@ -0,0 +1,143 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .analytics import queue_rollups, roster_keys
+from .cache import invalidate
+from .models import CustomUser, DutyRoster, Flight
+from .serializers import RosterProposalSerializer
+
+
+ROSTER_COLUMNS = [
+    'crew_member', 'flight', 'duty_date', 'duty_type',
+    'duty_start_time', 'duty_end_time', 'position',
+]
+
+
+def read_csv(stream):
+    """Yield (line_number, row) pairs from a CSV file with a header row"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {key: (value or None) for key, value in row.items() if key in ROSTER_COLUMNS}
+
+
+class UnreadableRow:
+    """Stands in for a line that could not be parsed, so it is rejected like an invalid row"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_jsonl(stream):
+    """Yield (line_number, row) pairs from a JSON Lines file, skipping blank lines"""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_number, UnreadableRow(f'Invalid JSON: {exc.msg} (column {exc.colno})')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, UnreadableRow('Expected a JSON object')
+        else:
+            yield line_number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RosterImporter:
+    """Stream roster rows into DutyRoster in chunks with set-based validation.
+
+    Each chunk is validated field by field, then crew members, flights and existing
+    (crew_member, duty_date) pairs are resolved with one query each and the valid rows
+    are inserted with a single bulk_create. Rows are never saved one at a time, so no
+    model signals are dispatched for them.
+
+    Once a chunk is inserted its days are found by the next chunk's query, so only the
+    days of the current chunk are kept in memory; a dry run inserts nothing and has
+    to remember every day it has validated.
+    """
+
+    def __init__(self, created_by, chunk_size=1000, dry_run=False):
+        self.created_by = created_by
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.validator = RosterProposalSerializer()
+        self.seen_days = set()
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.chunk_size):
+            self.import_chunk(chunk)
+        return {'created': self.created, 'rejected': len(self.errors), 'errors': self.errors}
+
+    def reject(self, line_number, error):
+        self.errors.append({'line': line_number, 'error': error})
+
+    def import_chunk(self, chunk):
+        if not self.dry_run:
+            self.seen_days = set()
+        candidates = []
+        for line_number, row in chunk:
+            if isinstance(row, UnreadableRow):
+                self.reject(line_number, row.error)
+                continue
+            try:
+                candidates.append((line_number, self.validator.run_validation(row)))
+            except ValidationError as exc:
+                self.reject(line_number, {
+                    field: [str(message) for message in messages]
+                    for field, messages in exc.detail.items()
+                })
+        if not candidates:
+            return
+
+        crew_ids = {data['crew_member'] for _, data in candidates}
+        flight_ids = {data['flight'] for _, data in candidates if data.get('flight')}
+        known_crew = set(CustomUser.objects.filter(id__in=crew_ids).values_list('id', flat=True))
+        known_flights = set(Flight.objects.filter(id__in=flight_ids).values_list('id', flat=True))
+        taken_days = set(DutyRoster.objects.filter(
+            crew_member_id__in=crew_ids,
+            duty_date__in={data['duty_date'] for _, data in candidates},
+        ).values_list('crew_member_id', 'duty_date'))
+
+        rosters = []
+        for line_number, data in candidates:
+            day = (data['crew_member'], data['duty_date'])
+            if data['crew_member'] not in known_crew:
+                self.reject(line_number, 'Unknown crew_member')
+            elif data.get('flight') and data['flight'] not in known_flights:
+                self.reject(line_number, 'Unknown flight')
+            elif day in taken_days or day in self.seen_days:
+                self.reject(line_number, 'Crew member already has a duty on this date')
+            else:
+                self.seen_days.add(day)
+                rosters.append(DutyRoster(
+                    crew_member_id=data['crew_member'],
+                    flight_id=data.get('flight'),
+                    duty_date=data['duty_date'],
+                    duty_type=data['duty_type'],
+                    duty_start_time=data['duty_start_time'],
+                    duty_end_time=data['duty_end_time'],
+                    position=data['position'],
+                    created_by=self.created_by,
+                ))
+
+        if rosters and not self.dry_run:
+            with transaction.atomic():
+                DutyRoster.objects.bulk_create(rosters, batch_size=self.chunk_size)
+                queue_rollups(*roster_keys(rosters))
+            invalidate(DutyRoster)
+        self.created += len(rosters)
@@ -0,0 +1,9 @@
+from datetime import timedelta
+
+# Flight haul types a crew member's preferred_haul accepts
+HAUL_MATCH = {'short': {'short'}, 'long': {'long'}, 'both': {'short', 'long'}}
+# Duties this far outside the dates being planned are kept for overlap and rest checks
+DUTY_MARGIN = timedelta(days=2)
+# Duty runs from report time before departure to release after arrival
+REPORT_BEFORE = timedelta(hours=1)
+RELEASE_AFTER = timedelta(minutes=30)
@@ -1,14 +1,64 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+import uuid
+from .metrics import TimedSerializerMixin
 from .models import (
     CustomUser, CrewProfile, Flight, DutyRoster, 
-    FatigueLog, FlightSwapRequest, Alert, AlertRecipient
+    FatigueLog, FlightSwapRequest, Alert, AlertRecipient,
+    CrewDailyRollup, PositionDailyRollup, AirportDailyRollup
 )
 
 User = get_user_model()
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+def parse_field_list(request, param):
+    """Collect comma-separated names from every occurrence of a query parameter"""
+    if request is None:
+        return set()
+    names = set()
+    for value in request.query_params.getlist(param):
+        names.update(name.strip() for name in value.split(',') if name.strip())
+    return names
+
+
+class ExpandableFieldsMixin:
+    """Serve slim representations unless nested fields are asked for.
+
+    Fields listed in `Meta.expandable_fields` are dropped unless named in `?expand=`
+    (dotted paths reach nested serializers, e.g. `flight_details.crew_assignments`),
+    and `?fields=` restricts the top-level fields. An explicit `expand` set in the
+    serializer context takes precedence over the request.
+    """
+
+    def field_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        expand = self.context.get('expand')
+        if expand is None:
+            expand = parse_field_list(request, 'expand')
+
+        path = self.field_path()
+        prefix = f'{path}.' if path else ''
+        for name in getattr(self.Meta, 'expandable_fields', []):
+            if f'{prefix}{name}' not in expand:
+                fields.pop(name, None)
+
+        selected = parse_field_list(request, 'fields') if not path else set()
+        if selected:
+            fields = {name: field for name, field in fields.items() if name in selected}
+        return fields
+
+
+class CustomUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for CustomUser model"""
     password = serializers.CharField(write_only=True)
     
@@ -42,7 +92,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class CrewProfileSerializer(serializers.ModelSerializer):
+class CrewProfileSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for CrewProfile model"""
     user_details = CustomUserSerializer(source='user', read_only=True)
     
@@ -55,13 +105,14 @@ class CrewProfileSerializer(serializers.ModelSerializer):
             'reserve_start_time', 'reserve_end_time', 'allow_swapping',
             'created_at', 'updated_at'
         ]
+        expandable_fields = ['user_details']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class FlightSerializer(serializers.ModelSerializer):
+class FlightSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for Flight model"""
     duration = serializers.SerializerMethodField()
     crew_assignments = serializers.StringRelatedField(many=True, read_only=True)
@@ -74,6 +125,7 @@ class FlightSerializer(serializers.ModelSerializer):
             'actual_arrival', 'gate', 'aircraft_type', 'status', 'haul_type',
             'duration', 'crew_assignments', 'created_at', 'updated_at'
         ]
+        expandable_fields = ['crew_assignments']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
@@ -87,7 +139,7 @@ class FlightSerializer(serializers.ModelSerializer):
         return None
 
 
-class DutyRosterSerializer(serializers.ModelSerializer):
+class DutyRosterSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for DutyRoster model"""
     crew_member_details = CustomUserSerializer(source='crew_member', read_only=True)
     flight_details = FlightSerializer(source='flight', read_only=True)
@@ -100,13 +152,89 @@ class DutyRosterSerializer(serializers.ModelSerializer):
             'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time', 'position',
             'created_by', 'created_by_details', 'created_at', 'updated_at'
         ]
+        expandable_fields = ['crew_member_details', 'flight_details', 'created_by_details']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class FatigueLogSerializer(serializers.ModelSerializer):
+class RosterProposalSerializer(serializers.Serializer):
+    """Proposed DutyRoster row for bulk legality checks; references are resolved in bulk"""
+    crew_member = serializers.UUIDField()
+    flight = serializers.UUIDField(required=False, allow_null=True)
+    duty_date = serializers.DateField()
+    duty_type = serializers.ChoiceField(choices=DutyRoster.DUTY_TYPE_CHOICES)
+    duty_start_time = serializers.DateTimeField()
+    duty_end_time = serializers.DateTimeField()
+    position = serializers.ChoiceField(choices=CrewProfile.POSITION_CHOICES)
+    
+    def validate(self, data):
+        if data['duty_end_time'] <= data['duty_start_time']:
+            raise serializers.ValidationError('duty_end_time must be after duty_start_time')
+        return data
+
+
+class SwapBatchSerializer(serializers.Serializer):
+    """Swap requests to execute together"""
+    swap_requests = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+
+
+class FatigueRecomputeSerializer(serializers.Serializer):
+    """Crew members and first day of the fatigue logs to recompute"""
+    crew_members = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False, max_length=1000
+    )
+    since = serializers.DateField(required=False, allow_null=True)
+
+
+# Longest extra delay, in minutes, a disruption plan takes
+MAX_DELAY_MINUTES = 24 * 60
+
+
+class DisruptionDelaySerializer(serializers.Serializer):
+    """Extra delay given with a flight's status change"""
+    delay_minutes = serializers.IntegerField(min_value=0, max_value=MAX_DELAY_MINUTES)
+
+
+class DisruptionSerializer(serializers.Serializer):
+    """Cancelled or delayed flights to re-roster, with optional extra delay in minutes per flight"""
+    flights = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+    delays = serializers.DictField(
+        child=serializers.IntegerField(min_value=0, max_value=MAX_DELAY_MINUTES), required=False, default=dict
+    )
+    
+    def validate_delays(self, value):
+        try:
+            return {uuid.UUID(str(flight_id)): minutes for flight_id, minutes in value.items()}
+        except ValueError:
+            raise serializers.ValidationError('Keys must be flight ids')
+
+
+class DisruptionApplySerializer(serializers.Serializer):
+    """A disruption plan to apply, optionally limited to some of its rosters"""
+    plan = serializers.CharField()
+    accept = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=5000)
+
+
+class AlertAudienceSerializer(serializers.Serializer):
+    """Crew an alert is broadcast to: the flight's crew, positions, haul types or ids"""
+    flight_crew = serializers.BooleanField(default=False)
+    positions = serializers.ListField(
+        child=serializers.ChoiceField(choices=CrewProfile.POSITION_CHOICES), required=False, default=list
+    )
+    haul_types = serializers.ListField(
+        child=serializers.ChoiceField(choices=CrewProfile.HAUL_CHOICES), required=False, default=list
+    )
+    crew_members = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    
+    def validate(self, data):
+        if not (data['flight_crew'] or data['positions'] or data['haul_types'] or data['crew_members']):
+            raise serializers.ValidationError('Select at least one audience')
+        return data
+
+
+class FatigueLogSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for FatigueLog model"""
     crew_member_details = CustomUserSerializer(source='crew_member', read_only=True)
     
@@ -117,12 +245,16 @@ class FatigueLogSerializer(serializers.ModelSerializer):
             'total_duty_hours', 'flight_hours', 'fatigue_level', 'rest_required_until',
             'created_at'
         ]
+        expandable_fields = ['crew_member_details']
         extra_kwargs = {
+            'total_duty_hours': {'read_only': True},
+            'fatigue_level': {'read_only': True},
+            'rest_required_until': {'read_only': True},
             'created_at': {'read_only': True},
         }
 
 
-class FlightSwapRequestSerializer(serializers.ModelSerializer):
+class FlightSwapRequestSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for FlightSwapRequest model"""
     requesting_crew_details = CustomUserSerializer(source='requesting_crew', read_only=True)
     target_crew_details = CustomUserSerializer(source='target_crew', read_only=True)
@@ -138,28 +270,34 @@ class FlightSwapRequestSerializer(serializers.ModelSerializer):
             'target_flight', 'target_flight_details', 'reason', 'status',
             'approved_by', 'approved_by_details', 'created_at', 'updated_at'
         ]
+        expandable_fields = [
+            'requesting_crew_details', 'target_crew_details', 'requesting_flight_details',
+            'target_flight_details', 'approved_by_details'
+        ]
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class AlertRecipientSerializer(serializers.ModelSerializer):
+class AlertRecipientSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for AlertRecipient model"""
     recipient_details = CustomUserSerializer(source='recipient', read_only=True)
     
     class Meta:
         model = AlertRecipient
         fields = [
-            'alert', 'recipient', 'recipient_details', 'is_read', 'sms_sent',
-            'sms_delivery_status', 'read_at', 'created_at'
+            'id', 'alert', 'recipient', 'recipient_details', 'is_read', 'sms_sent',
+            'sms_delivery_status', 'read_at', 'created_at', 'updated_at'
         ]
+        expandable_fields = ['recipient_details']
         extra_kwargs = {
             'created_at': {'read_only': True},
+            'updated_at': {'read_only': True},
         }
 
 
-class AlertSerializer(serializers.ModelSerializer):
+class AlertSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     """Serializer for Alert model"""
     flight_details = FlightSerializer(source='flight', read_only=True)
     created_by_details = CustomUserSerializer(source='created_by', read_only=True)
@@ -170,27 +308,73 @@ class AlertSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'alert_type', 'severity', 'title', 'message', 'flight',
             'flight_details', 'created_by', 'created_by_details', 'recipients',
-            'recipients_details', 'is_active', 'created_at'
+            'recipients_details', 'is_active', 'created_at', 'updated_at'
         ]
+        expandable_fields = ['flight_details', 'created_by_details', 'recipients_details']
         extra_kwargs = {
             'created_at': {'read_only': True},
+            'updated_at': {'read_only': True},
         }
 
 
+ROLLUP_FIELDS = [
+    'date', 'duties', 'duty_hours', 'flight_hours', 'orange_days', 'red_days',
+    'swap_requests', 'swaps_completed', 'swap_request_rate', 'alerts_received',
+    'alerts_read', 'avg_read_latency_seconds', 'updated_at'
+]
+
+
+class DailyRollupSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Base serializer for the analytics rollups, adding derived rates"""
+    swap_request_rate = serializers.SerializerMethodField()
+    avg_read_latency_seconds = serializers.SerializerMethodField()
+    
+    def get_swap_request_rate(self, obj):
+        """Swap requests per active duty"""
+        return round(obj.swap_requests / obj.duties, 3) if obj.duties else None
+    
+    def get_avg_read_latency_seconds(self, obj):
+        return round(obj.read_latency_seconds / obj.alerts_read) if obj.alerts_read else None
+
+
+class CrewDailyRollupSerializer(DailyRollupSerializer):
+    """Serializer for CrewDailyRollup model"""
+    
+    class Meta:
+        model = CrewDailyRollup
+        fields = ['id', 'crew_member', 'position'] + ROLLUP_FIELDS
+
+
+class PositionDailyRollupSerializer(DailyRollupSerializer):
+    """Serializer for PositionDailyRollup model"""
+    
+    class Meta:
+        model = PositionDailyRollup
+        fields = ['id', 'position', 'crew_members'] + ROLLUP_FIELDS
+
+
+class AirportDailyRollupSerializer(DailyRollupSerializer):
+    """Serializer for AirportDailyRollup model"""
+    
+    class Meta:
+        model = AirportDailyRollup
+        fields = ['id', 'airport', 'flights', 'crew_members'] + ROLLUP_FIELDS
+
+
 # Simplified serializers for dropdown/choice endpoints
-class UserChoiceSerializer(serializers.ModelSerializer):
+class UserChoiceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Simplified user serializer for dropdown choices"""
     display_name = serializers.SerializerMethodField()
     
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'first_name', 'last_name', 'display_name', 'user_type']
+        fields = ['id', 'username', 'display_name', 'user_type']
     
     def get_display_name(self, obj):
-        return f"{obj.first_name} {obj.last_name}" if obj.first_name and obj.last_name else obj.username
+        return f"{obj.username} ({obj.get_user_type_display()})"
 
 
-class FlightChoiceSerializer(serializers.ModelSerializer):
+class FlightChoiceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Simplified flight serializer for dropdown choices"""
     display_name = serializers.SerializerMethodField()
     
@@ -1,22 +1,193 @@
-# alerts/signals.py
+# famadata/signals.py
 
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete
 from django.dispatch import receiver
-from .models import Alert, AlertRecipient
-from alerts.utils import send_sms_alert
+from .analytics import local_date, queue_rollups, roster_keys
+from .availability import roster_changed
+from .cache import invalidate
+from .models import (
+    Alert, AlertRecipient, CrewFatigueStatus, CrewProfile, CustomUser,
+    DutyRoster, FatigueLog, Flight, FlightSwapRequest, Tombstone
+)
+from .flight_changes import SCHEDULE_FIELDS, diff, record_flight_change, snapshot
+from .pubsub import alert_event, publish_event
+from .sms_queue import enqueue_alert_sms
+from .sync import SYNC_MODELS, tombstones_for
+
+# Models whose writes expire cached API responses and in-memory indexes
+CACHED_MODELS = [CustomUser, CrewProfile, Flight, DutyRoster, FatigueLog, Alert, AlertRecipient]
+
+
+@receiver(m2m_changed, sender=Alert.recipients.through)
+def send_sms_to_recipients(sender, instance, action, pk_set=None, **kwargs):
+    if action == "post_add" and isinstance(instance, Alert):
+        # Delivery happens in the SMS worker; only queue the messages here
+        enqueue_alert_sms(instance, recipient_ids=pk_set)
+
+
+@receiver(post_save, sender=FatigueLog)
+def update_crew_fatigue_status(sender, instance, **kwargs):
+    CrewFatigueStatus.objects.record(instance)
+
+
+@receiver(post_delete, sender=FatigueLog)
+def refresh_crew_fatigue_status(sender, instance, **kwargs):
+    CrewFatigueStatus.objects.refresh([instance.crew_member_id])
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate(sender)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache-save-{model.__name__}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'cache-delete-{model.__name__}')
+
+
+@receiver(m2m_changed, sender=Alert.recipients.through)
+def invalidate_alert_recipients(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate(Alert, AlertRecipient)
+
+
+def record_tombstones(sender, instance, **kwargs):
+    Tombstone.objects.bulk_create(tombstones_for(instance))
+
+
+for model in SYNC_MODELS:
+    post_delete.connect(record_tombstones, sender=model, dispatch_uid=f'tombstone-{model.__name__}')
+
+
+@receiver(post_init, sender=DutyRoster)
+def remember_roster_crew_member(sender, instance, **kwargs):
+    instance._synced_crew_member_id = instance.crew_member_id
+
+
+@receiver(post_save, sender=DutyRoster)
+def record_reassigned_roster(sender, instance, created, **kwargs):
+    """A roster moved to another crew member is a deletion for the previous one"""
+    previous = instance._synced_crew_member_id
+    if not created and previous and previous != instance.crew_member_id:
+        Tombstone.objects.create(model='dutyroster', object_id=str(instance.pk), crew_member=previous)
+    instance._synced_crew_member_id = instance.crew_member_id
+
+
+@receiver(m2m_changed, sender=Alert.recipients.through)
+def push_added_alert(sender, instance, action, pk_set=None, **kwargs):
+    if action == "post_add" and isinstance(instance, Alert) and pk_set:
+        publish_event(pk_set, 'alert', alert_event(instance))
+
+
+@receiver(post_save, sender=AlertRecipient)
+def push_alert_recipient(sender, instance, created, **kwargs):
+    if created:
+        publish_event([instance.recipient_id], 'alert', alert_event(instance.alert))
+
+
+@receiver(post_init, sender=Flight)
+def remember_flight_values(sender, instance, **kwargs):
+    instance._tracked_values = snapshot(instance)
+
+
+@receiver(post_save, sender=Flight)
+def capture_flight_change(sender, instance, created, **kwargs):
+    """Queue changed gate, schedule or status for a debounced crew alert"""
+    if not created:
+        changes = diff(instance._tracked_values, instance)
+        if changes:
+            record_flight_change(instance, changes, changed_by=getattr(instance, '_changed_by', None))
+        if changes.keys() & set(SCHEDULE_FIELDS):
+            # Flight hours of the crew's rollups follow the schedule
+            crew_days = set(DutyRoster.objects.filter(flight=instance).values_list('crew_member_id', 'duty_date'))
+            queue_rollups(crew_days, flight_days={(instance.pk, day) for _, day in crew_days})
+    instance._tracked_values = snapshot(instance)
+
+
+@receiver(post_init, sender=DutyRoster)
+def remember_roster_rollup_key(sender, instance, **kwargs):
+    instance._rollup_key = (instance.crew_member_id, instance.duty_date, instance.flight_id)
+
+
+def queue_roster_rollups(sender, instance, **kwargs):
+    """Refresh the rollups of the day a roster is on now and the one it was on when loaded"""
+    crew_days, flight_days = roster_keys([instance])
+    crew_member_id, duty_date, flight_id = instance._rollup_key
+    if crew_member_id and duty_date:
+        crew_days.add((crew_member_id, duty_date))
+        if flight_id:
+            flight_days.add((flight_id, duty_date))
+    queue_rollups(crew_days, flight_days)
+    instance._rollup_key = (instance.crew_member_id, instance.duty_date, instance.flight_id)
+
+
+@receiver(post_init, sender=FatigueLog)
+def remember_log_start(sender, instance, **kwargs):
+    instance._rollup_start = instance.duty_start
+
+
+def queue_fatigue_rollups(sender, instance, **kwargs):
+    starts = {instance.duty_start, instance._rollup_start} - {None}
+    queue_rollups({(instance.crew_member_id, local_date(start)) for start in starts})
+    instance._rollup_start = instance.duty_start
+
+
+def queue_swap_rollups(sender, instance, **kwargs):
+    day = local_date(instance.created_at)
+    queue_rollups([(instance.requesting_crew_id, day)], flight_days=[(instance.requesting_flight_id, day)])
+
+
+def alert_flight_id(recipient):
+    if AlertRecipient.alert.is_cached(recipient):
+        return recipient.alert.flight_id
+    return Alert.objects.filter(pk=recipient.alert_id).values_list('flight_id', flat=True).first()
+
+
+def queue_delivery_rollups(sender, instance, **kwargs):
+    day = local_date(instance.created_at)
+    flight_id = alert_flight_id(instance)
+    queue_rollups([(instance.recipient_id, day)], flight_days=[(flight_id, day)] if flight_id else [])
+
+
+ROLLUP_RECEIVERS = {
+    DutyRoster: queue_roster_rollups,
+    FatigueLog: queue_fatigue_rollups,
+    FlightSwapRequest: queue_swap_rollups,
+    AlertRecipient: queue_delivery_rollups,
+}
+
+for model, handler in ROLLUP_RECEIVERS.items():
+    post_save.connect(handler, sender=model, dispatch_uid=f'rollup-save-{model.__name__}')
+    post_delete.connect(handler, sender=model, dispatch_uid=f'rollup-delete-{model.__name__}')
+
 
 @receiver(m2m_changed, sender=Alert.recipients.through)
-def send_sms_to_recipients(sender, instance, action, **kwargs):
-    if action == "post_add":
-        alert = instance
-        for user in alert.recipients.all():
-            phone = getattr(user, "phone_number", None)
-            if phone:
-                # Check if SMS was already sent
-                ar, created = AlertRecipient.objects.get_or_create(alert=alert, recipient=user)
-                if not ar.sms_sent:
-                    message = f"🚨 {alert.title}\n{alert.message}"
-                    response = send_sms_alert(phone, message)
-                    ar.sms_sent = True
-                    ar.sms_delivery_status = "sent" if response else "failed"
-                    ar.save()
+def queue_recipient_rollups(sender, instance, action, pk_set=None, **kwargs):
+    """Recipients added or removed through `alert.recipients` skip the model signals"""
+    if not isinstance(instance, Alert):
+        return
+    if action in ('pre_remove', 'pre_clear'):
+        removed = AlertRecipient.objects.filter(alert=instance)
+        if pk_set:
+            removed = removed.filter(recipient_id__in=pk_set)
+        instance._removed_rollup_days = {
+            (recipient_id, local_date(created_at)) for recipient_id, created_at in removed.values_list('recipient_id', 'created_at')
+        }
+    elif action in ('post_remove', 'post_clear'):
+        crew_days = getattr(instance, '_removed_rollup_days', set())
+        queue_rollups(crew_days, flight_days={(instance.flight_id, day) for _, day in crew_days})
+    elif action == 'post_add' and pk_set:
+        added = AlertRecipient.objects.filter(alert=instance, recipient_id__in=pk_set)
+        crew_days = {
+            (recipient_id, local_date(created_at)) for recipient_id, created_at in added.values_list('recipient_id', 'created_at')
+        }
+        queue_rollups(crew_days, flight_days={(instance.flight_id, day) for _, day in crew_days})
+
+
+@receiver(post_save, sender=DutyRoster)
+def update_availability(sender, instance, **kwargs):
+    roster_changed(instance)
+
+
+@receiver(post_delete, sender=DutyRoster)
+def drop_availability(sender, instance, **kwargs):
+    roster_changed(instance, deleted=True)
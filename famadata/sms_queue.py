@@ -0,0 +1,154 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from alerts.transports import e164
+
+from .cache import invalidate
+from .models import AlertRecipient, OutboundSMS
+
+logger = logging.getLogger(__name__)
+
+# Recipients per gateway request
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+# A message left in "sending" this long belongs to a dead worker and is claimed again
+SENDING_LEASE = timedelta(minutes=5)
+
+SENT_STATUSES = {'success', 'sent', 'queued', 'processed'}
+
+
+def alert_message(alert):
+    return f"🚨 {alert.title}\n{alert.message}"
+
+
+def get_gateway():
+    """Return the configured `send(message, phone_numbers)` callable"""
+    return import_string(getattr(settings, 'SMS_GATEWAY', 'alerts.utils.send_bulk_sms'))
+
+
+def enqueue_alert_sms(alert, recipient_ids=None):
+    """Queue one SMS per unsent recipient of `alert` with a single bulk_create"""
+    recipients = AlertRecipient.objects.filter(alert=alert, sms_sent=False).exclude(
+        recipient__phone_number=''
+    ).exclude(
+        sms_messages__status__in=['pending', 'sending']
+    )
+    if recipient_ids is not None:
+        recipients = recipients.filter(recipient_id__in=recipient_ids)
+    rows = list(recipients.values_list('id', 'recipient__phone_number'))
+    if not rows:
+        return 0
+
+    message = alert_message(alert)
+    OutboundSMS.objects.bulk_create(
+        [OutboundSMS(alert_recipient_id=ar_id, phone_number=phone, message=message) for ar_id, phone in rows],
+        batch_size=500,
+    )
+    AlertRecipient.objects.filter(id__in=[ar_id for ar_id, _ in rows]).update(
+        sms_delivery_status='queued', updated_at=timezone.now()
+    )
+    invalidate(AlertRecipient)
+    return len(rows)
+
+
+def claim_batch(limit):
+    """Mark up to `limit` due messages as sending and return them"""
+    now = timezone.now()
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', updated_at__lt=now - SENDING_LEASE)
+    with transaction.atomic():
+        ids = list(
+            OutboundSMS.objects.select_for_update(skip_locked=True)
+            .filter(due).order_by('next_attempt_at').values_list('id', flat=True)[:limit]
+        )
+        OutboundSMS.objects.filter(id__in=ids).update(status='sending', updated_at=now)
+    return list(OutboundSMS.objects.filter(id__in=ids))
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+
+
+def send_group(gateway, message, phone_numbers):
+    """Send one batch; a gateway error is reported as the status of every number"""
+    try:
+        return gateway(message, phone_numbers), ''
+    except Exception as exc:
+        logger.warning('SMS gateway error: %s', exc)
+        return {}, str(exc)[:200]
+
+
+def process_batch(gateway=None, limit=500, workers=4, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Claim due messages, send them as multi-recipient batches and record the outcome.
+
+    Gateway requests run on a thread pool; all database writes happen afterwards in
+    bulk. Returns {'sent': n, 'retrying': n, 'failed': n}.
+    """
+    gateway = gateway or get_gateway()
+    messages = claim_batch(limit)
+    if not messages:
+        return {'sent': 0, 'retrying': 0, 'failed': 0}
+
+    groups = defaultdict(list)
+    for sms in messages:
+        groups[sms.message].append(sms)
+    batches = [
+        (text, group[start:start + batch_size])
+        for text, group in groups.items()
+        for start in range(0, len(group), batch_size)
+    ]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda batch: send_group(gateway, batch[0], [sms.phone_number for sms in batch[1]]),
+            batches
+        ))
+
+    now = timezone.now()
+    counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+    recipients = []
+    for (_, batch), (statuses, error) in zip(batches, results):
+        # The gateway reports numbers in its own international format
+        statuses = {e164(number): status for number, status in statuses.items()}
+        for sms in batch:
+            status = statuses.get(e164(sms.phone_number))
+            sms.attempts += 1
+            sms.updated_at = now
+            if status and status.lower() in SENT_STATUSES:
+                sms.status, sms.sent_at, sms.last_error = 'sent', now, ''
+                delivery = 'sent'
+            else:
+                sms.last_error = (error or status or 'No status returned')[:200]
+                if sms.attempts >= max_attempts:
+                    sms.status = 'failed'
+                    delivery = 'failed'
+                else:
+                    sms.status = 'pending'
+                    sms.next_attempt_at = now + backoff(sms.attempts)
+                    delivery = 'retrying'
+            counts[delivery] += 1
+            recipients.append(AlertRecipient(
+                id=sms.alert_recipient_id,
+                sms_sent=delivery != 'retrying',
+                sms_delivery_status=delivery,
+                updated_at=now,
+            ))
+
+    with transaction.atomic():
+        OutboundSMS.objects.bulk_update(
+            messages, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'updated_at'], batch_size=500
+        )
+        AlertRecipient.objects.bulk_update(
+            recipients, ['sms_sent', 'sms_delivery_status', 'updated_at'], batch_size=500
+        )
+    invalidate(AlertRecipient)
+    return counts
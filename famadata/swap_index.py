@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import get_generations
+from .conflicts import day_start
+from .fatigue import DutyInterval, assess, build_timelines, hours_between
+from .legality import check_overlaps, check_rest
+from .models import CrewProfile, DutyRoster, FatigueLog, Flight
+from .scheduling import DUTY_MARGIN, HAUL_MATCH
+
+# Most candidates whose fatigue limits are checked per request
+MAX_FATIGUE_CHECKS = 50
+
+ROSTER_FIELDS = (
+    'id', 'crew_member_id', 'flight_id', 'duty_date', 'duty_type', 'duty_start_time', 'duty_end_time',
+    'position', 'flight__flight_number', 'flight__haul_type',
+    'flight__scheduled_departure', 'flight__scheduled_arrival',
+)
+
+
+class SwapIndex:
+    """Swappable duties between two dates, bucketed by (date, position, haul type).
+
+    Built with three queries. Alongside the buckets it keeps every crew member's
+    duties and rest requirements around those dates, so overlap, rest and
+    one-duty-per-day checks for a candidate exchange run in memory.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.generations = get_generations(self.models())
+        self.built_at = time.monotonic()
+
+        self.profiles = {
+            row['user_id']: row
+            for row in CrewProfile.objects.values('user_id', 'position', 'preferred_haul', 'allow_swapping', 'seniority')
+        }
+        self.duties = defaultdict(list)
+        self.slots = defaultdict(list)
+        rows = DutyRoster.objects.filter(
+            duty_date__gte=start_date - DUTY_MARGIN, duty_date__lte=end_date + DUTY_MARGIN
+        ).values(*ROSTER_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            row['index'] = None
+            self.duties[row['crew_member_id']].append(row)
+            profile = self.profiles.get(row['crew_member_id'])
+            if (
+                row['flight_id'] and profile and profile['allow_swapping']
+                and start_date <= row['duty_date'] <= end_date
+            ):
+                self.slots[(row['duty_date'], row['position'], row['flight__haul_type'])].append(row)
+        for crew_duties in self.duties.values():
+            crew_duties.sort(key=lambda duty: (duty['duty_start_time'], duty['duty_end_time']))
+
+        self.rest_logs = defaultdict(list)
+        logs = FatigueLog.objects.filter(rest_required_until__gt=day_start(start_date - DUTY_MARGIN)).values(
+            'id', 'crew_member_id', 'duty_start', 'rest_required_until'
+        )
+        for row in logs:
+            self.rest_logs[row['crew_member_id']].append(row)
+
+    @staticmethod
+    def models():
+        return [DutyRoster, CrewProfile, Flight, FatigueLog]
+
+    def covers(self, start_date, end_date):
+        return self.start_date <= start_date and end_date <= self.end_date
+
+    def is_current(self, max_age):
+        return time.monotonic() - self.built_at < max_age and get_generations(self.models()) == self.generations
+
+    def duty(self, roster_id, crew_member_id):
+        return next((duty for duty in self.duties.get(crew_member_id, []) if duty['id'] == roster_id), None)
+
+    def legal_exchange(self, crew_member_id, giving, taking):
+        """Whether a crew member can drop `giving` for `taking` without overlap, rest or day conflicts"""
+        duties = [duty for duty in self.duties.get(crew_member_id, []) if duty['id'] != giving['id']]
+        if any(duty['duty_date'] == taking['duty_date'] for duty in duties):
+            return False
+        duties.append(dict(taking, id=None, index=0, crew_member_id=crew_member_id))
+        duties.sort(key=lambda duty: (duty['duty_start_time'], duty['duty_end_time']))
+        violations = [[]]
+        check_overlaps(duties, violations)
+        check_rest(duties, self.rest_logs.get(crew_member_id, []), violations)
+        return not violations[0]
+
+    def candidates(self, roster, days):
+        """Compatible (roster, score) exchanges for `roster`, best first"""
+        requester = self.profiles.get(roster['crew_member_id'])
+        if requester is None or not requester['allow_swapping']:
+            return []
+        found = []
+        for offset in range(-days, days + 1):
+            day = roster['duty_date'] + timedelta(days=offset)
+            for haul in HAUL_MATCH[requester['preferred_haul']]:
+                for other in self.slots.get((day, roster['position'], haul), []):
+                    if other['crew_member_id'] == roster['crew_member_id']:
+                        continue
+                    partner = self.profiles[other['crew_member_id']]
+                    if roster['flight__haul_type'] not in HAUL_MATCH[partner['preferred_haul']]:
+                        continue
+                    if not (
+                        self.legal_exchange(roster['crew_member_id'], roster, other)
+                        and self.legal_exchange(other['crew_member_id'], other, roster)
+                    ):
+                        continue
+                    # Nearest day first, then the closest report time, then the most senior
+                    gap = abs((other['duty_start_time'] - roster['duty_start_time']).total_seconds())
+                    found.append((other, (abs(offset), gap, -partner['seniority'])))
+        found.sort(key=lambda candidate: candidate[1])
+        return found
+
+
+def duty_interval(duty):
+    departure, arrival = duty['flight__scheduled_departure'], duty['flight__scheduled_arrival']
+    flight_hours = hours_between(departure, arrival) if departure and arrival else 0.0
+    return DutyInterval(duty['duty_start_time'], duty['duty_end_time'], flight_hours)
+
+
+def within_fatigue_limits(timelines, crew_member_id, giving, taking):
+    if taking['duty_type'] != 'active':
+        return True
+    timeline = timelines[crew_member_id].without_rosters({giving['id']}).with_intervals([duty_interval(taking)])
+    _, breaches = assess(timeline.rolling_totals(taking['duty_end_time']))
+    return not breaches
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_swap_index(start_date, end_date):
+    """Return an index covering the dates, reusing the shared one while it is current.
+
+    The shared index spans SWAP_INDEX_DAYS from yesterday and is rebuilt when a
+    roster, profile, flight or fatigue log changes or after SWAP_INDEX_TTL seconds;
+    other dates get a one-off index.
+    """
+    global _index
+    max_age = getattr(settings, 'SWAP_INDEX_TTL', 300)
+    index = _index
+    if index is not None and index.covers(start_date, end_date) and index.is_current(max_age):
+        return index
+
+    today = timezone.localdate()
+    default_start = today - timedelta(days=1)
+    default_end = today + timedelta(days=getattr(settings, 'SWAP_INDEX_DAYS', 42))
+    if not (default_start <= start_date and end_date <= default_end):
+        return SwapIndex(start_date, end_date)
+    with _index_lock:
+        if _index is None or not _index.covers(start_date, end_date) or not _index.is_current(max_age):
+            _index = SwapIndex(default_start, default_end)
+        return _index
+
+
+def suggest_swaps(roster, days=3, limit=10):
+    """Rank exchange partners for `roster` within `days` of its date.
+
+    Candidates hold a duty in the same position on a flight whose haul type both
+    crew members accept, allow swapping, and can exchange duties without overlap,
+    rest, one-duty-per-day or fatigue-limit violations.
+    """
+    index = get_swap_index(roster.duty_date - timedelta(days=days), roster.duty_date + timedelta(days=days))
+    duty = index.duty(roster.id, roster.crew_member_id)
+    if duty is None or not roster.flight_id:
+        return []
+
+    candidates = index.candidates(duty, days)[:MAX_FATIGUE_CHECKS]
+    if not candidates:
+        return []
+    crew_ids = {duty['crew_member_id']} | {other['crew_member_id'] for other, _ in candidates}
+    duties = [duty] + [other for other, _ in candidates]
+    timelines = build_timelines(
+        crew_ids,
+        min(item['duty_start_time'] for item in duties),
+        max(item['duty_end_time'] for item in duties),
+    )
+
+    suggestions = []
+    for other, _ in candidates:
+        if not (
+            within_fatigue_limits(timelines, duty['crew_member_id'], duty, other)
+            and within_fatigue_limits(timelines, other['crew_member_id'], other, duty)
+        ):
+            continue
+        suggestions.append({
+            'target_crew': other['crew_member_id'],
+            'target_flight': other['flight_id'],
+            'target_roster': other['id'],
+            'flight_number': other['flight__flight_number'],
+            'duty_date': other['duty_date'],
+            'duty_start_time': other['duty_start_time'],
+            'duty_end_time': other['duty_end_time'],
+        })
+        if len(suggestions) >= limit:
+            break
+    return suggestions
@@ -0,0 +1,173 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import local_date, queue_rollups, roster_keys
+from .cache import invalidate
+from .fatigue import recompute_fatigue_logs
+from .legality import check_proposals
+from .models import DutyRoster, FlightSwapRequest, Tombstone
+from .pubsub import publish_event, swap_event
+
+# Requests the engine will execute; "approved" covers approvals made before it existed
+EXECUTABLE_STATUSES = ('pending', 'approved')
+# Fields exchanged between two rosters of the same day, which keep their crew member
+DUTY_FIELDS = ('flight_id', 'duty_type', 'duty_start_time', 'duty_end_time')
+
+
+def as_proposal(roster, crew_member_id):
+    return {
+        'crew_member': crew_member_id,
+        'flight': roster.flight_id,
+        'duty_date': roster.duty_date,
+        'duty_type': roster.duty_type,
+        'duty_start_time': roster.duty_start_time,
+        'duty_end_time': roster.duty_end_time,
+        'position': roster.position,
+    }
+
+
+def pair_rosters(swaps, rosters):
+    """Map each swap to its (requesting, target) rosters, or to a violation"""
+    by_assignment = {(roster.crew_member_id, roster.flight_id): roster for roster in rosters}
+    claimed = set()
+    pairs, violations = {}, {}
+    for swap in swaps:
+        mine = by_assignment.get((swap.requesting_crew_id, swap.requesting_flight_id))
+        theirs = by_assignment.get((swap.target_crew_id, swap.target_flight_id))
+        if mine is None or theirs is None:
+            violations[swap.id] = [{'type': 'missing_roster', 'roster': 'requesting' if mine is None else 'target'}]
+        elif mine.id in claimed or theirs.id in claimed:
+            violations[swap.id] = [{'type': 'roster_already_swapped'}]
+        elif mine.position != theirs.position:
+            violations[swap.id] = [{'type': 'position_mismatch', 'positions': [mine.position, theirs.position]}]
+        else:
+            claimed.update([mine.id, theirs.id])
+            pairs[swap.id] = (mine, theirs)
+    return pairs, violations
+
+
+def check_pairs(swaps, pairs, violations):
+    """Check every exchange against each other and the rest of the roster.
+
+    The swaps are checked together, as if all were applied. A swap that fails keeps
+    its rosters, so the others are checked again against them until none fails.
+    """
+    while True:
+        checked = [swap for swap in swaps if swap.id in pairs]
+        proposals, excluded = [], []
+        for swap in checked:
+            mine, theirs = pairs[swap.id]
+            proposals.append(as_proposal(theirs, swap.requesting_crew_id))
+            proposals.append(as_proposal(mine, swap.target_crew_id))
+            excluded.extend([mine.id, theirs.id])
+
+        results = check_proposals(proposals, exclude_roster_ids=excluded)
+        failed = False
+        for position, swap in enumerate(checked):
+            found = results[2 * position]['violations'] + results[2 * position + 1]['violations']
+            if found:
+                violations[swap.id] = found
+                del pairs[swap.id]
+                failed = True
+        if not failed:
+            return
+
+
+def exchange(mine, theirs):
+    """Swap two rosters in memory; returns the (roster, previous crew member) reassignments"""
+    if mine.duty_date == theirs.duty_date:
+        # Keep each crew member's row for the day to respect the one-duty-per-day constraint
+        for field in DUTY_FIELDS:
+            mine_value, theirs_value = getattr(mine, field), getattr(theirs, field)
+            setattr(mine, field, theirs_value)
+            setattr(theirs, field, mine_value)
+        return []
+    mine.crew_member_id, theirs.crew_member_id = theirs.crew_member_id, mine.crew_member_id
+    return [(mine, theirs.crew_member_id), (theirs, mine.crew_member_id)]
+
+
+def execute_swaps(swap_ids, approved_by):
+    """Check and execute swap requests in one transaction, locking the requests and rosters.
+
+    Each legal swap exchanges the two crew members' DutyRoster assignments and is
+    marked completed; a swap with overlap, rest, fatigue or roster violations is left
+    untouched. Returns one {'swap_request', 'completed', 'violations'} per request.
+    """
+    swap_ids = list(dict.fromkeys(swap_ids))
+    with transaction.atomic():
+        swaps = list(
+            FlightSwapRequest.objects.select_for_update()
+            .filter(id__in=swap_ids).order_by('created_at', 'id')
+        )
+        found = {swap.id for swap in swaps}
+        violations = {swap_id: [{'type': 'not_found'}] for swap_id in swap_ids if swap_id not in found}
+        for swap in swaps:
+            if swap.status not in EXECUTABLE_STATUSES:
+                violations[swap.id] = [{'type': 'invalid_status', 'status': swap.status}]
+        swaps = [swap for swap in swaps if swap.id not in violations]
+
+        crew_ids = {crew_id for swap in swaps for crew_id in (swap.requesting_crew_id, swap.target_crew_id)}
+        flight_ids = {flight_id for swap in swaps for flight_id in (swap.requesting_flight_id, swap.target_flight_id)}
+        rosters = list(
+            DutyRoster.objects.select_for_update()
+            .filter(crew_member_id__in=crew_ids, flight_id__in=flight_ids).order_by('id')
+        )
+        pairs, pair_violations = pair_rosters(swaps, rosters)
+        violations.update(pair_violations)
+        if pairs:
+            check_pairs(swaps, pairs, violations)
+
+        now = timezone.now()
+        rollup_crew_days, rollup_flight_days = set(), set()
+        changed, reassigned, completed = [], [], []
+        for swap in swaps:
+            if swap.id not in pairs:
+                continue
+            mine, theirs = pairs[swap.id]
+            # Keys before the exchange, so the days the duties leave are refreshed too
+            crew_days, flight_days = roster_keys([mine, theirs])
+            rollup_crew_days.update(crew_days)
+            rollup_flight_days.update(flight_days)
+            reassigned.extend(exchange(mine, theirs))
+            changed.extend([mine, theirs])
+            swap.status, swap.approved_by, swap.updated_at = 'completed', approved_by, now
+            completed.append(swap)
+
+        for roster in changed:
+            roster.updated_at = now
+        DutyRoster.objects.bulk_update(
+            changed, ['crew_member_id', *DUTY_FIELDS, 'updated_at'], batch_size=500
+        )
+        FlightSwapRequest.objects.bulk_update(completed, ['status', 'approved_by', 'updated_at'], batch_size=500)
+        Tombstone.objects.bulk_create([
+            Tombstone(model='dutyroster', object_id=str(roster.pk), crew_member=previous)
+            for roster, previous in reassigned
+        ])
+
+        if changed:
+            # Logs up to a day earlier can still be running when a swapped duty starts
+            recompute_fatigue_logs(
+                {roster.crew_member_id for roster in changed},
+                since=min(roster.duty_start_time for roster in changed) - timedelta(days=1)
+            )
+        for swap in completed:
+            publish_event([swap.requesting_crew_id, swap.target_crew_id], 'swap_decision', swap_event(swap))
+            day = local_date(swap.created_at)
+            rollup_crew_days.add((swap.requesting_crew_id, day))
+            rollup_flight_days.add((swap.requesting_flight_id, day))
+        crew_days, flight_days = roster_keys(changed)
+        queue_rollups(rollup_crew_days | crew_days, rollup_flight_days | flight_days)
+
+    if changed:
+        invalidate(DutyRoster)
+    completed_ids = {swap.id for swap in completed}
+    return [
+        {
+            'swap_request': swap_id,
+            'completed': swap_id in completed_ids,
+            'violations': violations.get(swap_id, []),
+        }
+        for swap_id in swap_ids
+    ]
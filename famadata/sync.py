@@ -0,0 +1,184 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Alert, AlertRecipient, DutyRoster, Flight, FlightSwapRequest, Tombstone
+from .serializers import (
+    AlertRecipientSerializer, AlertSerializer, DutyRosterSerializer,
+    FlightSerializer, FlightSwapRequestSerializer
+)
+
+TOKEN_SALT = 'famadata.sync'
+# Rows committed up to this long after a sync started are still sent by the next one
+SYNC_OVERLAP = timedelta(seconds=30)
+# Tombstones older than this are pruned; older tokens get a full sync
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Synced model -> (response key, serializer)
+SYNC_MODELS = {
+    DutyRoster: ('duty_rosters', DutyRosterSerializer),
+    Flight: ('flights', FlightSerializer),
+    Alert: ('alerts', AlertSerializer),
+    AlertRecipient: ('alert_recipients', AlertRecipientSerializer),
+    FlightSwapRequest: ('swap_requests', FlightSwapRequestSerializer),
+}
+
+
+class InvalidSyncToken(Exception):
+    pass
+
+
+def page_size():
+    """Rows of each model sent per sync response"""
+    return getattr(settings, 'SYNC_PAGE_SIZE', 500)
+
+
+def make_token(crew_member_id, synced_at, resume=None):
+    payload = {'c': str(crew_member_id), 't': synced_at.isoformat()}
+    if resume is not None:
+        payload['p'] = resume
+    return signing.dumps(payload, salt=TOKEN_SALT)
+
+
+def read_token(token, crew_member_id):
+    """Return the time of the sync that issued `token` to `crew_member_id` and,
+    if that sync has more pages, its paging state
+    """
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+        synced_at = parse_datetime(payload['t'])
+        resume = payload.get('p')
+        if resume is not None and not isinstance(resume['k'], dict):
+            raise TypeError
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidSyncToken('Invalid sync token')
+    if synced_at is None or payload.get('c') != str(crew_member_id):
+        raise InvalidSyncToken('Invalid sync token')
+    return synced_at, resume
+
+
+def tombstones_for(instance):
+    """Tombstones to write when `instance` is deleted, one per crew member it concerned"""
+    model = instance._meta.model_name
+    if isinstance(instance, DutyRoster):
+        crew_ids = [instance.crew_member_id]
+    elif isinstance(instance, AlertRecipient):
+        crew_ids = [instance.recipient_id]
+    elif isinstance(instance, FlightSwapRequest):
+        crew_ids = {instance.requesting_crew_id, instance.target_crew_id}
+    else:
+        # Flights and alerts are shared; their deletion is sent to every client
+        crew_ids = [None]
+    return [Tombstone(model=model, object_id=str(instance.pk), crew_member=crew_id) for crew_id in crew_ids]
+
+
+def changed_rows(crew_member_id, since=None):
+    """Querysets of the rows relevant to a crew member changed after `since` (all if None)"""
+    changed = Q(updated_at__gt=since) if since else Q()
+    rosters = DutyRoster.objects.filter(changed, crew_member_id=crew_member_id)
+    recipients = AlertRecipient.objects.filter(changed, recipient_id=crew_member_id)
+
+    flights = Flight.objects.filter(
+        id__in=DutyRoster.objects.filter(crew_member_id=crew_member_id).values('flight_id')
+    )
+    alerts = Alert.objects.filter(
+        id__in=AlertRecipient.objects.filter(recipient_id=crew_member_id).values('alert_id')
+    ).prefetch_related('recipients')
+    if since:
+        # A newly assigned roster or alert brings its unchanged flight or alert along
+        flights = flights.filter(Q(updated_at__gt=since) | Q(id__in=rosters.values('flight_id')))
+        alerts = alerts.filter(Q(updated_at__gt=since) | Q(id__in=recipients.values('alert_id')))
+
+    swaps = FlightSwapRequest.objects.filter(
+        changed, Q(requesting_crew_id=crew_member_id) | Q(target_crew_id=crew_member_id)
+    )
+    return {
+        DutyRoster: rosters,
+        Flight: flights,
+        Alert: alerts,
+        AlertRecipient: recipients,
+        FlightSwapRequest: swaps,
+    }
+
+
+def deleted_rows(crew_member_id, since):
+    names = {model._meta.model_name: key for model, (key, _) in SYNC_MODELS.items()}
+    deleted = defaultdict(set)
+    tombstones = Tombstone.objects.filter(
+        Q(crew_member=crew_member_id) | Q(crew_member__isnull=True), deleted_at__gt=since
+    ).values_list('model', 'object_id')
+    for model, object_id in tombstones:
+        if model in names:
+            deleted[names[model]].add(object_id)
+    return {key: sorted(deleted[key]) for key, _ in SYNC_MODELS.values()}
+
+
+def build_delta(crew_member_id, token=None):
+    """Rows a crew member's device must create, update or delete since `token`.
+
+    Without a token, or with one older than the tombstone retention, every relevant
+    row is returned with `full` set and the client replaces its local copy. Each
+    model sends at most `SYNC_PAGE_SIZE` rows per response, oldest change first;
+    while `more` is set the returned token fetches the next page, and the client
+    applies the pages (replacing its copy once the last one of a full sync has
+    arrived). The token returned with the last page is passed back on the next sync.
+    """
+    started = timezone.now()
+    synced_at, resume = read_token(token, crew_member_id) if token else (None, None)
+    if resume is not None:
+        # Next page of an unfinished sync: keep its start time and window
+        started = synced_at
+        since = parse_datetime(resume['s']) if resume.get('s') else None
+        cursors = resume['k']
+    else:
+        since = synced_at - SYNC_OVERLAP if synced_at else None
+        cursors = None
+    full = since is None or since < started - TOMBSTONE_RETENTION
+    if full:
+        since = None
+
+    limit = page_size()
+    context = {'expand': set()}
+    changed, remaining = {}, {}
+    for model, queryset in changed_rows(crew_member_id, since).items():
+        key, serializer = SYNC_MODELS[model]
+        if cursors is not None and key not in cursors:
+            # Every row of this model went out on an earlier page
+            changed[key] = []
+            continue
+        cursor = cursors[key] if cursors is not None else None
+        if cursor:
+            updated_at = parse_datetime(cursor[0])
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=cursor[1]))
+        rows = list(queryset.order_by('updated_at', 'pk')[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            remaining[key] = [rows[-1].updated_at.isoformat(), str(rows[-1].pk)]
+        changed[key] = serializer(rows, many=True, context=context).data
+
+    # Tombstones are only ids; they all go out with the first page
+    deleted = {} if full or resume is not None else deleted_rows(crew_member_id, since)
+    if remaining:
+        resume = {'s': since.isoformat() if since else None, 'k': remaining}
+        token = make_token(crew_member_id, started, resume)
+    else:
+        token = make_token(crew_member_id, started)
+    return {
+        'token': token,
+        'full': full,
+        'more': bool(remaining),
+        'changed': changed,
+        'deleted': deleted,
+    }
+
+
+def prune_tombstones(before=None):
+    """Delete tombstones no sync token can still ask for"""
+    before = before or timezone.now() - TOMBSTONE_RETENTION
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=before).delete()
+    return deleted
@@ -1,3 +1,1522 @@
-from django.test import TestCase
+import asyncio
+import io
+import itertools
+import json
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest.mock import Mock, PropertyMock, patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connection, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from airline_backend.asgi import application
+from alerts import transports
+from alerts.utils import send_bulk_sms
+
+from .analytics import activity, key_runs, process_rollups
+from .fatigue import CrewTimeline, DutyInterval, overlapping_log
+from .flight_changes import encode, flush_flight_changes, record_flight_change
+from .models import (
+    CustomUser, CrewProfile, Flight, DutyRoster,
+    FatigueLog, FlightSwapRequest, Alert, Tombstone, CrewDailyRollup, AlertRecipient, OutboundSMS,
+    PendingFlightChange, PendingRollup, AirportDailyRollup
+)
+from .pubsub import reset_broker
+from .sms_queue import BACKOFF_BASE, enqueue_alert_sms, process_batch
+from .swap_index import get_swap_index, suggest_swaps
+
+
+# (path, query params) for every list endpoint whose queries must be index-driven.
+# Whole-table groupings (by_status, by_position, by_severity) are checked in their
+# ?counts= form, which is the only shape that does not read every row by design.
+INDEXED_ENDPOINTS = [
+    ('/api/v1/users/', {}),
+    ('/api/v1/crew-profiles/', {}),
+    ('/api/v1/crew-profiles/by_position/', {'counts': 'true'}),
+    ('/api/v1/flights/', {}),
+    ('/api/v1/flights/today/', {}),
+    ('/api/v1/flights/by_status/', {'counts': 'true'}),
+    ('/api/v1/duty-rosters/', {}),
+    ('/api/v1/duty-rosters/by_crew_member/', {'crew_member_id': '{crew_member}'}),
+    ('/api/v1/duty-rosters/weekly_schedule/', {'start_date': '2025-06-01'}),
+    ('/api/v1/duty-rosters/conflicts/', {'crew_member': '{crew_member}'}),
+    ('/api/v1/fatigue-logs/', {}),
+    ('/api/v1/fatigue-logs/fatigue_alerts/', {}),
+    ('/api/v1/fatigue-logs/crew_status/', {}),
+    ('/api/v1/swap-requests/', {}),
+    ('/api/v1/swap-requests/pending_requests/', {}),
+    ('/api/v1/alerts/', {}),
+    ('/api/v1/alerts/active_alerts/', {}),
+    ('/api/v1/alerts/by_severity/', {'counts': 'true'}),
+    ('/api/v1/alert-recipients/', {}),
+    ('/api/v1/alert-recipients/my_alerts/', {}),
+    ('/api/v1/alert-recipients/unread_count/', {}),
+]
+
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (famadata_\w+)(?:\s+AS \w+)?\s*$')
+
+
+class QueryPlanTests(TestCase):
+    """Fail when an endpoint query falls back to a full table scan.
+
+    Every query an endpoint runs against famadata tables is captured and EXPLAINed.
+    On SQLite a bare "SCAN <table>" (no index) fails; on PostgreSQL sequential scans are
+    disabled for the plan so any "Seq Scan" means no usable index exists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = CustomUser.objects.create_user(
+            'operator', '+256700000000', 'secret', user_type='operator', is_staff=True
+        )
+        cls.crew_member = CustomUser.objects.create_user(
+            'pilot', '+256700000001', 'secret', user_type='pilot'
+        )
+        CrewProfile.objects.create(
+            user=cls.crew_member, position='captain', seniority=5,
+            training_level='advanced', preferred_haul='short'
+        )
+        departure = timezone.now()
+        flight = Flight.objects.create(
+            flight_number='FM100', departure_airport='EBB', arrival_airport='NBO',
+            scheduled_departure=departure, scheduled_arrival=departure + timedelta(hours=1),
+            aircraft_type='B737', haul_type='short'
+        )
+        DutyRoster.objects.create(
+            crew_member=cls.crew_member, flight=flight, duty_date=departure.date(),
+            duty_type='active', duty_start_time=departure - timedelta(hours=1),
+            duty_end_time=departure + timedelta(hours=2), position='captain',
+            created_by=cls.operator
+        )
+        FatigueLog.objects.create(crew_member=cls.crew_member, duty_start=departure, fatigue_level='orange')
+        FlightSwapRequest.objects.create(
+            requesting_crew=cls.crew_member, target_crew=cls.operator,
+            requesting_flight=flight, target_flight=flight, reason='Family event'
+        )
+        Alert.objects.create(
+            alert_type='gate', severity='high', title='Gate change', message='Now B4',
+            flight=flight, created_by=cls.operator
+        )
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No query plan rules for {connection.vendor}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.crew_member)
+
+    def captured_queries(self, path, params):
+        params = {
+            key: value.format(crew_member=self.crew_member.id)
+            for key, value in params.items()
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT') and 'famadata_' in query['sql']
+        ]
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                details = [row[-1] for row in cursor.fetchall()]
+                return [line for line in details if SQLITE_FULL_SCAN.search(line)]
+
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            details = [row[0] for row in cursor.fetchall()]
+            return [line.strip() for line in details if 'Seq Scan on famadata_' in line]
+
+    def test_endpoints_use_indexes(self):
+        for path, params in INDEXED_ENDPOINTS:
+            for sql in self.captured_queries(path, params):
+                with self.subTest(path=path, sql=sql):
+                    self.assertEqual(self.full_scans(sql), [])
+
+
+def local_time(day, hour, minute=0):
+    return timezone.make_aware(datetime(day.year, day.month, day.day, hour, minute))
+
+
+class RosterFixtures:
+    """Crew, flights and rosters for behaviour tests; users get no password to stay fast"""
+    phone_numbers = itertools.count(256710000000)
+
+    @classmethod
+    def make_operator(cls):
+        return CustomUser.objects.create_user('operator', '+256700000000', None, user_type='operator', is_staff=True)
+
+    @classmethod
+    def make_crew(cls, name, position='captain', seniority=1, **profile):
+        user = CustomUser.objects.create_user(name, f'+{next(cls.phone_numbers)}', None, user_type='pilot')
+        profile.setdefault('preferred_haul', 'both')
+        CrewProfile.objects.create(
+            user=user, position=position, seniority=seniority, training_level='basic', **profile
+        )
+        return user
+
+    @classmethod
+    def make_flight(cls, number, departure, hours=2, **fields):
+        fields.setdefault('haul_type', 'short')
+        return Flight.objects.create(
+            flight_number=number, departure_airport='EBB', arrival_airport='NBO',
+            scheduled_departure=departure, scheduled_arrival=departure + timedelta(hours=hours),
+            aircraft_type='B737', **fields
+        )
+
+    @classmethod
+    def make_roster(cls, crew_member, start, end, flight=None, duty_type='active', position='captain'):
+        return DutyRoster.objects.create(
+            crew_member=crew_member, flight=flight, duty_date=timezone.localdate(start),
+            duty_type=duty_type, duty_start_time=start, duty_end_time=end, position=position,
+            created_by=cls.operator
+        )
+
+
+class SwapLegalityTests(RosterFixtures, TestCase):
+    """Swapped duties are checked without the rosters the crew members give away"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.first = cls.make_crew('first')
+        cls.second = cls.make_crew('second')
+        cls.day = timezone.localdate() + timedelta(days=3)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def long_duty(self, crew_member, number, hour):
+        # 11 of the 13 duty hours allowed in 24h: taking a second one would breach it
+        flight = self.make_flight(number, local_time(self.day, hour + 1), hours=8)
+        return self.make_roster(crew_member, local_time(self.day, hour), local_time(self.day, hour + 11), flight)
+
+    def test_swap_near_the_limit_is_approved(self):
+        mine = self.long_duty(self.first, 'FM200', 6)
+        theirs = self.long_duty(self.second, 'FM201', 7)
+        swap = FlightSwapRequest.objects.create(
+            requesting_crew=self.first, target_crew=self.second,
+            requesting_flight=mine.flight, target_flight=theirs.flight, reason='Medical appointment'
+        )
+
+        response = self.client.patch(f'/api/v1/swap-requests/{swap.id}/approve/')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(DutyRoster.objects.get(crew_member=self.first).flight_id, theirs.flight_id)
+        self.assertEqual(DutyRoster.objects.get(crew_member=self.second).flight_id, mine.flight_id)
+
+    def test_no_suggestions_for_crew_who_do_not_swap(self):
+        # Committing the writes bumps their generations, so no earlier shared index is reused
+        with self.captureOnCommitCallbacks(execute=True):
+            locked = self.make_crew('locked', allow_swapping=False)
+            flight = self.make_flight('FM203', local_time(self.day, 7))
+            mine = self.make_roster(locked, local_time(self.day, 6), local_time(self.day, 10), flight)
+            flight = self.make_flight('FM204', local_time(self.day, 9))
+            self.make_roster(self.second, local_time(self.day, 8), local_time(self.day, 12), flight)
+
+        self.assertEqual(suggest_swaps(mine), [])
+
+    def test_new_fatigue_log_rebuilds_the_shared_index(self):
+        index = get_swap_index(self.day, self.day)
+        self.assertIs(get_swap_index(self.day, self.day), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            FatigueLog.objects.create(
+                crew_member=self.second, duty_start=local_time(self.day, 1), duty_end=local_time(self.day, 5),
+                rest_required_until=local_time(self.day, 17)
+            )
+
+        self.assertIsNot(get_swap_index(self.day, self.day), index)
+
+    def test_proposal_breaching_limits_is_rejected(self):
+        from .legality import check_proposals
+
+        self.long_duty(self.first, 'FM202', 6)
+        proposal = {
+            'crew_member': self.first.id, 'flight': None, 'duty_date': self.day + timedelta(days=1),
+            'duty_type': 'active', 'duty_start_time': local_time(self.day, 18),
+            'duty_end_time': local_time(self.day, 23), 'position': 'captain',
+        }
+
+        [result] = check_proposals([proposal])
+
+        self.assertFalse(result['legal'])
+        self.assertIn('fatigue_limit', {violation['type'] for violation in result['violations']})
+
+
+class ConflictTests(RosterFixtures, TestCase):
+    """Overlapping duties are reported per crew member, across midnight too"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.day = timezone.localdate() + timedelta(days=1)
+        cls.next_day = cls.day + timedelta(days=1)
+        cls.first = cls.make_crew('first')
+        cls.second = cls.make_crew('second')
+        for crew_member in (cls.first, cls.second):
+            cls.make_roster(crew_member, local_time(cls.day, 20), local_time(cls.next_day, 2))
+            cls.make_roster(crew_member, local_time(cls.next_day, 1), local_time(cls.next_day, 5))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def test_overlap_across_midnight_is_reported(self):
+        response = self.client.get('/api/v1/duty-rosters/conflicts/', {'crew_member': str(self.first.id)})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        [conflict] = response.data
+        self.assertEqual(conflict['crew_member_id'], self.first.id)
+        self.assertTrue(conflict['cross_day'])
+        self.assertEqual(conflict['overlap_start'], local_time(self.next_day, 1))
+        self.assertEqual(conflict['overlap_end'], local_time(self.next_day, 2))
+
+    def test_repeated_crew_members_are_all_checked(self):
+        response = self.client.get(
+            f'/api/v1/duty-rosters/conflicts/?crew_member={self.first.id}&crew_member={self.second.id}'
+        )
+
+        self.assertEqual({conflict['crew_member_id'] for conflict in response.data}, {self.first.id, self.second.id})
+
+    def test_malformed_crew_member_is_rejected(self):
+        response = self.client.get('/api/v1/duty-rosters/conflicts/', {'crew_member': 'bad'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('crew_member', response.data)
+
+
+class RosterGeneratorTests(RosterFixtures, TestCase):
+    """Generated rosters pass the same legality checks as hand-made ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.day = timezone.localdate() + timedelta(days=3)
+
+    def generate(self, start_date, end_date, requirements):
+        from .roster_generator import RosterGenerator
+
+        generator = RosterGenerator(self.operator, requirements=requirements, dry_run=True)
+        return generator, generator.run(start_date, end_date)
+
+    def proposals(self, rosters):
+        return [
+            {
+                'crew_member': roster.crew_member_id, 'flight': roster.flight_id, 'duty_date': roster.duty_date,
+                'duty_type': roster.duty_type, 'duty_start_time': roster.duty_start_time,
+                'duty_end_time': roster.duty_end_time, 'position': roster.position,
+            }
+            for roster in rosters
+        ]
+
+    def test_generated_rosters_are_legal(self):
+        from .legality import check_proposals
+
+        for index in range(4):
+            self.make_crew(f'captain{index}', seniority=index)
+        for offset in range(3):
+            for hour in (6, 11, 16, 21):
+                self.make_flight(f'FM8{offset}{hour}', local_time(self.day + timedelta(days=offset), hour), hours=3)
+
+        generator, summary = self.generate(self.day, self.day + timedelta(days=2), {'short': {'captain': 1}})
+
+        self.assertEqual(summary['active'] + len(summary['unfilled']), 12)
+        self.assertGreater(summary['active'], 0)
+        results = check_proposals(self.proposals(generator.rosters))
+        self.assertEqual([result for result in results if not result['legal']], [])
+
+    def test_long_reserve_block_is_seen_past_later_duties(self):
+        from .roster_generator import CrewPlan
+
+        plan = CrewPlan({}, CrewTimeline(), self.day)
+        block_end = self.day + timedelta(days=4)
+        plan.add(self.day, 'reserve', local_time(self.day, 6), local_time(block_end, 6), planned=False)
+        for offset in range(1, 4):
+            day = self.day + timedelta(days=offset)
+            plan.add(day, 'off', local_time(day, 0), local_time(day + timedelta(days=1), 0), planned=False)
+
+        self.assertFalse(plan.is_free(block_end, local_time(block_end, 1), local_time(block_end, 4), active=True))
+        self.assertTrue(plan.is_free(block_end, local_time(block_end, 7), local_time(block_end, 10), active=True))
+
+
+class ConditionalGetTests(RosterFixtures, TestCase):
+    """ETags change with expanded related rows and with deletions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('captain')
+        departure = local_time(timezone.localdate() + timedelta(days=2), 9)
+        cls.flight = cls.make_flight('FM300', departure)
+        cls.roster = cls.make_roster(
+            cls.crew_member, departure - timedelta(hours=1), departure + timedelta(hours=3), cls.flight
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def revalidate(self, path, etag):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_collection_is_not_modified(self):
+        first = self.client.get('/api/v1/flights/')
+        self.assertFalse(first.has_header('Last-Modified'))
+        self.assertEqual(self.revalidate('/api/v1/flights/', first['ETag']).status_code, 304)
+
+    def test_expanded_rows_change_the_etag(self):
+        path = '/api/v1/flights/?expand=crew_assignments'
+        first = self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.roster.duty_end_time += timedelta(hours=1)
+            self.roster.save()
+        self.assertEqual(self.revalidate(path, first['ETag']).status_code, 200)
+
+    def test_deleted_row_changes_the_etag(self):
+        self.make_flight('FM301', self.flight.scheduled_departure)
+        first = self.client.get('/api/v1/flights/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Flight.objects.filter(flight_number='FM301').delete()
+        self.assertEqual(self.revalidate('/api/v1/flights/', first['ETag']).status_code, 200)
+
+
+class ResponseCacheTests(RosterFixtures, TestCase):
+    """Cached responses expire when the rows behind them commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.flight = cls.make_flight('FM400', local_time(timezone.localdate(), 12))
+
+    def setUp(self):
+        from .cache import response_cache
+
+        response_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def test_generation_moves_on_commit(self):
+        from .cache import get_generations
+
+        before = get_generations([Flight])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.flight.gate = 'A1'
+            self.flight.save()
+            self.assertEqual(get_generations([Flight]), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generations([Flight]), before)
+
+    def test_cached_response_expires_after_write(self):
+        first = self.client.get('/api/v1/flights/today/')
+        self.assertEqual(first.data['results'][0]['gate'], self.flight.gate)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight.gate = 'B7'
+            self.flight.save()
+        second = self.client.get('/api/v1/flights/today/')
+        self.assertEqual(second.data['results'][0]['gate'], 'B7')
+
+
+class AvailabilityTests(RosterFixtures, TestCase):
+    """Available crew come from the index and are confirmed against the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.day = timezone.localdate() + timedelta(days=2)
+        cls.flight = cls.make_flight('FM500', local_time(cls.day, 12))
+        cls.start, cls.end = local_time(cls.day, 11), local_time(cls.day, 14, 30)
+        cls.on_standby = cls.make_crew('standby', seniority=9)
+        cls.slot = cls.make_roster(
+            cls.on_standby, local_time(cls.day, 8), local_time(cls.day, 20), duty_type='standby'
+        )
+        cls.free = cls.make_crew('free', seniority=5)
+
+    def setUp(self):
+        from . import availability
+
+        availability._index = None
+
+    def available(self):
+        from .availability import available_crew
+
+        return {
+            row['username']: row['source']
+            for row in available_crew('captain', self.start, self.end, 'short', flight=self.flight)
+        }
+
+    def test_standby_and_free_crew_are_offered(self):
+        self.assertEqual(self.available(), {'standby': 'standby', 'free': 'free'})
+
+    def test_long_earlier_duty_blocks_the_crew_member(self):
+        from .availability import get_availability_index
+
+        blocked = self.make_crew('blocked', seniority=7)
+        self.make_roster(
+            blocked, local_time(self.day - timedelta(days=1), 6), local_time(self.day + timedelta(days=1), 6),
+            duty_type='reserve'
+        )
+        # Later short duties push the long one out of reach of a fixed-size neighbourhood
+        for hour in (1, 2, 3):
+            DutyRoster.objects.create(
+                crew_member=blocked, duty_date=self.day + timedelta(days=10 + hour), duty_type='off',
+                duty_start_time=local_time(self.day, hour), duty_end_time=local_time(self.day, hour, 30),
+                position='captain', created_by=self.operator
+            )
+
+        index = get_availability_index(self.day, self.day)
+        found = {profile['user__username'] for profile, _, _ in index.candidates('captain', 'short', self.start, self.end)}
+
+        self.assertNotIn('blocked', found)
+        self.assertIn('standby', found)
+
+    def test_impossible_datetime_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.operator)
+
+        response = client.get('/api/v1/crew-profiles/available/', {
+            'position': 'captain', 'start': '2025-13-45T00:00', 'end': '2025-13-45T04:00', 'haul_type': 'short'
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_write_missed_by_the_index_is_caught(self):
+        self.available()
+        # As if another process had rostered them: no signals, no invalidation
+        DutyRoster.objects.filter(pk=self.slot.pk).update(
+            duty_type='active', duty_start_time=local_time(self.day, 10), duty_end_time=local_time(self.day, 12)
+        )
+        self.assertEqual(self.available(), {'free': 'free'})
+
+
+class DisruptionTests(RosterFixtures, TestCase):
+    """Re-rostering plans for delayed and cancelled flights, and applying them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.day = timezone.localdate() + timedelta(days=2)
+        cls.next_day = cls.day + timedelta(days=1)
+        cls.captain = cls.make_crew('captain', seniority=3)
+        cls.reserve = cls.make_crew('reserve', seniority=8)
+        cls.delayed = cls.make_flight('FM600', local_time(cls.day, 14), hours=3)
+        cls.morning = cls.make_flight('FM601', local_time(cls.next_day, 7))
+        cls.delayed_duty = cls.make_roster(
+            cls.captain, local_time(cls.day, 13), local_time(cls.day, 17, 30), cls.delayed
+        )
+        cls.morning_duty = cls.make_roster(
+            cls.captain, local_time(cls.next_day, 6), local_time(cls.next_day, 9, 30), cls.morning
+        )
+        cls.reserve_slot = cls.make_roster(
+            cls.reserve, local_time(cls.next_day, 4), local_time(cls.next_day, 14), duty_type='reserve'
+        )
+
+    def setUp(self):
+        from . import availability
+
+        availability._index = None
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def delay(self, flight, minutes):
+        response = self.client.patch(
+            f'/api/v1/flights/{flight.id}/update_status/', {'status': 'delayed', 'delay_minutes': minutes},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['disruption']
+
+    def apply(self, plan):
+        return self.client.post('/api/v1/flights/apply_disruption/', {'plan': plan['plan']}, format='json')
+
+    def test_delay_hands_next_duty_to_reserve_crew(self):
+        plan = self.delay(self.delayed, 300)
+        actions = {change['roster']: change for change in plan['changes']}
+
+        self.assertEqual(actions[self.delayed_duty.id]['action'], 'retime')
+        self.assertEqual(actions[self.morning_duty.id]['action'], 'reassign')
+        self.assertEqual(actions[self.morning_duty.id]['replacement']['crew_member'], self.reserve.id)
+        self.assertEqual(plan['unfilled'], 0)
+
+        response = self.apply(plan)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['reassigned'], 1)
+        self.delayed_duty.refresh_from_db()
+        self.assertEqual(self.delayed_duty.duty_end_time, local_time(self.day, 22, 30))
+        self.assertEqual(DutyRoster.objects.get(pk=self.morning_duty.pk).crew_member_id, self.reserve.id)
+        self.assertFalse(DutyRoster.objects.filter(pk=self.reserve_slot.pk).exists())
+        self.assertTrue(Tombstone.objects.filter(object_id=str(self.reserve_slot.pk)).exists())
+
+    def test_stale_plan_is_rejected(self):
+        plan = self.delay(self.delayed, 300)
+        self.assertEqual(self.apply(plan).status_code, 200)
+
+        response = self.apply(plan)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(str(self.delayed_duty.id), response.data['rosters'])
+
+    def test_second_delayed_duty_of_the_same_crew_member_is_checked(self):
+        evening = self.make_flight('FM602', local_time(self.day, 20), hours=1)
+        evening_duty = DutyRoster.objects.create(
+            crew_member=self.captain, flight=evening, duty_date=self.day + timedelta(days=20),
+            duty_type='active', duty_start_time=local_time(self.day, 19),
+            duty_end_time=local_time(self.day, 21, 30), position='captain', created_by=self.operator
+        )
+        from .disruptions import plan_disruption
+
+        Flight.objects.filter(pk__in=[self.delayed.pk, evening.pk]).update(status='delayed')
+        plan = plan_disruption(
+            [self.delayed.id, evening.id],
+            delays={self.delayed.id: timedelta(hours=3), evening.id: timedelta(minutes=30)}
+        )
+        actions = {change['roster']: change for change in plan['changes']}
+
+        self.assertEqual(actions[self.delayed_duty.id]['action'], 'retime')
+        self.assertEqual(actions[evening_duty.id]['action'], 'reassign')
+        self.assertEqual(actions[evening_duty.id]['new_duty_end_time'], local_time(self.day, 22))
+
+    def test_cancelled_flight_releases_crew_to_standby(self):
+        response = self.client.patch(
+            f'/api/v1/flights/{self.delayed.id}/update_status/', {'status': 'cancelled'}, format='json'
+        )
+        plan = response.data['disruption']
+        self.assertEqual([change['action'] for change in plan['changes']], ['release'])
+
+        self.assertEqual(self.apply(plan).status_code, 200)
+        self.delayed_duty.refresh_from_db()
+        self.assertEqual((self.delayed_duty.duty_type, self.delayed_duty.flight_id), ('standby', None))
+
+    def test_accepting_only_a_drop_refreshes_rollups_and_fatigue(self):
+        officer = self.make_crew('officer', position='first_officer')
+        DutyRoster.objects.create(
+            crew_member=officer, flight=self.delayed, duty_date=self.day, duty_type='active',
+            duty_start_time=local_time(self.day, 13), duty_end_time=local_time(self.day, 17, 30),
+            position='first_officer', created_by=self.operator
+        )
+        office = self.make_roster(
+            officer, local_time(self.next_day, 0), local_time(self.next_day, 4), position='first_officer'
+        )
+        log = FatigueLog.objects.create(
+            crew_member=officer, duty_start=local_time(self.next_day, 10),
+            duty_end=local_time(self.next_day, 12), fatigue_level='red'
+        )
+        process_rollups()
+        self.assertEqual(CrewDailyRollup.objects.get(crew_member=officer, date=self.next_day).duties, 1)
+        plan = self.delay(self.delayed, 480)
+        self.assertEqual({change['roster']: change['action'] for change in plan['changes']}[office.id], 'drop')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/v1/flights/apply_disruption/', {'plan': plan['plan'], 'accept': [str(office.id)]},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['dropped'], 1)
+        process_rollups()
+        self.assertFalse(CrewDailyRollup.objects.filter(crew_member=officer, date=self.next_day).exists())
+        log.refresh_from_db()
+        self.assertEqual(log.fatigue_level, 'green')
+        self.assertEqual(log.total_duty_hours, 2)
+
+    def test_negative_delay_is_rejected(self):
+        response = self.client.patch(
+            f'/api/v1/flights/{self.delayed.id}/update_status/', {'status': 'delayed', 'delay_minutes': -30},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_raw_delete_mirrors_every_receiver(self):
+        from django.db.models.signals import post_delete
+
+        receivers = {receiver.__name__ for receiver in post_delete._live_receivers(DutyRoster)[0]}
+        self.assertEqual(
+            receivers,
+            {'drop_availability', 'invalidate_cached_responses', 'queue_roster_rollups', 'record_tombstones'}
+        )
+
+
+class FatigueRecomputeTests(RosterFixtures, TestCase):
+    """Recomputing fatigue logs is validated and scoped to the crew members asked for"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.first = cls.make_crew('first')
+        cls.second = cls.make_crew('second')
+        day = timezone.localdate() - timedelta(days=2)
+        cls.logs = [
+            FatigueLog.objects.create(
+                crew_member=crew_member, duty_start=local_time(day, 6), duty_end=local_time(day, 10)
+            )
+            for crew_member in (cls.first, cls.second)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def recompute(self, user, data):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/v1/fatigue-logs/recompute/', data, format='json')
+
+    def test_only_the_given_crew_members_are_recomputed(self):
+        response = self.recompute(self.first, {'crew_members': [str(self.first.id)]})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'updated': 1})
+        first, second = [FatigueLog.objects.get(pk=log.pk) for log in self.logs]
+        self.assertEqual(first.total_duty_hours, 4)
+        self.assertIsNotNone(first.rest_required_until)
+        self.assertEqual(second.total_duty_hours, 0)
+
+    def test_invalid_crew_member_id_is_rejected(self):
+        response = self.recompute(self.first, {'crew_members': ['not-a-uuid']})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('crew_members', response.data)
+
+    def test_unfiltered_recompute_is_for_operators(self):
+        self.assertEqual(self.recompute(self.first, {}).status_code, 403)
+
+        response = self.recompute(self.operator, {})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'updated': 2})
+
+
+class CrewTimelineTests(SimpleTestCase):
+    """Window totals and log matching stay exact when intervals overlap or nest"""
+
+    def at(self, hours):
+        return datetime(2025, 6, 1, tzinfo=dt_timezone.utc) + timedelta(hours=hours)
+
+    def interval(self, start, end, flight_hours=0.0, **kwargs):
+        return DutyInterval(self.at(start), self.at(end), flight_hours, **kwargs)
+
+    def test_nested_interval_before_the_window_is_left_out(self):
+        timeline = CrewTimeline([self.interval(0, 20, 10), self.interval(1, 2, 1), self.interval(3, 4, 1)])
+
+        duty, flight = timeline.hours_in_window(self.at(10), self.at(22))
+
+        self.assertAlmostEqual(duty, 10)
+        self.assertAlmostEqual(flight, 5)
+
+    def test_long_interval_running_past_the_window_is_clipped(self):
+        timeline = CrewTimeline([self.interval(start, end) for start, end in [(5, 6), (8, 30), (9, 10), (11, 12)]])
+
+        self.assertAlmostEqual(timeline.hours_in_window(self.at(4), self.at(12))[0], 7)
+
+    def test_matches_clipping_every_interval(self):
+        intervals = [self.interval(start, start + length) for start, length in [
+            (0, 30), (2, 1), (5, 12), (6, 2), (11, 1), (14, 20), (15, 3), (26, 1), (40, 2),
+        ]]
+        timeline = CrewTimeline(intervals)
+        for start in range(0, 44, 3):
+            for end in range(start + 1, 46, 4):
+                expected = sum((
+                    max(min(interval.end, self.at(end)) - max(interval.start, self.at(start)), timedelta(0))
+                    for interval in intervals
+                ), timedelta(0)) / timedelta(hours=1)
+                self.assertAlmostEqual(timeline.hours_in_window(self.at(start), self.at(end))[0], expected)
+
+    def test_long_log_behind_shorter_ones_is_found(self):
+        logs = [self.interval(start, end, source='log') for start, end in [(0, 20), (1, 2), (3, 4)]]
+        starts = [log.start for log in logs]
+        reach = [self.at(20)] * 3
+
+        self.assertIs(overlapping_log(logs, starts, reach, self.at(15), self.at(16)), logs[0])
+        self.assertIsNone(overlapping_log(logs, starts, reach, self.at(21), self.at(22)))
+
+
+class RosterImportTests(RosterFixtures, TestCase):
+    """Bulk roster import rejects bad lines and duplicate days without stopping"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('importee')
+        cls.day = timezone.localdate() + timedelta(days=5)
+
+    def line(self, day, hour=8):
+        return json.dumps({
+            'crew_member': str(self.crew_member.id), 'duty_date': day.isoformat(), 'duty_type': 'standby',
+            'duty_start_time': local_time(day, hour).isoformat(),
+            'duty_end_time': local_time(day, hour + 6).isoformat(), 'position': 'captain',
+        })
+
+    def run_import(self, lines, **options):
+        from .roster_import import RosterImporter, read_jsonl
+
+        importer = RosterImporter(self.operator, chunk_size=1, **options)
+        return importer.run(read_jsonl(io.StringIO('\n'.join(lines) + '\n')))
+
+    def test_malformed_line_is_rejected_with_its_number(self):
+        result = self.run_import([self.line(self.day), '{"crew_member": ', '[1, 2]'])
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3])
+        self.assertIn('Invalid JSON', result['errors'][0]['error'])
+
+    def test_duplicate_day_in_a_later_chunk_is_rejected(self):
+        for dry_run in (False, True):
+            with self.subTest(dry_run=dry_run):
+                day = self.day + timedelta(days=10 if dry_run else 0)
+                result = self.run_import([self.line(day), self.line(day, 12)], dry_run=dry_run)
+                self.assertEqual((result['created'], result['rejected']), (1, 1))
+
+
+class MetricsTests(RosterFixtures, TestCase):
+    """Request metrics are served to staff only, whatever address they come from"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('crew')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_crew_are_refused_even_from_localhost(self):
+        self.client.force_authenticate(self.crew_member)
+
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.post('/metrics/').status_code, 403)
+
+    def test_serializer_time_is_recorded_per_endpoint(self):
+        from .metrics import registry
+
+        self.client.force_authenticate(self.operator)
+        self.client.post('/metrics/')
+        self.client.get('/api/v1/users/')
+
+        response = self.client.get('/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        endpoint = response.data['endpoints']['GET CustomUserViewSet.list']
+        self.assertEqual(endpoint['requests'], 1)
+        self.assertGreater(endpoint['avg_serializer_ms'], 0)
+        self.assertNotIn('GET MetricsView.get', registry.snapshot()['endpoints'])
+
+
+class ExportTests(RosterFixtures, TestCase):
+    """Exports are streamed chunk by chunk, asynchronously when served over ASGI"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.token = Token.objects.create(user=cls.operator)
+        crew_member = cls.make_crew('crew')
+        day = timezone.localdate()
+        for offset in range(5):
+            start = local_time(day + timedelta(days=offset), 8)
+            cls.make_roster(crew_member, start, start + timedelta(hours=4))
+
+    @patch('famadata.exports.EXPORT_CHUNK_SIZE', 2)
+    def test_wsgi_export_is_streamed_in_chunks(self):
+        client = APIClient()
+        client.force_authenticate(self.operator)
+
+        response = client.get('/api/v1/duty-rosters/export/', {'file_format': 'ndjson'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        chunks = list(response.streaming_content)
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+
+    @patch('famadata.exports.EXPORT_CHUNK_SIZE', 2)
+    async def test_asgi_export_is_streamed_asynchronously(self):
+        response = await AsyncClient().get(
+            '/api/v1/duty-rosters/export/', {'file_format': 'csv'},
+            headers={'Authorization': f'Token {self.token.key}'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).count(b'\n'), 6)
+
+
+@override_settings(SMS_TRANSPORT={'BACKEND': 'alerts.transports.InMemoryTransport'})
+class SmsQueueTests(RosterFixtures, TestCase):
+    """Queued alert SMS go out in batches through a fake gateway and are retried"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew = [cls.make_crew(f'crew{index}') for index in range(5)]
+        # Stored in national format; the gateway answers with +256...
+        CustomUser.objects.filter(pk=cls.crew[0].pk).update(phone_number='0712 345678')
+        cls.flight = cls.make_flight('FM700', local_time(timezone.localdate() + timedelta(days=1), 9))
+        cls.alert = Alert.objects.create(
+            alert_type='gate', severity='medium', title='FM700 Gate Change', message='Gate: 2 -> 5',
+            flight=cls.flight, created_by=cls.operator
+        )
+        for crew_member in cls.crew:
+            AlertRecipient.objects.create(alert=cls.alert, recipient=crew_member)
+
+    def setUp(self):
+        transports.reset_transport()
+        self.addCleanup(transports.reset_transport)
+        transports.outbox.clear()
+        enqueue_alert_sms(self.alert)
+
+    def test_messages_are_sent_in_batches(self):
+        counts = process_batch(gateway=send_bulk_sms, batch_size=2)
+
+        self.assertEqual(counts, {'sent': 5, 'retrying': 0, 'failed': 0})
+        self.assertEqual(sorted(len(sent['phone_numbers']) for sent in transports.outbox), [1, 2, 2])
+        self.assertEqual(set(AlertRecipient.objects.values_list('sms_delivery_status', flat=True)), {'sent'})
+
+    def test_gateway_number_format_is_matched(self):
+        process_batch(gateway=send_bulk_sms)
+
+        sms = OutboundSMS.objects.get(alert_recipient__recipient=self.crew[0])
+        self.assertEqual((sms.status, sms.attempts), ('sent', 1))
+        self.assertTrue(AlertRecipient.objects.get(recipient=self.crew[0]).sms_sent)
+
+    def test_failed_number_backs_off_then_fails(self):
+        failing = self.crew[1].phone_number
+        with override_settings(SMS_TRANSPORT={
+            'BACKEND': 'alerts.transports.InMemoryTransport', 'OPTIONS': {'fail_numbers': [failing]}
+        }):
+            transports.reset_transport()
+            before = timezone.now()
+            counts = process_batch(gateway=send_bulk_sms, max_attempts=2)
+
+            self.assertEqual(counts, {'sent': 4, 'retrying': 1, 'failed': 0})
+            sms = OutboundSMS.objects.get(phone_number=failing)
+            self.assertEqual((sms.status, sms.attempts, sms.last_error), ('pending', 1, 'Failed'))
+            self.assertGreaterEqual(sms.next_attempt_at, before + BACKOFF_BASE)
+            self.assertEqual(process_batch(gateway=send_bulk_sms)['sent'], 0)
+
+            OutboundSMS.objects.filter(pk=sms.pk).update(next_attempt_at=timezone.now())
+            counts = process_batch(gateway=send_bulk_sms, max_attempts=2)
+
+        self.assertEqual(counts, {'sent': 0, 'retrying': 0, 'failed': 1})
+        recipient = AlertRecipient.objects.get(recipient=self.crew[1])
+        self.assertEqual((recipient.sms_sent, recipient.sms_delivery_status), (True, 'failed'))
+
+    def test_gateway_error_retries_the_whole_batch(self):
+        with override_settings(SMS_TRANSPORT={
+            'BACKEND': 'alerts.transports.InMemoryTransport', 'OPTIONS': {'error': 'Gateway down'}
+        }):
+            transports.reset_transport()
+            counts = process_batch(gateway=send_bulk_sms)
+
+        self.assertEqual(counts, {'sent': 0, 'retrying': 5, 'failed': 0})
+        self.assertEqual(set(OutboundSMS.objects.values_list('last_error', flat=True)), {'Gateway down'})
+
+
+class FlightChangeTests(RosterFixtures, TestCase):
+    """Flight edits are coalesced into one alert per flight for its rostered crew"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('crew')
+        day = timezone.localdate() + timedelta(days=1)
+        cls.departure = local_time(day, 9)
+        cls.flight = cls.make_flight('FM900', cls.departure, gate='A1')
+        cls.make_roster(cls.crew_member, local_time(day, 8), local_time(day, 11, 30), cls.flight)
+
+    def change(self, now, **changes):
+        return record_flight_change(
+            self.flight, {name: [encode(old), encode(new)] for name, (old, new) in changes.items()},
+            changed_by=self.operator, now=now
+        )
+
+    def test_edits_inside_the_window_become_one_alert(self):
+        now = timezone.now()
+        later = self.departure + timedelta(minutes=90)
+        self.change(now, gate=('A1', 'B4'))
+        self.change(now + timedelta(seconds=30), gate=('B4', 'C2'))
+        self.change(now + timedelta(seconds=50), scheduled_departure=(self.departure, later))
+
+        self.assertEqual(flush_flight_changes(now=now + timedelta(seconds=100)), [])
+        [alert] = flush_flight_changes(now=now + timedelta(seconds=110))
+
+        self.assertEqual((alert.alert_type, alert.severity), ('departure', 'high'))
+        self.assertIn('Gate: A1 -> C2', alert.message)
+        self.assertEqual(list(alert.recipients.all()), [self.crew_member])
+        self.assertFalse(PendingFlightChange.objects.exists())
+
+    def test_change_reverted_inside_the_window_sends_nothing(self):
+        now = timezone.now()
+        self.change(now, gate=('A1', 'B4'))
+        self.assertIsNone(self.change(now + timedelta(seconds=10), gate=('B4', 'A1')))
+
+        self.assertEqual(flush_flight_changes(now=now + timedelta(minutes=10)), [])
+
+    @override_settings(FLIGHT_ALERT_DEBOUNCE=60, FLIGHT_ALERT_MAX_DELAY=120)
+    def test_max_delay_forces_a_flush(self):
+        now = timezone.now()
+        for seconds, gate in ((0, 'B1'), (50, 'B2'), (100, 'B3')):
+            self.change(now + timedelta(seconds=seconds), gate=('A1', gate))
+
+        self.assertEqual(flush_flight_changes(now=now + timedelta(seconds=119)), [])
+        [alert] = flush_flight_changes(now=now + timedelta(seconds=120))
+
+        self.assertIn('Gate: A1 -> B3', alert.message)
+
+
+class SyncTests(RosterFixtures, TestCase):
+    """Delta sync pages large syncs and reports deleted and reassigned rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('captain')
+        cls.other = cls.make_crew('relief')
+        cls.rosters = []
+        for offset in range(3):
+            day = timezone.localdate() + timedelta(days=offset + 1)
+            flight = cls.make_flight(f'FM6{offset}0', local_time(day, 9))
+            cls.rosters.append(cls.make_roster(cls.crew_member, local_time(day, 8), local_time(day, 12), flight))
+        # Rows written before the first sync are outside the next one's overlap
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        DutyRoster.objects.update(updated_at=an_hour_ago)
+        Flight.objects.update(updated_at=an_hour_ago)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def sync(self, user, token=None):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/v1/sync/', {'token': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def roster_ids(self, delta):
+        return {row['id'] for row in delta['changed']['duty_rosters']}
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_full_sync_is_paged(self):
+        first = self.sync(self.crew_member)
+        self.assertTrue(first['full'])
+        self.assertTrue(first['more'])
+        self.assertEqual(len(first['changed']['duty_rosters']), 2)
+
+        second = self.sync(self.crew_member, first['token'])
+        self.assertTrue(second['full'])
+        self.assertFalse(second['more'])
+        self.assertEqual(len(second['changed']['duty_rosters']), 1)
+        self.assertEqual(
+            self.roster_ids(first) | self.roster_ids(second), {str(roster.pk) for roster in self.rosters}
+        )
+        self.assertEqual(len(first['changed']['flights']) + len(second['changed']['flights']), 3)
+
+        # The last page's token is an ordinary delta token
+        self.assertEqual(self.roster_ids(self.sync(self.crew_member, second['token'])), set())
+
+    def test_delta_sends_changed_rows_and_tombstones(self):
+        token = self.sync(self.crew_member)['token']
+        changed, deleted, _ = self.rosters
+        changed.duty_end_time += timedelta(hours=1)
+        changed.save()
+        deleted_id = str(deleted.pk)
+        deleted.delete()
+
+        delta = self.sync(self.crew_member, token)
+        self.assertFalse(delta['full'])
+        self.assertEqual(self.roster_ids(delta), {str(changed.pk)})
+        self.assertEqual(delta['deleted']['duty_rosters'], [deleted_id])
+
+    def test_reassigned_roster_moves_between_crew_members(self):
+        token = self.sync(self.crew_member)['token']
+        other_token = self.sync(self.other)['token']
+        roster = self.rosters[0]
+        roster.crew_member = self.other
+        roster.save()
+
+        delta = self.sync(self.crew_member, token)
+        self.assertEqual(self.roster_ids(delta), set())
+        self.assertEqual(delta['deleted']['duty_rosters'], [str(roster.pk)])
+        other_delta = self.sync(self.other, other_token)
+        self.assertEqual(self.roster_ids(other_delta), {str(roster.pk)})
+        self.assertEqual(other_delta['deleted']['duty_rosters'], [])
+
+    def test_token_of_another_crew_member_is_rejected(self):
+        token = self.sync(self.crew_member)['token']
+        self.client.force_authenticate(self.other)
+        response = self.client.get('/api/v1/sync/', {'token': token})
+        self.assertEqual(response.status_code, 400)
+
+
+class RollupTests(RosterFixtures, TestCase):
+    """Writes queue their rollup keys; the worker refreshes exactly those keys"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('captain')
+        cls.other = cls.make_crew('relief')
+        cls.day = timezone.localdate() + timedelta(days=1)
+        cls.flight = cls.make_flight('FM700', local_time(cls.day, 9), hours=3)
+
+    def test_roster_write_is_refreshed_by_the_worker(self):
+        self.make_roster(self.crew_member, local_time(self.day, 8), local_time(self.day, 13), self.flight)
+        self.assertFalse(CrewDailyRollup.objects.exists())
+
+        self.assertEqual(process_rollups(), 2)
+        rollup = CrewDailyRollup.objects.get(crew_member=self.crew_member, date=self.day)
+        self.assertEqual((rollup.duties, rollup.duty_hours, rollup.flight_hours), (1, 5, 3))
+        airport = AirportDailyRollup.objects.get(airport='EBB', date=self.day)
+        self.assertEqual((airport.flights, airport.crew_members), (1, 1))
+        self.assertFalse(PendingRollup.objects.exists())
+        self.assertEqual(process_rollups(), 0)
+
+    def test_rolled_back_write_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.make_roster(self.crew_member, local_time(self.day, 8), local_time(self.day, 13), self.flight)
+            raise RuntimeError
+        self.assertFalse(PendingRollup.objects.exists())
+
+    def test_only_the_queued_days_are_read(self):
+        later = self.day + timedelta(days=5)
+        self.make_roster(self.crew_member, local_time(self.day, 8), local_time(self.day, 13), self.flight)
+        self.make_roster(self.other, local_time(later, 8), local_time(later, 13))
+        with patch('famadata.analytics.activity', wraps=activity) as read:
+            process_rollups()
+
+        crew_reads = [call.args[:2] for call in read.call_args_list if 'crew_ids' in call.kwargs]
+        self.assertEqual(sorted(crew_reads), [(self.day, self.day), (later, later)])
+        self.assertEqual(CrewDailyRollup.objects.get(crew_member=self.other, date=later).duties, 1)
+
+    def test_key_runs_cover_exactly_the_keys(self):
+        day = self.day
+        keys = {('a', day), ('b', day), ('a', day + timedelta(days=1)), ('b', day + timedelta(days=1)),
+                ('a', day + timedelta(days=2)), ('b', day + timedelta(days=4))}
+        self.assertEqual(key_runs(keys), [
+            [{'a', 'b'}, day, day + timedelta(days=1)],
+            [{'a'}, day + timedelta(days=2), day + timedelta(days=2)],
+            [{'b'}, day + timedelta(days=4), day + timedelta(days=4)],
+        ])
+
+
+class AlertSocketTests(RosterFixtures, TestCase):
+    """The ASGI WebSocket endpoint pushes committed alerts to their recipients only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.recipient = cls.make_crew('captain')
+        cls.bystander = cls.make_crew('relief')
+        cls.tokens = {user.pk: Token.objects.create(user=user) for user in (cls.recipient, cls.bystander)}
+        cls.flight = cls.make_flight('FM800', timezone.now() + timedelta(hours=6))
+
+    def setUp(self):
+        reset_broker()
+        self.addCleanup(reset_broker)
+
+    async def connect(self, user):
+        """Open a socket for `user`; returns its (inbox, outbox, task) after the greeting"""
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {
+            'type': 'websocket', 'path': '/ws/alerts/', 'headers': [],
+            'query_string': f'token={self.tokens[user.pk].key}'.encode(),
+        }
+        await inbox.put({'type': 'websocket.connect'})
+        task = asyncio.ensure_future(application(scope, inbox.get, outbox.put))
+        self.assertEqual((await asyncio.wait_for(outbox.get(), 5))['type'], 'websocket.accept')
+        greeting = json.loads((await asyncio.wait_for(outbox.get(), 5))['text'])
+        self.assertEqual(greeting['event'], 'unread_count')
+        return inbox, outbox, task
+
+    def create_alert(self):
+        """Create an alert for the recipient; returns it with the unrun on_commit callbacks"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            alert = Alert.objects.create(
+                alert_type='gate', severity='high', title='Gate change', message='Now B4',
+                flight=self.flight, created_by=self.operator
+            )
+            alert.recipients.add(self.recipient)
+        return alert, callbacks
+
+    async def test_alert_is_pushed_to_recipients_after_commit(self):
+        recipient_inbox, recipient_outbox, recipient_task = await self.connect(self.recipient)
+        bystander_inbox, bystander_outbox, bystander_task = await self.connect(self.bystander)
+
+        alert, callbacks = await sync_to_async(self.create_alert)()
+        await asyncio.sleep(0.05)
+        self.assertTrue(recipient_outbox.empty())
+
+        for callback in callbacks:
+            await sync_to_async(callback)()
+        pushed = json.loads((await asyncio.wait_for(recipient_outbox.get(), 5))['text'])
+        self.assertEqual((pushed['event'], pushed['data']['id']), ('alert', str(alert.pk)))
+        await asyncio.sleep(0.05)
+        self.assertTrue(bystander_outbox.empty())
+
+        for inbox in (recipient_inbox, bystander_inbox):
+            await inbox.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(asyncio.gather(recipient_task, bystander_task), 5)
+
+
+class BroadcastTests(RosterFixtures, TestCase):
+    """Broadcast alerts reach their audience once, together with the alert or not at all"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        day = timezone.localdate() + timedelta(days=1)
+        cls.flight = cls.make_flight('FM500', local_time(day, 9))
+        cls.captain = cls.make_crew('captain')
+        cls.make_roster(cls.captain, local_time(day, 8), local_time(day, 12), cls.flight)
+        cls.officer = cls.make_crew('officer', position='first_officer', preferred_haul='short')
+        cls.purser = cls.make_crew('purser', position='senior_cabin_crew', preferred_haul='long')
+        cls.listed = cls.make_crew('listed', preferred_haul='long')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def broadcast(self, **audience):
+        return self.client.post('/api/v1/alerts/broadcast/', {
+            'alert_type': 'crew', 'severity': 'medium', 'title': 'Briefing moved', 'message': 'Now 07:30',
+            'flight': str(self.flight.id), 'created_by': str(self.operator.id), **audience,
+        }, format='json')
+
+    def test_audiences_are_combined_without_duplicates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.broadcast(
+                flight_crew=True, positions=['first_officer'], crew_members=[str(self.captain.id), str(self.listed.id)]
+            )
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['recipients'], 3)
+        alert = Alert.objects.get(pk=response.data['alert']['id'])
+        self.assertEqual(set(alert.recipients.all()), {self.captain, self.officer, self.listed})
+        self.assertEqual(OutboundSMS.objects.count(), 3)
+
+    def test_haul_type_reaches_crew_preferring_it_or_both(self):
+        response = self.broadcast(haul_types=['long'])
+
+        self.assertEqual(response.status_code, 201, response.data)
+        alert = Alert.objects.get(pk=response.data['alert']['id'])
+        # The captain prefers both hauls
+        self.assertEqual(set(alert.recipients.all()), {self.captain, self.purser, self.listed})
+
+    def test_failed_recipients_keep_no_alert(self):
+        with patch.object(AlertRecipient.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                self.broadcast(flight_crew=True)
+
+        self.assertFalse(Alert.objects.exists())
+
+    def test_empty_audience_is_rejected(self):
+        response = self.broadcast()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Alert.objects.exists())
+
+
+class KeysetPaginationTests(RosterFixtures, TestCase):
+    """Cursor pages follow the ordering with the primary key breaking ties"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        departure = local_time(timezone.localdate() + timedelta(days=1), 9)
+        # Three flights share a departure, so page boundaries fall inside the tie
+        cls.flights = [
+            cls.make_flight(f'FM1{number}', departure + timedelta(hours=hours))
+            for number, hours in enumerate((0, 0, 0, 1, 2))
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def walk(self, url, link='next'):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def expected(self, descending=False):
+        flights = sorted(self.flights, key=lambda flight: (flight.scheduled_departure, str(flight.pk)))
+        return [str(flight.pk) for flight in (reversed(flights) if descending else flights)]
+
+    def test_pages_cover_every_row_once_in_order(self):
+        pages = self.walk('/api/v1/flights/?page_size=2&fields=id')
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(list(itertools.chain(*pages)), self.expected())
+
+    def test_descending_ordering_breaks_ties_descending(self):
+        pages = self.walk('/api/v1/flights/?page_size=2&fields=id&ordering=-scheduled_departure')
+
+        self.assertEqual(list(itertools.chain(*pages)), self.expected(descending=True))
+
+    def test_previous_links_return_the_same_pages(self):
+        url, forward = '/api/v1/flights/?page_size=2&fields=id', []
+        while url:
+            response = self.client.get(url)
+            forward.append([row['id'] for row in response.data['results']])
+            url, last = response.data['next'], response.data['previous']
+
+        self.assertEqual(self.walk(last, link='previous'), forward[-2::-1])
+
+    def test_row_added_before_the_cursor_is_not_served_twice(self):
+        first = self.client.get('/api/v1/flights/?page_size=2&fields=id')
+        self.make_flight('FM199', self.flights[0].scheduled_departure - timedelta(hours=1))
+
+        rest = self.walk(first.data['next'])
+        served = [row['id'] for row in first.data['results']] + list(itertools.chain(*rest))
+        self.assertEqual(served, self.expected())
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/v1/flights/?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class FieldSelectionTests(RosterFixtures, TestCase):
+    """?fields= trims top-level fields; ?expand= adds nested ones, including inside lists"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew = [cls.make_crew('captain'), cls.make_crew('officer', position='first_officer')]
+        day = timezone.localdate() + timedelta(days=1)
+        cls.flight = cls.make_flight('FM400', local_time(day, 9))
+        for crew_member in cls.crew:
+            cls.make_roster(crew_member, local_time(day, 8), local_time(day, 12), cls.flight)
+        cls.alert = Alert.objects.create(
+            alert_type='gate', severity='low', title='Gate change', message='Now B4',
+            flight=cls.flight, created_by=cls.operator
+        )
+        cls.alert.recipients.add(*cls.crew)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def test_nested_fields_are_left_out_by_default(self):
+        row = self.client.get('/api/v1/duty-rosters/').data['results'][0]
+
+        self.assertIn('flight', row)
+        self.assertFalse({'crew_member_details', 'flight_details', 'created_by_details'} & set(row))
+
+    def test_fields_restricts_the_top_level(self):
+        rows = self.client.get('/api/v1/duty-rosters/', {'fields': 'id,duty_date', 'expand': 'flight_details'}).data
+        self.assertEqual({frozenset(row) for row in rows['results']}, {frozenset({'id', 'duty_date'})})
+
+    def test_dotted_expand_reaches_a_nested_serializer(self):
+        response = self.client.get(
+            '/api/v1/duty-rosters/', {'expand': 'flight_details,flight_details.crew_assignments'}
+        )
+
+        details = response.data['results'][0]['flight_details']
+        self.assertEqual(details['flight_number'], 'FM400')
+        self.assertEqual(len(details['crew_assignments']), 2)
+        self.assertNotIn('crew_member_details', response.data['results'][0])
+
+    def test_expand_inside_a_nested_list(self):
+        path = f'/api/v1/alerts/{self.alert.id}/'
+        slim = self.client.get(path, {'expand': 'recipients_details'}).data
+        self.assertEqual(len(slim['recipients_details']), 2)
+        self.assertFalse(any('recipient_details' in row for row in slim['recipients_details']))
+
+        full = self.client.get(path, {'expand': 'recipients_details,recipients_details.recipient_details'}).data
+        self.assertEqual(
+            {row['recipient_details']['username'] for row in full['recipients_details']}, {'captain', 'officer'}
+        )
+
+    def test_expanded_list_queries_do_not_grow_with_rows(self):
+        params = {'expand': 'crew_member_details,flight_details,flight_details.crew_assignments'}
+        with CaptureQueriesContext(connection) as two_rows:
+            self.client.get('/api/v1/duty-rosters/', params)
+        later = timezone.localdate() + timedelta(days=3)
+        flight = self.make_flight('FM401', local_time(later, 9))
+        for crew_member in self.crew:
+            self.make_roster(crew_member, local_time(later, 8), local_time(later, 12), flight)
+        with CaptureQueriesContext(connection) as four_rows:
+            response = self.client.get('/api/v1/duty-rosters/', params)
+
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(len(four_rows), len(two_rows))
+
+
+class GroupedListTests(RosterFixtures, TestCase):
+    """by_status groups every status in one response, optionally capped per group"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        departure = local_time(timezone.localdate() + timedelta(days=1), 6)
+        for hours, flight_status in enumerate(('scheduled', 'delayed', 'scheduled', 'delayed', 'scheduled')):
+            cls.make_flight(f'FM2{hours}', departure + timedelta(hours=hours), status=flight_status)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def by_status(self, **params):
+        return self.client.get('/api/v1/flights/by_status/', params)
+
+    def test_groups_follow_the_view_ordering(self):
+        response = self.by_status()
+
+        self.assertEqual(list(response.data), ['Scheduled', 'Delayed', 'Cancelled', 'Completed'])
+        self.assertEqual([row['flight_number'] for row in response.data['Scheduled']], ['FM20', 'FM22', 'FM24'])
+        self.assertEqual([row['flight_number'] for row in response.data['Delayed']], ['FM21', 'FM23'])
+        self.assertEqual(response.data['Cancelled'], [])
+
+    def test_limit_keeps_the_first_rows_of_each_group(self):
+        response = self.by_status(limit=1)
+
+        self.assertEqual(
+            {label: [row['flight_number'] for row in rows] for label, rows in response.data.items()},
+            {'Scheduled': ['FM20'], 'Delayed': ['FM21'], 'Cancelled': [], 'Completed': []}
+        )
+        self.assertEqual(len(self.by_status(limit=10).data['Scheduled']), 3)
+
+    def test_counts(self):
+        response = self.by_status(counts='true')
+
+        self.assertEqual(response.data, {'Scheduled': 3, 'Delayed': 2, 'Cancelled': 0, 'Completed': 0})
+
+    def test_limit_out_of_bounds_is_rejected(self):
+        for limit in ('0', '-1', 'ten'):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.by_status(limit=limit).status_code, 400)
+
+
+class CrewStatusTests(RosterFixtures, TestCase):
+    """crew_status serves each crew member's newest fatigue log, newest first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.captain = cls.make_crew('captain')
+        cls.officer = cls.make_crew('officer', position='first_officer')
+        cls.day = timezone.localdate() - timedelta(days=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.operator)
+
+    def log(self, crew_member, hour, fatigue_level, day=None):
+        start = local_time(day or self.day, hour)
+        return FatigueLog.objects.create(
+            crew_member=crew_member, duty_start=start, duty_end=start + timedelta(hours=2),
+            fatigue_level=fatigue_level
+        )
+
+    def statuses(self):
+        response = self.client.get('/api/v1/fatigue-logs/crew_status/')
+        self.assertEqual(response.status_code, 200)
+        return [(row['crew_member'], row['fatigue_level']) for row in response.data['results']]
+
+    def test_newest_log_per_crew_member(self):
+        self.log(self.captain, 6, 'red')
+        self.log(self.captain, 14, 'green')
+        self.log(self.officer, 10, 'orange')
+        # Logged late, but older than the captain's latest duty
+        self.log(self.captain, 8, 'orange')
+
+        self.assertEqual(self.statuses(), [(self.captain.id, 'green'), (self.officer.id, 'orange')])
+
+    def test_deleting_the_newest_log_falls_back_to_the_previous_one(self):
+        self.log(self.captain, 6, 'red')
+        self.log(self.captain, 14, 'green').delete()
+
+        self.assertEqual(self.statuses(), [(self.captain.id, 'red')])
+
+    def test_queries_do_not_grow_with_crew(self):
+        self.log(self.captain, 6, 'red')
+        with CaptureQueriesContext(connection) as one:
+            self.statuses()
+        for number in range(3):
+            self.log(self.make_crew(f'relief{number}'), 7 + number, 'green')
+        with CaptureQueriesContext(connection) as four:
+            self.assertEqual(len(self.statuses()), 4)
+
+        self.assertEqual(len(four), len(one))
+
+
+class TransportSelectionTests(RosterFixtures, TestCase):
+    """SMS_TRANSPORT picks the transport, created once and replaced by reset_transport"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = cls.make_operator()
+        cls.crew_member = cls.make_crew('captain')
+        cls.flight = cls.make_flight('FM100', local_time(timezone.localdate() + timedelta(days=1), 9))
+
+    def setUp(self):
+        transports.reset_transport()
+        self.addCleanup(transports.reset_transport)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.outbox = Path(directory.name) / 'outbox.jsonl'
+
+    def test_broadcast_is_delivered_through_the_configured_transport(self):
+        client = APIClient()
+        client.force_authenticate(self.operator)
+        config = {'BACKEND': 'alerts.transports.FileTransport', 'OPTIONS': {'file_path': self.outbox}}
+        with override_settings(SMS_TRANSPORT=config):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.post('/api/v1/alerts/broadcast/', {
+                    'alert_type': 'crew', 'severity': 'low', 'title': 'Crew room', 'message': 'Moved to L2',
+                    'flight': str(self.flight.id), 'created_by': str(self.operator.id),
+                    'crew_members': [str(self.crew_member.id)],
+                }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            process_batch()
+
+        [entry] = [json.loads(line) for line in self.outbox.read_text().splitlines()]
+        self.assertEqual(entry['phone_numbers'], [self.crew_member.phone_number])
+        self.assertIn('Moved to L2', entry['message'])
+
+    def test_transport_is_created_once_until_reset(self):
+        with override_settings(SMS_TRANSPORT={'BACKEND': 'alerts.transports.InMemoryTransport'}):
+            transport = transports.get_transport()
+            self.assertIsInstance(transport, transports.InMemoryTransport)
+            self.assertIs(transports.get_transport(), transport)
+        config = {'BACKEND': 'alerts.transports.FileTransport', 'OPTIONS': {'file_path': self.outbox}}
+        with override_settings(SMS_TRANSPORT=config):
+            self.assertIs(transports.get_transport(), transport)
+            transports.reset_transport()
+            self.assertIsInstance(transports.get_transport(), transports.FileTransport)
+
+    @override_settings(SMS_TRANSPORT={'BACKEND': 'alerts.transports.AfricasTalkingTransport'})
+    def test_live_gateway_needs_an_api_key(self):
+        with self.assertRaises(ImproperlyConfigured):
+            transports.get_transport()
+
+    @override_settings(SMS_TRANSPORT={
+        'BACKEND': 'alerts.transports.AfricasTalkingTransport',
+        'OPTIONS': {'username': 'sandbox', 'api_key': 'test-key', 'sandbox': True},
+    })
+    def test_live_gateway_posts_one_request_per_batch(self):
+        session = Mock()
+        session.post.return_value.json.return_value = {'SMSMessageData': {'Recipients': [
+            {'number': '+256700000001', 'status': 'Success'}, {'number': '+256700000002', 'status': 'InvalidPhoneNumber'},
+        ]}}
+        with patch.object(transports.AfricasTalkingTransport, 'session', new_callable=PropertyMock, return_value=session):
+            statuses = send_bulk_sms('Gate B4', ['+256700000001', '+256700000002'])
+
+        self.assertEqual(statuses, {'+256700000001': 'Success', '+256700000002': 'InvalidPhoneNumber'})
+        url = session.post.call_args.args[0]
+        self.assertEqual(url, transports.AfricasTalkingTransport.SANDBOX_URL)
+        self.assertEqual(session.post.call_args.kwargs['data']['to'], '+256700000001,+256700000002')
@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
 from . import views
+from .metrics import MetricsView
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -13,6 +14,10 @@ router.register(r'fatigue-logs', views.FatigueLogViewSet, basename='fatiguelog')
 router.register(r'swap-requests', views.FlightSwapRequestViewSet, basename='flightswap')
 router.register(r'alerts', views.AlertViewSet, basename='alert')
 router.register(r'alert-recipients', views.AlertRecipientViewSet, basename='alertrecipient')
+router.register(r'sync', views.SyncViewSet, basename='sync')
+router.register(r'analytics/crew', views.CrewDailyRollupViewSet, basename='crewdailyrollup')
+router.register(r'analytics/positions', views.PositionDailyRollupViewSet, basename='positiondailyrollup')
+router.register(r'analytics/airports', views.AirportDailyRollupViewSet, basename='airportdailyrollup')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
@@ -22,6 +27,9 @@ urlpatterns = [
     # API root
     path('api/v1/', include(router.urls)),
     
+    # Per-endpoint request metrics of this process
+    path('metrics/', MetricsView.as_view(), name='request-metrics'),
+    
     # Additional custom endpoints can be added here
     # Example: path('api/v1/custom-endpoint/', views.custom_view, name='custom-endpoint'),
 ]
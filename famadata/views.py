@@ -3,39 +3,72 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import datetime, timedelta
+import uuid
 
 from .models import (
     CustomUser, CrewProfile, Flight, DutyRoster, 
-    FatigueLog, FlightSwapRequest, Alert, AlertRecipient
+    FatigueLog, FlightSwapRequest, Alert, AlertRecipient, CrewFatigueStatus,
+    CrewDailyRollup, PositionDailyRollup, AirportDailyRollup
 )
 from .serializers import (
     CustomUserSerializer, CrewProfileSerializer, FlightSerializer,
     DutyRosterSerializer, FatigueLogSerializer, FlightSwapRequestSerializer,
     AlertSerializer, AlertRecipientSerializer, UserChoiceSerializer,
-    FlightChoiceSerializer
+    FlightChoiceSerializer, RosterProposalSerializer, AlertAudienceSerializer,
+    SwapBatchSerializer, CrewDailyRollupSerializer, PositionDailyRollupSerializer,
+    AirportDailyRollupSerializer, DisruptionSerializer, DisruptionApplySerializer, DisruptionDelaySerializer,
+    FatigueRecomputeSerializer
 )
+from .availability import available_crew, flight_window
+from .broadcast import broadcast_alert
+from .cache import cache_response
+from .conflicts import day_start, find_conflicts
+from .disruptions import InvalidPlan, StalePlan, apply_disruption, plan_disruption
+from .fatigue import assess, build_timelines, recompute_fatigue_logs
+from .legality import check_proposals
+from .pubsub import flight_event, publish_event, swap_event
+from .swap_index import suggest_swaps
+from .swaps import execute_swaps
+from .sync import InvalidSyncToken, build_delta
+from .exports import ALERT_RECIPIENT_EXPORT, DUTY_ROSTER_EXPORT, FATIGUE_LOG_EXPORT
+from .filters import DutyRosterFilter
+from .mixins import ConditionalGetMixin, ExportMixin, FieldSelectionMixin, GroupedListMixin, PaginatedActionMixin
 
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+def parse_date_param(value):
+    """Parse an optional YYYY-MM-DD query parameter"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def publish_swap_decision(swap_request):
+    crew_member_ids = [swap_request.requesting_crew_id, swap_request.target_crew_id]
+    publish_event(crew_member_ids, 'swap_decision', swap_event(swap_request))
+
+
+class CustomUserViewSet(FieldSelectionMixin, ConditionalGetMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for CustomUser model"""
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['user_type', 'is_active_duty']
-    search_fields = ['username', 'first_name', 'last_name', 'email', 'phone_number']
+    search_fields = ['username', 'phone_number']
     ordering_fields = ['username', 'created_at', 'last_login']
     ordering = ['-created_at']
     
     @action(detail=False, methods=['get'])
+    @cache_response(CustomUser)
     def choices(self, request):
         """Get simplified user data for dropdown choices"""
         users = self.get_queryset()
-        serializer = UserChoiceSerializer(users, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(users, UserChoiceSerializer)
     
     @action(detail=False, methods=['get'])
     def active_crew(self, request):
@@ -44,8 +77,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             is_active_duty=True,
             user_type__in=['pilot', 'cabin_crew']
         )
-        serializer = self.get_serializer(active_crew, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(active_crew)
     
     @action(detail=True, methods=['post'])
     def toggle_duty_status(self, request, pk=None):
@@ -70,33 +102,74 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class CrewProfileViewSet(viewsets.ModelViewSet):
+class CrewProfileViewSet(FieldSelectionMixin, ConditionalGetMixin, GroupedListMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for CrewProfile model"""
-    queryset = CrewProfile.objects.select_related('user').all()
+    queryset = CrewProfile.objects.all()
     serializer_class = CrewProfileSerializer
+    expand_select_related = {'user_details': ['user']}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['position', 'training_level', 'preferred_haul', 'allow_swapping']
-    search_fields = ['user__username', 'user__first_name', 'user__last_name', 'position']
+    search_fields = ['user__username', 'position']
     ordering_fields = ['seniority', 'created_at']
     ordering = ['-seniority']
     
     @action(detail=False, methods=['get'])
+    @cache_response(CrewProfile, CustomUser)
     def by_position(self, request):
         """Get crew profiles grouped by position"""
-        positions = {}
-        for choice in CrewProfile.POSITION_CHOICES:
-            position_code, position_name = choice
-            profiles = self.get_queryset().filter(position=position_code)
-            serializer = self.get_serializer(profiles, many=True)
-            positions[position_name] = serializer.data
-        return Response(positions)
+        return self.grouped_response(self.get_queryset(), 'position', CrewProfile.POSITION_CHOICES)
+    
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """Legal, unassigned crew for a flight or a start/end window, most senior first"""
+        params = request.query_params
+        position = params.get('position')
+        if position not in dict(CrewProfile.POSITION_CHOICES):
+            return Response(
+                {'error': 'A valid position parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        flight = None
+        if params.get('flight'):
+            try:
+                flight = Flight.objects.get(pk=uuid.UUID(params['flight']))
+            except (ValueError, Flight.DoesNotExist):
+                return Response({'error': 'Flight not found'}, status=status.HTTP_404_NOT_FOUND)
+            start, end = flight_window(flight)
+            haul_type = flight.haul_type
+        else:
+            try:
+                start, end = [
+                    value if value is None or timezone.is_aware(value) else timezone.make_aware(value)
+                    for value in (parse_datetime(params.get('start') or ''), parse_datetime(params.get('end') or ''))
+                ]
+            except ValueError:
+                # Well formed but impossible, e.g. month 13
+                start = end = None
+            haul_type = params.get('haul_type')
+            if not (start and end and start < end) or haul_type not in ('short', 'long'):
+                return Response(
+                    {'error': 'flight, or start and end datetimes with haul_type short or long, required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        try:
+            limit = min(max(int(params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        sources = [source for value in params.getlist('source') for source in value.split(',') if source]
+        
+        crew = available_crew(position, start, end, haul_type, flight=flight, sources=sources, limit=limit)
+        return Response({'start': start, 'end': end, 'haul_type': haul_type, 'crew': crew})
 
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(FieldSelectionMixin, ConditionalGetMixin, GroupedListMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for Flight model"""
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
+    expand_prefetch_related = {'crew_assignments': ['crew_assignments']}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'haul_type', 'departure_airport', 'arrival_airport']
@@ -104,37 +177,38 @@ class FlightViewSet(viewsets.ModelViewSet):
     ordering_fields = ['scheduled_departure', 'scheduled_arrival', 'created_at']
     ordering = ['scheduled_departure']
     
+    def perform_update(self, serializer):
+        # Credited as the author of the alert the change produces
+        serializer.instance._changed_by = self.request.user
+        serializer.save()
+    
     @action(detail=False, methods=['get'])
+    @cache_response(Flight)
     def choices(self, request):
         """Get simplified flight data for dropdown choices"""
         flights = self.get_queryset()
-        serializer = FlightChoiceSerializer(flights, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(flights, FlightChoiceSerializer)
     
     @action(detail=False, methods=['get'])
+    @cache_response(Flight, DutyRoster, vary_on=lambda request: timezone.localdate())
     def today(self, request):
         """Get today's flights"""
-        today = timezone.now().date()
+        # A range on the column itself, unlike __date, can use the departure index
+        start = day_start(timezone.localdate())
         flights = self.get_queryset().filter(
-            scheduled_departure__date=today
+            scheduled_departure__gte=start,
+            scheduled_departure__lt=start + timedelta(days=1)
         )
-        serializer = self.get_serializer(flights, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(flights)
     
     @action(detail=False, methods=['get'])
     def by_status(self, request):
         """Get flights grouped by status"""
-        statuses = {}
-        for choice in Flight.FLIGHT_STATUS_CHOICES:
-            status_code, status_name = choice
-            flights = self.get_queryset().filter(status=status_code)
-            serializer = self.get_serializer(flights, many=True)
-            statuses[status_name] = serializer.data
-        return Response(statuses)
+        return self.grouped_response(self.get_queryset(), 'status', Flight.FLIGHT_STATUS_CHOICES)
     
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
-        """Update flight status"""
+        """Update flight status, proposing roster changes when it is cancelled or delayed"""
         flight = self.get_object()
         new_status = request.data.get('status')
         
@@ -144,24 +218,72 @@ class FlightViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        delay = timedelta(0)
+        if new_status == 'delayed' and request.data.get('delay_minutes') is not None:
+            serializer = DisruptionDelaySerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            delay = timedelta(minutes=serializer.validated_data['delay_minutes'])
+        
         flight.status = new_status
         if new_status == 'completed' and not flight.actual_arrival:
             flight.actual_arrival = timezone.now()
+        flight._changed_by = request.user
         flight.save()
+        crew_member_ids = DutyRoster.objects.filter(flight=flight).values_list('crew_member_id', flat=True)
+        publish_event(crew_member_ids, 'flight_status', flight_event(flight))
         
         serializer = self.get_serializer(flight)
-        return Response(serializer.data)
+        data = serializer.data
+        if new_status in ('cancelled', 'delayed'):
+            # Proposed roster changes; nothing is applied until apply_disruption
+            data['disruption'] = plan_disruption([flight.id], delays={flight.id: delay})
+        return Response(data)
+    
+    @action(detail=False, methods=['post'])
+    def disruption_plan(self, request):
+        """Propose roster changes for cancelled or delayed flights"""
+        serializer = DisruptionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        delays = {
+            flight_id: timedelta(minutes=minutes)
+            for flight_id, minutes in serializer.validated_data['delays'].items()
+        }
+        return Response(plan_disruption(serializer.validated_data['flights'], delays=delays))
+    
+    @action(detail=False, methods=['post'])
+    def apply_disruption(self, request):
+        """Apply a plan from disruption_plan, or the accepted rosters of it"""
+        serializer = DisruptionApplySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            result = apply_disruption(serializer.validated_data['plan'], serializer.validated_data.get('accept'))
+        except InvalidPlan as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except StalePlan as exc:
+            return Response(
+                {'error': str(exc), 'rosters': exc.roster_ids},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(result)
 
 
-class DutyRosterViewSet(viewsets.ModelViewSet):
+class DutyRosterViewSet(FieldSelectionMixin, ConditionalGetMixin, ExportMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for DutyRoster model"""
-    queryset = DutyRoster.objects.select_related(
-        'crew_member', 'flight', 'created_by'
-    ).all()
+    queryset = DutyRoster.objects.all()
     serializer_class = DutyRosterSerializer
+    export_fields = DUTY_ROSTER_EXPORT
+    export_date_field = 'duty_date'
+    expand_select_related = {
+        'crew_member_details': ['crew_member'],
+        'flight_details': ['flight'],
+        'created_by_details': ['created_by'],
+    }
+    expand_prefetch_related = {'flight_details.crew_assignments': ['flight__crew_assignments']}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['duty_type', 'position', 'duty_date', 'crew_member']
+    filterset_class = DutyRosterFilter
     search_fields = ['crew_member__username', 'flight__flight_number']
     ordering_fields = ['duty_date', 'duty_start_time', 'created_at']
     ordering = ['duty_date', 'duty_start_time']
@@ -177,8 +299,22 @@ class DutyRosterViewSet(viewsets.ModelViewSet):
             )
         
         rosters = self.get_queryset().filter(crew_member_id=crew_member_id)
-        serializer = self.get_serializer(rosters, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(rosters)
+    
+    @action(detail=True, methods=['get'])
+    def swap_suggestions(self, request, pk=None):
+        """Rank crew this duty could be swapped with, without conflicts or fatigue violations"""
+        roster = self.get_object()
+        try:
+            days = min(max(int(request.query_params.get('days', 3)), 0), 14)
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response(
+                {'error': 'days and limit must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(suggest_swaps(roster, days=days, limit=limit))
     
     @action(detail=False, methods=['get'])
     def weekly_schedule(self, request):
@@ -195,46 +331,52 @@ class DutyRosterViewSet(viewsets.ModelViewSet):
             duty_date__gte=start_date,
             duty_date__lte=end_date
         )
-        serializer = self.get_serializer(rosters, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(rosters)
     
     @action(detail=False, methods=['get'])
     def conflicts(self, request):
-        """Check for scheduling conflicts"""
-        conflicts = []
-        rosters = self.get_queryset().select_related('crew_member')
-        
-        # Group by crew member and date
-        crew_schedules = {}
-        for roster in rosters:
-            key = (roster.crew_member.id, roster.duty_date)
-            if key not in crew_schedules:
-                crew_schedules[key] = []
-            crew_schedules[key].append(roster)
-        
-        # Check for overlapping duties
-        for schedules in crew_schedules.values():
-            if len(schedules) > 1:
-                for i, schedule1 in enumerate(schedules):
-                    for schedule2 in schedules[i+1:]:
-                        if (schedule1.duty_start_time < schedule2.duty_end_time and
-                            schedule2.duty_start_time < schedule1.duty_end_time):
-                            conflicts.append({
-                                'crew_member': schedule1.crew_member.username,
-                                'date': schedule1.duty_date,
-                                'conflict_duties': [
-                                    self.get_serializer(schedule1).data,
-                                    self.get_serializer(schedule2).data
-                                ]
-                            })
+        """Check for scheduling conflicts, including duties overlapping across midnight.
+
+        Takes the list filters, so `?crew_member=` may be repeated.
+        """
+        try:
+            start_date = parse_date_param(request.query_params.get('start_date'))
+            end_date = parse_date_param(request.query_params.get('end_date'))
+        except ValueError:
+            return Response(
+                {'error': 'Dates must use the YYYY-MM-DD format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
+        conflicts = find_conflicts(
+            start_date=start_date,
+            end_date=end_date,
+            queryset=self.filter_queryset(self.get_queryset())
+        )
         return Response(conflicts)
+    
+    @action(detail=False, methods=['post'])
+    def check_legality(self, request):
+        """Check many proposed roster rows for overlap, rest and fatigue violations"""
+        rows = request.data.get('rosters') if isinstance(request.data, dict) else request.data
+        serializer = RosterProposalSerializer(data=rows, many=True)
+        serializer.is_valid(raise_exception=True)
+        
+        results = check_proposals(serializer.validated_data)
+        return Response({
+            'checked': len(results),
+            'illegal': sum(1 for result in results if not result['legal']),
+            'results': results
+        })
 
 
-class FatigueLogViewSet(viewsets.ModelViewSet):
+class FatigueLogViewSet(FieldSelectionMixin, ExportMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for FatigueLog model"""
-    queryset = FatigueLog.objects.select_related('crew_member').all()
+    queryset = FatigueLog.objects.all()
     serializer_class = FatigueLogSerializer
+    export_fields = FATIGUE_LOG_EXPORT
+    export_date_field = 'duty_start'
+    expand_select_related = {'crew_member_details': ['crew_member']}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['fatigue_level', 'crew_member']
@@ -242,33 +384,104 @@ class FatigueLogViewSet(viewsets.ModelViewSet):
     ordering_fields = ['duty_start', 'total_duty_hours', 'created_at']
     ordering = ['-duty_start']
     
+    def perform_create(self, serializer):
+        log = serializer.save()
+        recompute_fatigue_logs([log.crew_member_id], since=log.duty_start)
+        log.refresh_from_db()
+    
+    def perform_update(self, serializer):
+        previous_start = serializer.instance.duty_start
+        log = serializer.save()
+        recompute_fatigue_logs([log.crew_member_id], since=min(previous_start, log.duty_start))
+        log.refresh_from_db()
+    
+    @action(detail=False, methods=['post'])
+    def recompute(self, request):
+        """Recompute hours, fatigue levels and required rest for many crew members at once"""
+        serializer = FatigueRecomputeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        crew_member_ids = serializer.validated_data.get('crew_members')
+        since = serializer.validated_data.get('since')
+        # Every log of every crew member is recomputed in the request
+        if crew_member_ids is None and since is None and not request.user.is_staff:
+            return Response(
+                {'error': 'Give crew_members or since; only operators can recompute every log'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        updated = recompute_fatigue_logs(
+            crew_member_ids=crew_member_ids,
+            since=day_start(since) if since else None
+        )
+        return Response({'updated': updated})
+    
+    @action(detail=False, methods=['get'])
+    def rolling_hours(self, request):
+        """Get rolling duty and flight hours for a crew member"""
+        crew_member_id = request.query_params.get('crew_member_id')
+        if not crew_member_id:
+            return Response(
+                {'error': 'crew_member_id parameter required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            crew_member_id = uuid.UUID(crew_member_id)
+        except ValueError:
+            return Response(
+                {'error': 'crew_member_id must be a UUID'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        at = parse_datetime(request.query_params.get('at') or '') or timezone.now()
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        timeline = build_timelines([crew_member_id], at, at)[crew_member_id]
+        totals = timeline.rolling_totals(at)
+        fatigue_level, breaches = assess(totals)
+        return Response({
+            'crew_member': crew_member_id,
+            'at': at,
+            'totals': totals,
+            'fatigue_level': fatigue_level,
+            'breaches': breaches
+        })
+    
     @action(detail=False, methods=['get'])
     def fatigue_alerts(self, request):
         """Get crew members with high fatigue levels"""
         high_fatigue = self.get_queryset().filter(
             fatigue_level__in=['orange', 'red']
         ).order_by('-duty_start')
-        serializer = self.get_serializer(high_fatigue, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(high_fatigue)
     
     @action(detail=False, methods=['get'])
     def crew_status(self, request):
         """Get current fatigue status for all crew members"""
-        latest_logs = {}
-        for log in self.get_queryset().order_by('-duty_start'):
-            if log.crew_member.id not in latest_logs:
-                latest_logs[log.crew_member.id] = log
+        statuses = CrewFatigueStatus.objects.select_related(
+            'latest_log__crew_member'
+        ).filter(latest_log__isnull=False)
         
-        serializer = self.get_serializer(list(latest_logs.values()), many=True)
-        return Response(serializer.data)
+        page = self.paginator.paginate_queryset(statuses, request, view=self, ordering=['-duty_start'])
+        serializer = self.get_serializer([s.latest_log for s in page], many=True)
+        return self.paginator.get_paginated_response(serializer.data)
 
 
-class FlightSwapRequestViewSet(viewsets.ModelViewSet):
+class FlightSwapRequestViewSet(FieldSelectionMixin, ConditionalGetMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for FlightSwapRequest model"""
-    queryset = FlightSwapRequest.objects.select_related(
-        'requesting_crew', 'target_crew', 'requesting_flight', 'target_flight'
-    ).all()
+    queryset = FlightSwapRequest.objects.all()
     serializer_class = FlightSwapRequestSerializer
+    expand_select_related = {
+        'requesting_crew_details': ['requesting_crew'],
+        'target_crew_details': ['target_crew'],
+        'requesting_flight_details': ['requesting_flight'],
+        'target_flight_details': ['target_flight'],
+        'approved_by_details': ['approved_by'],
+    }
+    expand_prefetch_related = {
+        'requesting_flight_details.crew_assignments': ['requesting_flight__crew_assignments'],
+        'target_flight_details.crew_assignments': ['target_flight__crew_assignments'],
+    }
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'requesting_crew', 'target_crew']
@@ -280,37 +493,61 @@ class FlightSwapRequestViewSet(viewsets.ModelViewSet):
     def pending_requests(self, request):
         """Get pending swap requests"""
         pending = self.get_queryset().filter(status='pending')
-        serializer = self.get_serializer(pending, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(pending)
     
     @action(detail=True, methods=['patch'])
     def approve(self, request, pk=None):
-        """Approve a swap request"""
+        """Approve a swap request and exchange the two crew members' rosters"""
         swap_request = self.get_object()
-        swap_request.status = 'approved'
-        swap_request.approved_by = request.user
-        swap_request.save()
+        result = execute_swaps([swap_request.id], approved_by=request.user)[0]
+        if not result['completed']:
+            return Response(
+                {'error': 'Swap cannot be executed', 'violations': result['violations']},
+                status=status.HTTP_409_CONFLICT
+            )
         
-        # Here you would implement the actual swap logic
-        # For now, just return the updated request
+        swap_request.refresh_from_db()
         serializer = self.get_serializer(swap_request)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'])
+    def batch_approve(self, request):
+        """Approve and execute many swap requests in one transaction"""
+        serializer = SwapBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        results = execute_swaps(serializer.validated_data['swap_requests'], approved_by=request.user)
+        return Response({
+            'completed': sum(1 for result in results if result['completed']),
+            'failed': sum(1 for result in results if not result['completed']),
+            'results': results
+        })
+    
     @action(detail=True, methods=['patch'])
     def reject(self, request, pk=None):
         """Reject a swap request"""
         swap_request = self.get_object()
         swap_request.status = 'rejected'
         swap_request.save()
+        publish_swap_decision(swap_request)
         
         serializer = self.get_serializer(swap_request)
         return Response(serializer.data)
 
 
-class AlertViewSet(viewsets.ModelViewSet):
+class AlertViewSet(FieldSelectionMixin, GroupedListMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for Alert model"""
-    queryset = Alert.objects.select_related('flight', 'created_by').prefetch_related('recipients').all()
+    queryset = Alert.objects.prefetch_related('recipients').all()
     serializer_class = AlertSerializer
+    expand_select_related = {
+        'flight_details': ['flight'],
+        'created_by_details': ['created_by'],
+    }
+    expand_prefetch_related = {
+        'flight_details.crew_assignments': ['flight__crew_assignments'],
+        'recipients_details': ['alertrecipient_set'],
+        'recipients_details.recipient_details': ['alertrecipient_set__recipient'],
+    }
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['alert_type', 'severity', 'is_active', 'flight']
@@ -321,22 +558,40 @@ class AlertViewSet(viewsets.ModelViewSet):
     
     
     @action(detail=False, methods=['get'])
+    @cache_response(Alert, AlertRecipient, Flight, CustomUser, DutyRoster)
     def active_alerts(self, request):
         """Get active alerts"""
         active = self.get_queryset().filter(is_active=True)
-        serializer = self.get_serializer(active, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(active)
     
     @action(detail=False, methods=['get'])
     def by_severity(self, request):
-        """Get alerts grouped by severity"""
-        severities = {}
-        for choice in Alert.SEVERITY_CHOICES:
-            severity_code, severity_name = choice
-            alerts = self.get_queryset().filter(severity=severity_code, is_active=True)
-            serializer = self.get_serializer(alerts, many=True)
-            severities[severity_name] = serializer.data
-        return Response(severities)
+        """Get active alerts grouped by severity"""
+        active = self.get_queryset().filter(is_active=True)
+        return self.grouped_response(active, 'severity', Alert.SEVERITY_CHOICES)
+    
+    @action(detail=False, methods=['post'])
+    def broadcast(self, request):
+        """Create an alert and send it to a flight's crew, positions, haul types or crew ids"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        audience = AlertAudienceSerializer(data=request.data)
+        audience.is_valid(raise_exception=True)
+        
+        # An alert is only kept together with all of its recipients
+        with transaction.atomic():
+            alert = serializer.save()
+            recipient_ids = broadcast_alert(
+                alert,
+                flight_crew=audience.validated_data['flight_crew'],
+                positions=audience.validated_data['positions'],
+                haul_types=audience.validated_data['haul_types'],
+                crew_member_ids=audience.validated_data['crew_members'],
+            )
+        return Response(
+            {'alert': self.get_serializer(alert).data, 'recipients': len(recipient_ids)},
+            status=status.HTTP_201_CREATED
+        )
     
     @action(detail=True, methods=['patch'])
     def deactivate(self, request, pk=None):
@@ -349,10 +604,12 @@ class AlertViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class AlertRecipientViewSet(viewsets.ModelViewSet):
+class AlertRecipientViewSet(FieldSelectionMixin, ExportMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     """ViewSet for AlertRecipient model"""
-    queryset = AlertRecipient.objects.select_related('alert', 'recipient').all()
+    queryset = AlertRecipient.objects.all()
     serializer_class = AlertRecipientSerializer
+    export_fields = ALERT_RECIPIENT_EXPORT
+    expand_select_related = {'recipient_details': ['recipient']}
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['is_read', 'sms_sent', 'recipient']
@@ -363,8 +620,7 @@ class AlertRecipientViewSet(viewsets.ModelViewSet):
     def my_alerts(self, request):
         """Get alerts for the current user"""
         user_alerts = self.get_queryset().filter(recipient=request.user)
-        serializer = self.get_serializer(user_alerts, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(user_alerts)
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
@@ -384,4 +640,62 @@ class AlertRecipientViewSet(viewsets.ModelViewSet):
         alert_recipient.save()
         
         serializer = self.get_serializer(alert_recipient)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """Delta sync for offline crew devices"""
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """Rows relevant to the crew member changed or deleted since `?token=`"""
+        crew_member_id = request.user.pk
+        if request.query_params.get('crew_member'):
+            if not request.user.is_staff:
+                return Response(
+                    {'error': 'Only operators can sync another crew member'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            try:
+                crew_member_id = uuid.UUID(request.query_params['crew_member'])
+            except ValueError:
+                return Response({'error': 'Invalid crew_member'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            delta = build_delta(crew_member_id, request.query_params.get('token'))
+        except InvalidSyncToken as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(delta)
+
+
+class CrewDailyRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """Daily utilization, fatigue, swap and alert totals per crew member"""
+    queryset = CrewDailyRollup.objects.all()
+    serializer_class = CrewDailyRollupSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {'date': ['exact', 'gte', 'lte'], 'crew_member': ['exact'], 'position': ['exact']}
+    ordering_fields = ['date', 'duty_hours', 'flight_hours']
+    ordering = ['-date']
+
+
+class PositionDailyRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """Daily utilization, fatigue, swap and alert totals per position"""
+    queryset = PositionDailyRollup.objects.all()
+    serializer_class = PositionDailyRollupSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {'date': ['exact', 'gte', 'lte'], 'position': ['exact']}
+    ordering_fields = ['date', 'duty_hours', 'flight_hours']
+    ordering = ['-date']
+
+
+class AirportDailyRollupViewSet(viewsets.ReadOnlyModelViewSet):
+    """Daily utilization, fatigue, swap and alert totals per departure airport"""
+    queryset = AirportDailyRollup.objects.all()
+    serializer_class = AirportDailyRollupSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {'date': ['exact', 'gte', 'lte'], 'airport': ['exact']}
+    ordering_fields = ['date', 'duty_hours', 'flight_hours']
+    ordering = ['-date']